@@ -0,0 +1,298 @@
+"""
+答案缓存模块 - 问答结果的三级缓存（精确匹配 + 语义相似 + 实体关系抽取结果持久化）
+
+- 精确匹配：以规范化后的问题文本为键，进程内 LRU
+- 语义相似：以问题向量为键，与已缓存问题的余弦相似度不低于阈值、且抽取出的实体名称完全相同才命中，进程内 LRU
+  （"糖尿病吃什么药" 与 "高血压吃什么药" 向量很接近，只比较相似度会返回另一种疾病的答案）
+- 抽取结果：问题 -> 实体/关系，SQLite 持久化，重启后仍可复用
+三级缓存均有 TTL 和容量上限；知识图谱重新导入后（图谱版本号变化）全部失效。
+"""
+import os
+import json
+import sqlite3
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Sequence
+
+import numpy as np
+
+from embedding_cache import normalize_text
+
+# 图谱版本号保存在一个独立的元数据节点上，由导入脚本在每次导入完成后更新
+GRAPH_VERSION_QUERY = "MATCH (m:GraphMeta {key: 'import'}) RETURN m.version AS version"
+GRAPH_VERSION_UPDATE = "MERGE (m:GraphMeta {key: 'import'}) SET m.version = toString(timestamp())"
+
+# 规范化问题时去掉的结尾标点
+_TRAILING_PUNCTUATION = "?？!！。.~～ "
+
+
+def normalize_question(question: str) -> str:
+    """规范化问题文本：在 normalize_text 的基础上统一大小写并去掉结尾标点"""
+    return normalize_text(question).lower().rstrip(_TRAILING_PUNCTUATION)
+
+
+class AnswerCache:
+    """答案缓存类
+
+    variant 用于区分影响答案内容的检索参数（如是否多跳、搜索预算），
+    不同 variant 的缓存条目互不命中。
+    """
+
+    def __init__(self, db_path: str = "./cache/answers.sqlite3", max_answers: int = 2048,
+                 answer_ttl: float = 86400.0, similarity_threshold: float = 0.95,
+                 max_extractions: int = 50000, extraction_ttl: float = 604800.0,
+                 version_check_interval: float = 30.0):
+        """
+        初始化答案缓存
+        Args:
+            db_path: 抽取结果缓存的 SQLite 数据库文件路径
+            max_answers: 精确匹配与语义缓存各自的最大条目数
+            answer_ttl: 答案的有效期（秒）
+            similarity_threshold: 语义缓存命中所需的最低余弦相似度
+            max_extractions: 抽取结果缓存的最大条目数
+            extraction_ttl: 抽取结果的有效期（秒）
+            version_check_interval: 两次检查图谱版本号的最小间隔（秒）
+        """
+        self.max_answers = max_answers
+        self.answer_ttl = answer_ttl
+        self.similarity_threshold = similarity_threshold
+        self.max_extractions = max_extractions
+        self.extraction_ttl = extraction_ttl
+        self.version_check_interval = version_check_interval
+        self.graph_version = None
+        self._last_version_check = 0.0
+        self._lock = threading.Lock()
+        self._exact = OrderedDict()
+        self._semantic = OrderedDict()
+        self._semantic_matrix = None
+        self._semantic_keys = []
+        self._extraction_count = 0
+        self.counters = {tier: {"hits": 0, "misses": 0, "evictions": 0, "expired": 0}
+                         for tier in ("exact", "semantic", "extraction")}
+        self.invalidations = 0
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS extractions ("
+            "key TEXT PRIMARY KEY, question TEXT NOT NULL, result TEXT NOT NULL, "
+            "graph_version TEXT NOT NULL, created_at REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_extractions_access ON extractions(last_access)")
+        self._conn.commit()
+        self._extraction_count = self._conn.execute("SELECT COUNT(*) FROM extractions").fetchone()[0]
+
+    @staticmethod
+    def entity_key(entities: Iterable[Dict]) -> frozenset:
+        """实体列表 -> 规范化后的实体名称集合，语义缓存只在两个问题的集合相同时命中"""
+        return frozenset(normalize_question(e["name"]) for e in entities or () if e.get("name"))
+
+    @staticmethod
+    def make_key(question: str, variant: str = "") -> str:
+        """根据规范化后的问题和 variant 生成键"""
+        return hashlib.sha1(f"{variant}\x1f{normalize_question(question)}".encode("utf-8")).hexdigest()
+
+    # ---------- 图谱版本 ----------
+
+    def needs_version_check(self) -> bool:
+        """距离上次检查图谱版本号是否已超过检查间隔"""
+        return time.time() - self._last_version_check >= self.version_check_interval
+
+    def set_graph_version(self, version: Optional[str]):
+        """记录当前图谱版本号；与上次记录的版本不同时清空答案缓存并删除旧版本的抽取结果"""
+        version = "" if version is None else str(version)
+        with self._lock:
+            self._last_version_check = time.time()
+            if version == self.graph_version:
+                return
+            if self.graph_version is not None:
+                self.invalidations += 1
+            self.graph_version = version
+            self._exact.clear()
+            self._semantic.clear()
+            self._semantic_matrix = None
+            self._conn.execute("DELETE FROM extractions WHERE graph_version != ?", (version,))
+            self._conn.commit()
+            self._extraction_count = self._conn.execute("SELECT COUNT(*) FROM extractions").fetchone()[0]
+
+    # ---------- 精确匹配与语义缓存 ----------
+
+    def get_exact(self, question: str, variant: str = "") -> Optional[str]:
+        """按规范化问题精确查找答案，未命中返回 None"""
+        key = self.make_key(question, variant)
+        with self._lock:
+            entry = self._exact.get(key)
+            if entry is not None and entry["expires_at"] < time.time():
+                del self._exact[key]
+                self.counters["exact"]["expired"] += 1
+                entry = None
+            if entry is None:
+                self.counters["exact"]["misses"] += 1
+                return None
+            self._exact.move_to_end(key)
+            self.counters["exact"]["hits"] += 1
+            return entry["answer"]
+
+    def get_semantic(self, question_vector: Sequence[float], variant: str = "",
+                     entities: Iterable[Dict] = ()) -> Optional[Dict]:
+        """
+        按问题向量查找最相似的已缓存问题
+        Args:
+            entities: 从问题中抽取出的实体，已缓存问题的实体名称集合必须与之相同；为空时不查找
+        Returns:
+            dict: {"question", "answer", "similarity"}；没有相似度达到阈值且实体相同的条目时返回 None
+        """
+        query = np.asarray(question_vector if question_vector is not None else [], dtype=np.float32)
+        norm = np.linalg.norm(query) if query.size else 0.0
+        entity_key = self.entity_key(entities)
+        with self._lock:
+            if norm == 0 or not entity_key or not self._semantic:
+                self.counters["semantic"]["misses"] += 1
+                return None
+            self._purge_expired_semantic()
+            matrix, keys = self._build_semantic_matrix(query.shape[0])
+            best = None
+            if keys:
+                scores = matrix @ (query / norm)
+                for i in np.argsort(-scores, kind="stable"):
+                    if scores[i] < self.similarity_threshold:
+                        break
+                    entry = self._semantic[keys[i]]
+                    if entry["variant"] == variant and entry["entities"] == entity_key:
+                        best = keys[i], float(scores[i])
+                        break
+            if best is None:
+                self.counters["semantic"]["misses"] += 1
+                return None
+            key, similarity = best
+            self._semantic.move_to_end(key)
+            self.counters["semantic"]["hits"] += 1
+            entry = self._semantic[key]
+            return {"question": entry["question"], "answer": entry["answer"], "similarity": similarity}
+
+    def put_answer(self, question: str, answer: str, question_vector: Sequence[float] = None, variant: str = "",
+                   entities: Iterable[Dict] = ()):
+        """写入精确匹配缓存，提供问题向量和抽取出的实体时同时写入语义缓存"""
+        key = self.make_key(question, variant)
+        entity_key = self.entity_key(entities)
+        expires_at = time.time() + self.answer_ttl
+        with self._lock:
+            self._exact[key] = {"answer": answer, "expires_at": expires_at}
+            self._exact.move_to_end(key)
+            while len(self._exact) > self.max_answers:
+                self._exact.popitem(last=False)
+                self.counters["exact"]["evictions"] += 1
+            if question_vector and entity_key:
+                vector = np.asarray(question_vector, dtype=np.float32)
+                norm = np.linalg.norm(vector)
+                if norm > 0:
+                    self._semantic[key] = {"question": question, "answer": answer, "variant": variant,
+                                           "entities": entity_key, "vector": vector / norm,
+                                           "expires_at": expires_at}
+                    self._semantic.move_to_end(key)
+                    while len(self._semantic) > self.max_answers:
+                        self._semantic.popitem(last=False)
+                        self.counters["semantic"]["evictions"] += 1
+                    self._semantic_matrix = None
+
+    def _purge_expired_semantic(self):
+        """删除已过期的语义缓存条目"""
+        now = time.time()
+        expired = [key for key, entry in self._semantic.items() if entry["expires_at"] < now]
+        for key in expired:
+            del self._semantic[key]
+        if expired:
+            self.counters["semantic"]["expired"] += len(expired)
+            self._semantic_matrix = None
+
+    def _build_semantic_matrix(self, dim: int):
+        """按需重建语义缓存的向量矩阵（条目变化后才重建），只包含维度一致的向量"""
+        if self._semantic_matrix is None:
+            keys = [key for key, entry in self._semantic.items() if entry["vector"].shape[0] == dim]
+            self._semantic_keys = keys
+            self._semantic_matrix = (np.vstack([self._semantic[key]["vector"] for key in keys]) if keys
+                                     else np.empty((0, dim), dtype=np.float32))
+        return self._semantic_matrix, self._semantic_keys
+
+    # ---------- 抽取结果缓存 ----------
+
+    def get_extraction(self, question: str) -> Optional[Dict]:
+        """查找问题的实体关系抽取结果，未命中返回 None"""
+        key = self.make_key(question)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result, graph_version, created_at FROM extractions WHERE key = ?", (key,)).fetchone()
+            if row is not None and (row[2] + self.extraction_ttl < now or
+                                    (self.graph_version is not None and row[1] != self.graph_version)):
+                self._conn.execute("DELETE FROM extractions WHERE key = ?", (key,))
+                self._conn.commit()
+                self._extraction_count -= 1
+                self.counters["extraction"]["expired"] += 1
+                row = None
+            if row is None:
+                self.counters["extraction"]["misses"] += 1
+                return None
+            self._conn.execute("UPDATE extractions SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.counters["extraction"]["hits"] += 1
+            return json.loads(row[0])
+
+    def put_extraction(self, question: str, result: Dict):
+        """写入实体关系抽取结果（没有抽取到实体的结果不缓存）"""
+        if not result.get("entities"):
+            return
+        key = self.make_key(question)
+        now = time.time()
+        with self._lock:
+            exists = self._conn.execute("SELECT 1 FROM extractions WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO extractions (key, question, result, graph_version, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, normalize_question(question), json.dumps(result, ensure_ascii=False),
+                 self.graph_version or "", now, now))
+            self._conn.commit()
+            if not exists:
+                self._extraction_count += 1
+            if self._extraction_count > self.max_extractions:
+                excess = self._extraction_count - int(self.max_extractions * 0.9)
+                self._conn.execute(
+                    "DELETE FROM extractions WHERE key IN "
+                    "(SELECT key FROM extractions ORDER BY last_access ASC LIMIT ?)", (excess,))
+                self._conn.commit()
+                self.counters["extraction"]["evictions"] += excess
+                self._extraction_count -= excess
+
+    # ---------- 管理 ----------
+
+    def clear(self):
+        """清空三级缓存"""
+        with self._lock:
+            self._exact.clear()
+            self._semantic.clear()
+            self._semantic_matrix = None
+            self._conn.execute("DELETE FROM extractions")
+            self._conn.commit()
+            self._extraction_count = 0
+
+    def stats(self) -> Dict:
+        """获取缓存统计信息（各级条目数、命中/未命中/淘汰/过期次数及命中率）"""
+        with self._lock:
+            sizes = {"exact": len(self._exact), "semantic": len(self._semantic),
+                     "extraction": self._extraction_count}
+            tiers = {}
+            for tier, counter in self.counters.items():
+                lookups = counter["hits"] + counter["misses"]
+                tiers[tier] = dict(counter, entries=sizes[tier],
+                                   hit_rate=counter["hits"] / lookups if lookups else 0.0)
+            return {
+                "graph_version": self.graph_version,
+                "invalidations": self.invalidations,
+                "similarity_threshold": self.similarity_threshold,
+                **tiers
+            }
@@ -7,8 +7,8 @@ from flask import Flask, render_template, request, Response, stream_with_context
 import q_a  # Assuming q_a.py is in the same directory or accessible via PYTHONPATH
 from rich.console import Console
 from ansi2html import Ansi2HTMLConverter  # For converting rich's ANSI output to HTML
-from py2neo import Graph as Py2neoGraph  # Explicit import for clarity
 from image_segmentation import image_segmentation_service  # Import image segmentation service
+from segmentation_batcher import SegmentationQueueFull
 from image_description import image_description_service  # Import image description service
 from dotenv import load_dotenv
 
@@ -24,6 +24,31 @@ original_q_a_console_print = None
 original_q_a_console_file = None
 current_sse_yield_callback = None
 
+# Process-wide RAG engine (created once, shared by all request threads)
+rag_engine = None
+rag_engine_lock = threading.Lock()
+
+
+def get_rag_engine():
+    """Return the shared Neo4jRAGSystem, creating it (and its connection pool) on first use."""
+    global rag_engine
+    if rag_engine is None:
+        with rag_engine_lock:
+            if rag_engine is None:
+                rag_engine = q_a.Neo4jRAGSystem(
+                    neo4j_uri=os.getenv("NEO4J_URI", "bolt://localhost:7687"),
+                    neo4j_user=os.getenv("NEO4J_USER", "neo4j"),
+                    neo4j_password=os.getenv("NEO4J_PASSWORD", "123456789"),
+                    pool_size=int(os.getenv("NEO4J_POOL_SIZE", "8")),
+                    retrieval_mode=os.getenv("RAG_RETRIEVAL_MODE", "standard"),
+                    execution_mode=os.getenv("RAG_EXECUTION_MODE", "sequential"),
+                    max_workers=int(os.getenv("RAG_MAX_WORKERS", "8")),
+                    stage_timeout=float(os.getenv("RAG_STAGE_TIMEOUT", "15")),
+                    enable_answer_cache=os.getenv("RAG_ANSWER_CACHE", "true").lower() != "false",
+                    enable_dictionary_extraction=os.getenv("RAG_DICTIONARY_EXTRACTION", "true").lower() != "false"
+                )
+    return rag_engine
+
 # --- Helper for Log Streaming ---
 def sse_log_print(*args, **kwargs):
     """
@@ -65,6 +90,44 @@ def sse_log_print(*args, **kwargs):
         original_q_a_console_print(*args, **kwargs)
 
 
+class SseLogStreamWrapper(io.TextIOBase):
+    """File-like object that turns console output into log_html SSE messages on a queue (anything with .put)."""
+    def __init__(self, q):
+        self.queue = q
+        self.buffer = ""
+        self.ansi_conv = Ansi2HTMLConverter(inline=True, scheme="solarized", linkify=False, dark_bg=True)
+
+    def write(self, s: str):
+        if not isinstance(s, str):
+            try:
+                s = s.decode(errors='replace')
+            except (AttributeError, UnicodeDecodeError):
+                s = str(s)
+        self.buffer += s
+        while True:
+            try:
+                newline_index = self.buffer.index('\n')
+            except ValueError:
+                break
+            line_to_process = self.buffer[:newline_index + 1]
+            self.buffer = self.buffer[newline_index + 1:]
+            if line_to_process.strip():
+                html_line = self.ansi_conv.convert(line_to_process.strip(), full=False)
+                self.queue.put({'type': 'log_html', 'content': f"<div class='log-item'>{html_line}</div>"})
+        return len(s.encode())
+
+    def flush(self):
+        if self.buffer.strip():
+            html_line = self.ansi_conv.convert(self.buffer.strip(), full=False)
+            self.queue.put({'type': 'log_html', 'content': f"<div class='log-item'>{html_line}</div>"})
+            self.buffer = ""
+
+    def isatty(self): return False
+    def readable(self): return False
+    def seekable(self): return False
+    def writable(self): return True
+
+
 # --- Routes ---
 @app.route("/", methods=["GET"])
 def index():
@@ -90,67 +153,20 @@ def ask_question():
         message_queue = queue.Queue()
         finished_signal = threading.Event()
 
-        class SseLogStreamWrapper(io.TextIOBase):
-            def __init__(self, q):
-                self.queue = q
-                self.buffer = ""
-                self.ansi_conv = Ansi2HTMLConverter(inline=True, scheme="solarized", linkify=False, dark_bg=True)
-
-            def write(self, s: str):
-                if not isinstance(s, str):
-                    try:
-                        s = s.decode(errors='replace')
-                    except (AttributeError, UnicodeDecodeError):
-                        s = str(s)
-                self.buffer += s
-                while True:
-                    try:
-                        newline_index = self.buffer.index('\n')
-                    except ValueError:
-                        break
-                    line_to_process = self.buffer[:newline_index + 1]
-                    self.buffer = self.buffer[newline_index + 1:]
-                    if line_to_process.strip():
-                        html_line = self.ansi_conv.convert(line_to_process.strip(), full=False)
-                        self.queue.put({'type': 'log_html', 'content': f"<div class='log-item'>{html_line}</div>"})
-                return len(s.encode())
-
-            def flush(self):
-                if self.buffer.strip():
-                    html_line = self.ansi_conv.convert(self.buffer.strip(), full=False)
-                    self.queue.put({'type': 'log_html', 'content': f"<div class='log-item'>{html_line}</div>"})
-                    self.buffer = ""
-
-            def isatty(self): return False
-            def readable(self): return False
-            def seekable(self): return False
-            def writable(self): return True
-
         def rag_worker(q, question, multi_hop, budget, finish_event):
-            original_q_a_console_file = None
             worker_sse_wrapper = SseLogStreamWrapper(q)
+            # Per-request console so concurrent questions don't interleave their logs
+            worker_console = Console(file=worker_sse_wrapper, color_system="truecolor", width=100)
 
             try:
-                if hasattr(q_a, 'console') and hasattr(q_a.console, 'file'):
-                    original_q_a_console_file = q_a.console.file
-
-                if hasattr(q_a, 'console'):
-                    q_a.console.file = worker_sse_wrapper
-                else:
-                    q.put({'type': 'error', 'content': 'Internal error: q_a.console not found.'})
-                    finish_event.set()
-                    return
-
-                # ✅ Use environment variables for Neo4j config
-                rag_system = q_a.Neo4jRAGSystem(
-                    neo4j_uri=os.getenv("NEO4J_URI", "bolt://localhost:7687"),
-                    neo4j_user=os.getenv("NEO4J_USER", "neo4j"),
-                    neo4j_password=os.getenv("NEO4J_PASSWORD", "123456789"),
+                final_answer = get_rag_engine().answer_question(
+                    question,
                     enable_multi_hop=multi_hop,
-                    search_budget_mode=budget
+                    search_budget_mode=budget,
+                    console=worker_console,
+                    # Forward tokens as they arrive; the final 'answer' event still carries the full text
+                    on_delta=lambda delta: q.put({'type': 'answer_delta', 'content': delta})
                 )
-
-                final_answer = rag_system.answer_question(question)
                 worker_sse_wrapper.flush()
                 q.put({'type': 'answer', 'content': final_answer})
 
@@ -162,8 +178,6 @@ def ask_question():
                     pass
                 q.put({'type': 'error', 'content': f"An error occurred: {str(e)}"})
             finally:
-                if original_q_a_console_file is not None and hasattr(q_a, 'console'):
-                    q_a.console.file = original_q_a_console_file
                 finish_event.set()
                 q.put({'type': 'finished'})
 
@@ -240,11 +254,52 @@ def upload_image():
             "description": description
         })
 
+    except SegmentationQueueFull as e:
+        # Backpressure: the segmentation queue is full, ask the client to retry instead of queueing unboundedly
+        app.logger.warning(f"图像分割队列已满: {e}")
+        return jsonify({"error": f"Image segmentation is busy, please retry later: {str(e)}"}), 503, {"Retry-After": "2"}
     except Exception as e:
         app.logger.error(f"图像分割过程中出错: {e}", exc_info=True)
         return jsonify({"error": f"Image segmentation error: {str(e)}"}), 500
 
 
+@app.route('/segment_prompt', methods=['POST'])
+def segment_prompt():
+    """在已上传图像的缓存分割结果上执行点/框/文本提示（不重新运行模型）"""
+    data = request.get_json(silent=True) or {}
+    image_id = data.get("image_id")
+    if not image_id:
+        return jsonify({"error": "Missing image_id."}), 400
+
+    points = data.get("points") or None
+    point_labels = data.get("point_labels") or None
+    if points and (not point_labels or len(point_labels) != len(points)):
+        return jsonify({"error": "point_labels must have one label per point."}), 400
+
+    try:
+        segmented_path, seg_info = image_segmentation_service.prompt_session(
+            image_id,
+            text_prompt=data.get("text") or None,
+            point_prompts=points,
+            point_labels=point_labels,
+            box_prompts=data.get("boxes") or None,
+            better_quality=True,
+            withContours=True,
+            mask_random_color=True
+        )
+        if not segmented_path:
+            return jsonify({"error": f"Prompt segmentation failed: {seg_info}"}), 400
+
+        return jsonify({
+            "success": True,
+            "segmented_image": f"/segmented/{os.path.basename(segmented_path)}",
+            "segmentation_info": seg_info
+        })
+    except Exception as e:
+        app.logger.error(f"提示分割过程中出错: {e}", exc_info=True)
+        return jsonify({"error": f"Prompt segmentation error: {str(e)}"}), 500
+
+
 @app.route('/uploads/<filename>')
 def uploaded_file(filename):
     return send_from_directory('static/uploads', filename)
@@ -255,20 +310,22 @@ def segmented_file(filename):
     return send_from_directory('static/segmented', filename)
 
 
+@app.route('/health', methods=['GET'])
+def health():
+    """Neo4j connectivity, connection pool usage, embedding cache and image segmentation queue metrics."""
+    status = get_rag_engine().health()
+    status["image_segmentation"] = image_segmentation_service.get_model_status()
+    return jsonify(status), (200 if status["neo4j"]["ok"] else 503)
+
+
 # --- Startup Neo4j Connection Test ---
 def test_neo4j_connection():
-    try:
-        graph = Py2neoGraph(
-            os.getenv("NEO4J_URI", "bolt://localhost:7687"),
-            auth=(
-                os.getenv("NEO4J_USER", "neo4j"),
-                os.getenv("NEO4J_PASSWORD", "123456789")
-            )
-        )
-        graph.run("RETURN 1")
-        app.logger.info("Neo4j connection successful at startup.")
-    except Exception as e:
-        app.logger.error(f"Neo4j connection failed at startup: {e}")
+    # Building the shared engine opens the connection pool once for the whole process
+    status = get_rag_engine().pool.health_check()
+    if status["ok"]:
+        app.logger.info(f"Neo4j connection successful at startup ({status['latency_ms']} ms).")
+    else:
+        app.logger.error(f"Neo4j connection failed at startup: {status['error']}")
         # Optional: sys.exit(1) if you want to crash on failure
 
 
@@ -0,0 +1,122 @@
+"""
+ASGI entry point: serves /ask and /health from an asyncio pipeline and mounts the Flask app for everything else.
+
+Run with:  uvicorn asgi_app:app --host 0.0.0.0 --port 5001
+"""
+import os
+import json
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
+from a2wsgi import WSGIMiddleware
+from rich.console import Console
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Mount, Route
+from dotenv import load_dotenv
+
+from app import app as flask_app, SseLogStreamWrapper
+from async_rag import AsyncNeo4jRAGSystem
+
+# Load environment variables from .env file
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Process-wide async RAG engine (created in lifespan, shared by all requests on the event loop)
+rag_engine = None
+
+
+class _AsyncQueueAdapter:
+    """Gives an asyncio.Queue the .put interface SseLogStreamWrapper expects (called from the event loop thread)."""
+    def __init__(self, q: asyncio.Queue):
+        self.put = q.put_nowait
+
+
+async def ask_question(request: Request):
+    data = await request.json()
+    question_text = data.get("question")
+    enable_multi_hop = data.get("enable_multi_hop", True)
+    search_budget = data.get("search_budget", "Deeper")
+
+    if not question_text:
+        return JSONResponse({"error": "No question provided."}, status_code=400)
+
+    message_queue = asyncio.Queue()
+    sse_wrapper = SseLogStreamWrapper(_AsyncQueueAdapter(message_queue))
+    # Per-request console so concurrent questions don't interleave their logs
+    request_console = Console(file=sse_wrapper, color_system="truecolor", width=100)
+
+    async def rag_task():
+        try:
+            final_answer = await rag_engine.answer_question(
+                question_text,
+                enable_multi_hop=enable_multi_hop,
+                search_budget_mode=search_budget,
+                console=request_console,
+                # Forward tokens as they arrive; the final 'answer' event still carries the full text
+                on_delta=lambda delta: message_queue.put_nowait({'type': 'answer_delta', 'content': delta})
+            )
+            sse_wrapper.flush()
+            message_queue.put_nowait({'type': 'answer', 'content': final_answer})
+        except Exception as e:
+            logger.error(f"Error in RAG task: {e}", exc_info=True)
+            try:
+                sse_wrapper.flush()
+            except Exception:
+                pass
+            message_queue.put_nowait({'type': 'error', 'content': f"An error occurred: {str(e)}"})
+        finally:
+            message_queue.put_nowait({'type': 'finished'})
+
+    async def generate_response_stream():
+        task = asyncio.create_task(rag_task())
+        try:
+            while True:
+                msg = await message_queue.get()
+                yield f"data: {json.dumps(msg)}\n\n"
+                if msg.get('type') == 'finished':
+                    break
+        finally:
+            # Client went away: stop the pipeline instead of letting it run to completion
+            if not task.done():
+                task.cancel()
+
+    return StreamingResponse(generate_response_stream(), media_type='text/event-stream')
+
+
+async def health(request: Request):
+    """Report Neo4j connectivity and embedding cache statistics."""
+    status = await rag_engine.health()
+    return JSONResponse(status, status_code=200 if status["neo4j"]["ok"] else 503)
+
+
+@asynccontextmanager
+async def lifespan(_app):
+    global rag_engine
+    rag_engine = AsyncNeo4jRAGSystem(
+        neo4j_uri=os.getenv("NEO4J_URI", "bolt://localhost:7687"),
+        neo4j_user=os.getenv("NEO4J_USER", "neo4j"),
+        neo4j_password=os.getenv("NEO4J_PASSWORD", "123456789"),
+        max_neo4j_connections=int(os.getenv("NEO4J_POOL_SIZE", "50")),
+        max_http_connections=int(os.getenv("RAG_MAX_HTTP_CONNECTIONS", "100")),
+        enable_answer_cache=os.getenv("RAG_ANSWER_CACHE", "true").lower() != "false",
+        enable_dictionary_extraction=os.getenv("RAG_DICTIONARY_EXTRACTION", "true").lower() != "false"
+    )
+    try:
+        yield
+    finally:
+        await rag_engine.close()
+
+
+app = Starlette(
+    routes=[
+        Route("/ask", ask_question, methods=["POST"]),
+        Route("/health", health, methods=["GET"]),
+        # Index page, static files, image upload/segmentation and the rest stay on Flask
+        Mount("/", app=WSGIMiddleware(flask_app)),
+    ],
+    lifespan=lifespan
+)
@@ -0,0 +1,535 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+异步问答模块 - 基于 asyncio 的知识图谱问答管道
+
+LLM 与嵌入接口使用 httpx.AsyncClient（连接保活、连接数上限），知识图谱使用 Neo4j 官方异步驱动，
+检索采用与 Neo4jRAGSystem 批量模式相同的 UNWIND 查询（1~2 次往返）。单个事件循环即可同时处理
+大量进行中的问题，无需为每个问题创建一个系统线程。
+"""
+import asyncio
+import contextvars
+import time
+from typing import Callable, Dict, List, Optional
+
+import httpx
+from neo4j import AsyncGraphDatabase
+from rich.console import Console
+from rich.markdown import Markdown
+from rich.panel import Panel
+
+from q_a import (ALI_API_KEY, ALI_BASE_URL, ALI_MODEL, EMBEDDING_BATCH_SIZE, EMBEDDING_MODEL, FALLBACK_ANSWER,
+                 RAGSystemBase)
+from answer_cache import GRAPH_VERSION_QUERY
+from embedding_cache import normalize_text
+from similarity import SimilarityScorer, rank_scores
+
+# 当前任务使用的日志控制台与阶段耗时（每个 asyncio 任务各自独立）
+_console_var = contextvars.ContextVar("rag_console", default=None)
+_timings_var = contextvars.ContextVar("rag_timings", default=None)
+
+
+class AsyncNeo4jRAGSystem(RAGSystemBase):
+    """异步知识图谱问答系统类
+
+    与 Neo4jRAGSystem 共用 RAGSystemBase 中的提示词、结果解析、批量检索查询、提示词构建和缓存逻辑；
+    所有网络 I/O（LLM、嵌入、Neo4j）均为协程，需在事件循环中调用。
+    """
+
+    def __init__(self, neo4j_uri: str, neo4j_user: str, neo4j_password: str,
+                 enable_multi_hop: bool = True, search_budget_mode: str = "Deeper",
+                 max_neo4j_connections: int = 50, max_http_connections: int = 100,
+                 http_timeout: float = 60.0, enable_answer_cache: bool = True,
+                 enable_dictionary_extraction: bool = True):
+        """
+        初始化异步RAG系统
+        Args:
+            max_neo4j_connections: Neo4j异步驱动的连接池大小
+            max_http_connections: LLM/嵌入接口的最大并发连接数
+            http_timeout: HTTP请求超时时间（秒）
+            enable_answer_cache: 是否启用答案缓存（与同步版本共用全局 answer_cache）
+            enable_dictionary_extraction: 是否先用实体词典在本地识别实体（与同步版本共用全局 entity_dictionary）
+        """
+        super().__init__(enable_multi_hop=enable_multi_hop, search_budget_mode=search_budget_mode,
+                         enable_answer_cache=enable_answer_cache,
+                         enable_dictionary_extraction=enable_dictionary_extraction)
+        self.driver = AsyncGraphDatabase.driver(neo4j_uri, auth=(neo4j_user, neo4j_password),
+                                                max_connection_pool_size=max_neo4j_connections)
+        self.http = httpx.AsyncClient(
+            timeout=http_timeout,
+            limits=httpx.Limits(max_connections=max_http_connections,
+                                max_keepalive_connections=max_http_connections),
+            headers={'Authorization': f'Bearer {ALI_API_KEY}', 'Content-Type': 'application/json'}
+        )
+        if self.enable_dictionary_extraction:
+            self.entity_dictionary.load()
+
+    @property
+    def console(self) -> Console:
+        """当前任务使用的控制台（未单独指定时使用全局控制台）"""
+        return _console_var.get() or self._default_console
+
+    def _record_timing(self, stage: str, start: float):
+        """记录当前任务中某个阶段的耗时（秒）"""
+        timings = _timings_var.get()
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - start
+
+    async def close(self):
+        """关闭Neo4j驱动和HTTP客户端"""
+        await self.driver.close()
+        await self.http.aclose()
+
+    async def _run(self, query: str, **parameters) -> List[Dict]:
+        """执行Cypher查询，返回保留节点/关系对象的记录列表"""
+        async with self.driver.session() as session:
+            result = await session.run(query, parameters)
+            return [{key: record[key] for key in record.keys()} async for record in result]
+
+    async def _post(self, path: str, data: Dict, error_name: str) -> Dict:
+        """POST请求阿里云通义千问API，带重试机制"""
+        max_retries = 3
+        base_delay = 1.0
+        for attempt in range(max_retries):
+            try:
+                if attempt > 0:
+                    await asyncio.sleep(base_delay * (2 ** attempt))
+                response = await self.http.post(f'{ALI_BASE_URL}{path}', json=data)
+                if response.status_code == 429:
+                    if attempt < max_retries - 1:
+                        continue
+                    raise Exception(f"{error_name}调用频率受限，已达到最大重试次数: {response.status_code}, {response.text}")
+                if response.status_code != 200:
+                    raise Exception(f"{error_name}调用失败: {response.status_code}, {response.text}")
+                return response.json()
+            except Exception:
+                if attempt < max_retries - 1:
+                    continue
+                raise
+        raise Exception(f"{error_name}调用失败")
+
+    async def call_llm(self, prompt: str, temperature: float = 0.7,
+                       on_delta: Optional[Callable[[str], None]] = None) -> str:
+        """异步调用阿里云通义千问API（提供 on_delta 时以流式模式调用，逐段回调增量文本）"""
+        if on_delta is not None:
+            return await self._call_llm_stream(prompt, temperature, on_delta)
+        res_obj = await self._post('/chat/completions', {
+            'model': ALI_MODEL,
+            'messages': [{"role": "user", "content": prompt}],
+            'temperature': temperature
+        }, "LLM API")
+        if 'choices' in res_obj and len(res_obj['choices']) > 0:
+            return res_obj['choices'][0]['message']['content']
+        raise Exception(f"LLM API返回格式错误: {res_obj}")
+
+    async def _call_llm_stream(self, prompt: str, temperature: float, on_delta: Callable[[str], None]) -> str:
+        """以流式模式异步调用阿里云通义千问API，已输出增量后出错不再重试"""
+        data = {
+            'model': ALI_MODEL,
+            'messages': [{"role": "user", "content": prompt}],
+            'temperature': temperature,
+            'stream': True
+        }
+        max_retries = 3
+        base_delay = 1.0
+        for attempt in range(max_retries):
+            parts = []
+            try:
+                if attempt > 0:
+                    await asyncio.sleep(base_delay * (2 ** attempt))
+                async with self.http.stream('POST', f'{ALI_BASE_URL}/chat/completions', json=data) as response:
+                    if response.status_code != 200:
+                        body = (await response.aread()).decode(errors='replace')
+                        if response.status_code == 429 and attempt < max_retries - 1:
+                            continue
+                        raise Exception(f"LLM API调用失败: {response.status_code}, {body}")
+                    async for line in response.aiter_lines():
+                        if not line:
+                            continue
+                        delta = self._parse_stream_line(line)
+                        if delta is None:
+                            break
+                        if delta:
+                            parts.append(delta)
+                            on_delta(delta)
+                if not parts:
+                    raise Exception("LLM API流式响应为空")
+                return "".join(parts)
+            except Exception:
+                if parts or attempt >= max_retries - 1:
+                    raise
+        raise Exception("LLM调用失败")
+
+    async def _request_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """异步请求一批文本的向量表示（输入数量不超过批量上限）"""
+        try:
+            result = await self._post('/embeddings', {'model': EMBEDDING_MODEL, 'input': texts}, "嵌入API")
+            if 'data' in result and len(result['data']) == len(texts) and \
+                    all('embedding' in item for item in result['data']):
+                items = sorted(result['data'], key=lambda item: item.get('index', 0))
+                return [item['embedding'] for item in items]
+            raise Exception(f"嵌入API返回格式错误: {result}")
+        except Exception as e:
+            self.console.print(f"获取向量表示出错: {str(e)}", style="bold red")
+            return [[] for _ in texts]
+
+    async def get_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """批量获取文本的向量表示（读取缓存，未命中部分分块并发请求）"""
+        # 缓存读写会访问 SQLite，整批放到线程中执行以免阻塞事件循环
+        embeddings, missing = await asyncio.to_thread(self._read_embedding_cache, texts)
+        pending = list(missing.keys())
+        chunks = [pending[start:start + EMBEDDING_BATCH_SIZE] for start in range(0, len(pending), EMBEDDING_BATCH_SIZE)]
+        chunk_vectors = await asyncio.gather(*[self._request_embeddings(chunk) for chunk in chunks])
+        fetched = []
+        for chunk, vectors in zip(chunks, chunk_vectors):
+            for text, vector in zip(chunk, vectors):
+                fetched.append((text, vector))
+                for idx in missing[text]:
+                    embeddings[idx] = vector
+        if fetched:
+            await asyncio.to_thread(self._write_embedding_cache, fetched)
+        return embeddings
+
+    def _read_embedding_cache(self, texts: List[str]):
+        """读取向量缓存，返回 (向量列表, 未命中的规范化文本 -> 需要填充的位置列表)"""
+        embeddings = [[] for _ in texts]
+        missing = {}
+        for idx, text in enumerate(texts):
+            if not text or not text.strip():
+                continue
+            cached = self.embedding_cache.get(EMBEDDING_MODEL, text)
+            if cached is not None:
+                embeddings[idx] = cached
+            else:
+                missing.setdefault(normalize_text(text), []).append(idx)
+        return embeddings, missing
+
+    def _write_embedding_cache(self, items: List[tuple]):
+        """把新请求到的 (文本, 向量) 批量写入向量缓存"""
+        for text, vector in items:
+            self.embedding_cache.put(EMBEDDING_MODEL, text, vector)
+
+    async def get_embedding(self, text: str) -> List[float]:
+        """获取单个文本的向量表示"""
+        return (await self.get_embeddings([text]))[0]
+
+    async def extract_entities_relations(self, text: str) -> Dict:
+        """使用LLM提取实体和关系"""
+        self.console.print(Panel(f"[bold blue]问题分析[/bold blue]：\n{text}",
+                                 border_style="blue", expand=False))
+        if self._dictionary_ready():
+            # 只把自动机匹配放到线程中，日志在事件循环线程输出（请求控制台写入的 asyncio.Queue 不是线程安全的）
+            dictionary_result = self._accept_dictionary_result(
+                await asyncio.to_thread(self.entity_dictionary.extract, text))
+            if dictionary_result is not None:
+                return dictionary_result
+        try:
+            self.console.print("正在提取实体和关系...", style="blue")
+            full_prompt = f"{self.entity_extraction_prompt}\n\n请从以下文本中提取关键实体和实体间的关系:\n\n{text}"
+            content = await self.call_llm(full_prompt, temperature=0.2)
+            return self._parse_extraction_content(content)
+        except Exception as e:
+            self.console.print(f"实体关系抽取出错: {str(e)}", style="bold red")
+            return {"entities": [], "relations": []}
+
+    async def query_neo4j(self, entities: List[Dict], relations: List[Dict],
+                          enable_multi_hop: bool = None, search_budget: Dict = None) -> Dict:
+        """查询Neo4j数据库（批量检索：第一次往返取回实体属性、关系三元组和第一跳，第二次往返取回第二跳）"""
+        enable_multi_hop = self.enable_multi_hop if enable_multi_hop is None else enable_multi_hop
+        search_budget = search_budget or self.search_budget
+        self.console.print(Panel("[bold green]知识图谱查询[/bold green]", border_style="green", expand=False))
+        result = {
+            "entity_properties": [],
+            "related_triples": []
+        }
+        processed_entities = set()
+        question_text = " ".join([e.get("name", "") for e in entities] + [r.get("type", "") for r in relations])
+
+        # 问题向量与第一次批量查询同时进行
+        stage_start = time.perf_counter()
+        question_embedding, batched = await asyncio.gather(
+            self.get_embedding(question_text),
+            self._run(self.BATCHED_RETRIEVAL_QUERY, **self._batched_parameters(entities, relations, search_budget)),
+            return_exceptions=True)
+        self._record_timing("批量查询", stage_start)
+        if isinstance(question_embedding, Exception):
+            question_embedding = []
+        if isinstance(batched, Exception):
+            self.console.print(f"查询知识图谱出错: {str(batched)}", style="bold red")
+            return result
+        prefetched = self._parse_batched_record(batched[0])
+        scorer = SimilarityScorer(question_embedding)
+
+        # 1. 实体属性
+        stage_start = time.perf_counter()
+        matched_entity_names = []
+        for idx, entity in enumerate(entities):
+            if "name" not in entity:
+                self.console.print(f"警告：实体缺少name属性: {entity}", style="yellow")
+                continue
+            entity_name = entity["name"]
+            entity_type = entity.get("type", "Other")
+            processed_entities.add(entity_name)
+            nodes = prefetched["entity_nodes"].get(idx, [])
+            self.console.print(f"查询实体: [cyan]{entity_name}[/cyan] ([magenta]{entity_type}[/magenta])，"
+                               f"找到 [bold]{len(nodes)}[/bold] 个匹配实体")
+            for node in nodes:
+                result["entity_properties"].append({
+                    "name": entity_name,
+                    "type": entity_type,
+                    "properties": dict(node["n"])
+                })
+                matched_entity_names.append(entity_name)
+
+        # 2. 关系三元组候选
+        relation_candidates = []
+        for idx, relation in enumerate(relations):
+            triples = prefetched["relation_triples"].get(idx, [])
+            if not triples:
+                continue
+            candidates = []
+            for triple_data in triples:
+                current_rel_type = type(triple_data["r"]).__name__
+                current_entity_name = triple_data["s"].get("name") or triple_data["t"].get("name", "")
+                candidates.append({
+                    "text": f"{current_entity_name} {current_rel_type}",
+                    "source": dict(triple_data["s"]),
+                    "relation": current_rel_type,
+                    "target": dict(triple_data["t"])
+                })
+            relation_candidates.append((relation, candidates))
+
+        # 3. 第一跳相连实体（默认相似度0.5）
+        one_hop_names = []
+        one_hop_triples = []
+        for idx, entity in enumerate(entities):
+            if "name" not in entity:
+                continue
+            outgoing, incoming = prefetched["one_hop"].get(idx, ([], []))
+            for triple, source_key, target_key in [(t, "n", "m") for t in outgoing] + [(t, "m", "n") for t in incoming]:
+                one_hop_triples.append({
+                    "similarity": 0.5,
+                    "source": dict(triple[source_key]),
+                    "relation": type(triple["r"]).__name__,
+                    "target": dict(triple[target_key])
+                })
+                target_name = triple[target_key].get("name", "未知")
+                if target_name not in processed_entities:
+                    processed_entities.add(target_name)
+                    one_hop_names.append(target_name)
+            self.console.print(f"与 [cyan]{entity['name']}[/cyan] 相连的实体: "
+                               f"[bold]{len(outgoing)}[/bold] 个相连, [bold]{len(incoming)}[/bold] 个被相连")
+
+        # 三个阶段的候选文本通过一次批量请求获取向量
+        triple_texts = [c["text"] for _, candidates in relation_candidates for c in candidates]
+        vectors = await self.get_embeddings(matched_entity_names + triple_texts + one_hop_names)
+        entity_vectors = vectors[:len(matched_entity_names)]
+        triple_vectors = vectors[len(matched_entity_names):len(matched_entity_names) + len(triple_texts)]
+        one_hop_vectors = vectors[len(matched_entity_names) + len(triple_texts):]
+
+        entities_for_multi_hop = [{"name": name, "similarity": float(similarity)} for name, similarity in
+                                  zip(matched_entity_names + one_hop_names,
+                                      scorer.score(entity_vectors + one_hop_vectors))]
+        offset = 0
+        for relation, candidates in relation_candidates:
+            indices, scores = scorer.top_k(triple_vectors[offset:offset + len(candidates)],
+                                           search_budget['top_k_triples'])
+            offset += len(candidates)
+            for i, similarity in zip(indices, scores):
+                result["related_triples"].append({
+                    "similarity": float(similarity),
+                    "source": candidates[i]["source"],
+                    "relation": candidates[i]["relation"],
+                    "target": candidates[i]["target"]
+                })
+                self.console.print(
+                    f"匹配: [cyan]{candidates[i]['source'].get('name', '')}[/cyan] --[yellow]{candidates[i]['relation']}[/yellow]--> "
+                    f"[green]{candidates[i]['target'].get('name', '')}[/green] (相似度: {similarity:.2f})")
+        result["related_triples"].extend(one_hop_triples)
+        self._record_timing("向量打分", stage_start)
+
+        # 4. 第二跳
+        if enable_multi_hop and entities_for_multi_hop:
+            stage_start = time.perf_counter()
+            top_indices = rank_scores([e["similarity"] for e in entities_for_multi_hop],
+                                      search_budget['top_k_multi_hop_entities'])
+            top_entities = [entities_for_multi_hop[i] for i in top_indices]
+            self.console.print(Panel("[bold yellow]多跳查询（第二跳）[/bold yellow]", border_style="yellow", expand=False))
+            for idx, entity in enumerate(top_entities):
+                self.console.print(f"  {idx + 1}. [cyan]{entity['name']}[/cyan] (相似度: {entity['similarity']:.2f})")
+            try:
+                records = await self._run(self.BATCHED_SECOND_HOP_QUERY,
+                                          names=list(dict.fromkeys(e["name"] for e in top_entities)),
+                                          labels=self.GRAPH_LABELS,
+                                          multi_hop_limit=search_budget['multi_hop_limit'])
+            except Exception as e:
+                self.console.print(f"查询第二跳实体出错: {str(e)}", style="bold red")
+                records = []
+            second_hop = {record["name"]: record["records"] for record in records}
+            second_hop_triples = []
+            for entity in top_entities:
+                for triple in second_hop.get(entity["name"], []):
+                    target_name = triple["m"].get("name", "未知")
+                    if target_name not in processed_entities:
+                        processed_entities.add(target_name)
+                        second_hop_triples.append(triple)
+            second_hop_vectors = await self.get_embeddings([t["m"].get("name", "未知") for t in second_hop_triples])
+            indices, scores = scorer.top_k(second_hop_vectors)
+            for i, similarity in zip(indices, scores):
+                triple = second_hop_triples[i]
+                rel_type = type(triple["r"]).__name__
+                result["related_triples"].append({
+                    "similarity": float(similarity),
+                    "source": dict(triple["n"]),
+                    "relation": rel_type,
+                    "target": dict(triple["m"]),
+                    "hop": 2
+                })
+                self.console.print(
+                    f"第二跳实体: [cyan]{triple['n'].get('name', '未知')}[/cyan] --[yellow]{rel_type}[/yellow]--> "
+                    f"[green]{triple['m'].get('name', '未知')}[/green] (相似度: {similarity:.2f})")
+            self._record_timing("第二跳", stage_start)
+
+        result["related_triples"] = [result["related_triples"][i] for i in
+                                     rank_scores([t["similarity"] for t in result["related_triples"]])]
+        self.console.print(
+            f"查询结果: {len(result['entity_properties'])} 个实体, {len(result['related_triples'])} 个关系三元组",
+            style="bold blue")
+        return result
+
+    async def generate_answer(self, question: str, knowledge: Dict,
+                              on_delta: Optional[Callable[[str], None]] = None) -> str:
+        """生成答案（提供 on_delta 时流式生成，每段增量文本回调一次）"""
+        self.console.print(Panel("[bold purple]生成回答[/bold purple]", border_style="purple", expand=False))
+        try:
+            full_prompt = self._build_answer_prompt(question, knowledge)
+            self.console.print("阿里云通义千问思考中...", style="blue")
+            if on_delta is None:
+                answer = await self.call_llm(full_prompt)
+            else:
+                stage_start = time.perf_counter()
+                first_delta = []
+
+                def forward(delta: str):
+                    if not first_delta:
+                        first_delta.append(delta)
+                        self._record_timing("首字延迟", stage_start)
+                    on_delta(delta)
+                answer = await self.call_llm(full_prompt, on_delta=forward)
+            self.console.print("回答生成完成!", style="bold green")
+            return answer
+        except Exception as e:
+            self.console.print(f"生成答案出错: {str(e)}", style="bold red")
+            return FALLBACK_ANSWER
+
+    async def answer_question(self, question: str, enable_multi_hop: bool = None,
+                              search_budget_mode: str = None, console: Console = None,
+                              on_delta: Optional[Callable[[str], None]] = None) -> str:
+        """
+        回答问题的主函数（协程）
+        Args:
+            question: 用户问题
+            enable_multi_hop: 本次调用是否启用多跳查询，默认使用初始化时的设置
+            search_budget_mode: 本次调用的搜索预算模式，默认使用初始化时的设置
+            console: 本次调用输出日志的控制台，默认使用全局控制台
+            on_delta: 答案增量文本回调，提供时答案以流式模式生成
+        """
+        console_token = _console_var.set(console)
+        timings_token = _timings_var.set({})
+        try:
+            search_budget = self._resolve_search_budget(search_budget_mode) if search_budget_mode else None
+            variant = self._answer_cache_variant(enable_multi_hop, search_budget)
+            self.console.print(Panel(f"[bold]问题[/bold]: {question}",
+                                     title="医学知识图谱问答系统",
+                                     border_style="cyan",
+                                     expand=False))
+
+            question_embedding = None
+            if self.enable_answer_cache or self.enable_dictionary_extraction:
+                await self._refresh_graph_version()
+            if self.enable_answer_cache:
+                stage_start = time.perf_counter()
+                cached_answer = await asyncio.to_thread(self.answer_cache.get_exact, question, variant)
+                self._record_timing("答案缓存", stage_start)
+                if cached_answer is not None:
+                    self.console.print("命中答案缓存（精确匹配）", style="bold green")
+                    self._show_cached_answer(cached_answer, on_delta)
+                    self._print_timings(_timings_var.get())
+                    return cached_answer
+
+            stage_start = time.perf_counter()
+            extraction_result = (await asyncio.to_thread(self.answer_cache.get_extraction, question)
+                                 if self.enable_answer_cache else None)
+            if extraction_result is not None:
+                self.console.print(
+                    f"命中抽取缓存: {len(extraction_result['entities'])} 个实体, "
+                    f"{len(extraction_result['relations'])} 个关系", style="bold green")
+            else:
+                extraction_result = await self.extract_entities_relations(question)
+                if self.enable_answer_cache:
+                    await asyncio.to_thread(self.answer_cache.put_extraction, question, extraction_result)
+            self._record_timing("实体抽取", stage_start)
+
+            # 语义匹配要求抽取出的实体相同，因此放在实体抽取之后
+            if self.enable_answer_cache and extraction_result["entities"]:
+                stage_start = time.perf_counter()
+                question_embedding = await self.get_embedding(question)
+                cached_answer = self._accept_semantic_hit(await asyncio.to_thread(
+                    self.answer_cache.get_semantic, question_embedding, variant, extraction_result["entities"]))
+                self._record_timing("答案缓存", stage_start)
+                if cached_answer is not None:
+                    self._show_cached_answer(cached_answer, on_delta)
+                    self._print_timings(_timings_var.get())
+                    return cached_answer
+
+            stage_start = time.perf_counter()
+            knowledge = await self.query_neo4j(extraction_result["entities"], extraction_result["relations"],
+                                               enable_multi_hop=enable_multi_hop, search_budget=search_budget)
+            self._record_timing("知识图谱查询", stage_start)
+
+            stage_start = time.perf_counter()
+            answer = await self.generate_answer(question, knowledge, on_delta=on_delta)
+            self._record_timing("答案生成", stage_start)
+            if self.enable_answer_cache and answer != FALLBACK_ANSWER:
+                await asyncio.to_thread(self.answer_cache.put_answer, question, answer, question_embedding, variant,
+                                        extraction_result["entities"])
+
+            self.console.print(Panel(Markdown(answer), title="回答", border_style="green", expand=False))
+            self._print_timings(_timings_var.get())
+            return answer
+        finally:
+            _timings_var.reset(timings_token)
+            _console_var.reset(console_token)
+
+    async def _refresh_graph_version(self):
+        """按检查间隔读取图谱版本号，图谱重新导入后答案缓存随之失效、实体词典随之增量更新"""
+        if not self.answer_cache.needs_version_check():
+            return
+        try:
+            records = await self._run(GRAPH_VERSION_QUERY)
+            version = records[0]["version"] if records else ""
+            # 清空缓存、构建自动机和写盘是 CPU/磁盘操作，放到线程中执行以免阻塞事件循环；
+            # 线程中不输出日志，日志回到事件循环线程再输出
+            await asyncio.to_thread(self.answer_cache.set_graph_version, version)
+            if self._entity_dictionary_stale(version):
+                names = await self._run(self.ENTITY_NAMES_QUERY, labels=self.GRAPH_LABELS)
+                changes = await asyncio.to_thread(self.entity_dictionary.update, names, version)
+                await asyncio.to_thread(self.entity_dictionary.save)
+                self._print_dictionary_update(changes)
+        except Exception as e:
+            self.console.print(f"读取图谱版本号出错: {str(e)}", style="yellow")
+
+    async def health(self) -> Dict:
+        """获取系统健康状态与运行指标"""
+        start = time.perf_counter()
+        try:
+            await self._run("RETURN 1")
+            neo4j_status = {"ok": True, "latency_ms": round((time.perf_counter() - start) * 1000, 2)}
+        except Exception as e:
+            neo4j_status = {"ok": False, "error": str(e)}
+        return {
+            "neo4j": neo4j_status,
+            "embedding_cache": self.embedding_cache.stats(),
+            "answer_cache": self.answer_cache.stats(),
+            "entity_dictionary": self.entity_dictionary.stats()
+        }
@@ -0,0 +1,179 @@
+"""
+FastSAM 后处理基准（CPU）- 对比原后处理与"两阶段 NMS + 分块掩码组装"在不同 max_det 下的耗时与峰值内存
+
+原实现在 NMS 前把每个候选框的 32 个掩码系数拼进检测矩阵，NMS 后一次性解码全部保留框的掩码
+（retina_masks 时先把 N×H×W 浮点掩码整体上采样到原图尺寸再裁剪）；
+新实现 NMS 只处理框和分数，之后按保留框的下标取掩码系数，按块解码并写入预分配的 N×H×W 布尔输出。
+
+输入为随机生成的模型输出（不需要模型权重），每个配置在独立子进程中运行，峰值内存为该进程 ru_maxrss 的增量。
+
+用法:
+    python benchmarks/bench_fastsam_postprocess.py --max-dets 100 300 1000 --size 1024 1365
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import torch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fastsam import FastSAMPredictor  # noqa: E402
+from ultralytics.yolo.engine.results import Results  # noqa: E402
+from ultralytics.yolo.utils import ops  # noqa: E402
+from fastsam.utils import bbox_iou  # noqa: E402
+
+STRIDES = (8, 16, 32)
+NUM_MASKS = 32
+
+
+def make_inputs(height, width, imgsz, seed=0):
+    """随机生成一张图像的模型输出：preds (1, 4 + 1 + 32, anchors) 与 protos (1, 32, h/4, w/4)"""
+    gain = imgsz / max(height, width)
+    input_h, input_w = (int(round(s * gain)) for s in (height, width))
+    input_h, input_w = input_h + (-input_h) % 32, input_w + (-input_w) % 32
+    anchors = sum((input_h // s) * (input_w // s) for s in STRIDES)
+    generator = torch.Generator().manual_seed(seed)
+    boxes = torch.rand((4, anchors), generator=generator)
+    boxes[0] *= input_w
+    boxes[1] *= input_h
+    boxes[2:] = boxes[2:] * 190 + 10
+    scores = torch.rand((1, anchors), generator=generator)
+    coefficients = torch.randn((NUM_MASKS, anchors), generator=generator)
+    preds = torch.cat([boxes, scores, coefficients])[None]
+    protos = torch.randn((1, NUM_MASKS, input_h // 4, input_w // 4), generator=generator)
+    img = torch.zeros((1, 3, input_h, input_w))
+    orig_img = np.zeros((height, width, 3), dtype=np.uint8)
+    return (preds, protos), img, [orig_img]
+
+
+def make_predictor(max_det, retina_masks, chunk_size):
+    """不加载模型，只带后处理需要的属性"""
+    predictor = FastSAMPredictor.__new__(FastSAMPredictor)
+    predictor.args = SimpleNamespace(conf=0.25, iou=0.9, agnostic_nms=False, max_det=max_det, classes=None,
+                                     retina_masks=retina_masks)
+    predictor.model = SimpleNamespace(names={0: 'object'})
+    predictor.batch = (['image.jpg'], )
+    predictor.mask_chunk_size = chunk_size
+    return predictor
+
+
+def postprocess_legacy(predictor, preds, img, orig_imgs):
+    """原实现：NMS 携带掩码系数，保留框的掩码一次性解码"""
+    p = ops.non_max_suppression(preds[0],
+                                predictor.args.conf,
+                                predictor.args.iou,
+                                agnostic=predictor.args.agnostic_nms,
+                                max_det=predictor.args.max_det,
+                                nc=len(predictor.model.names),
+                                classes=predictor.args.classes)
+    results = []
+    if all(len(pred) == 0 for pred in p):
+        return results
+    for pred in p:
+        if not len(pred):
+            continue
+        full_box = torch.zeros_like(pred[0])
+        full_box[2], full_box[3], full_box[4], full_box[6:] = img.shape[3], img.shape[2], 1.0, 1.0
+        full_box = full_box.view(1, -1)
+        critical_iou_index = bbox_iou(full_box[0][:4], pred[:, :4], iou_thres=0.9, image_shape=img.shape[2:])
+        if critical_iou_index.numel() != 0:
+            full_box[0][4] = pred[critical_iou_index][:, 4]
+            full_box[0][6:] = pred[critical_iou_index][:, 6:]
+            pred[critical_iou_index] = full_box
+    proto = preds[1][-1] if len(preds[1]) == 3 else preds[1]
+    for i, pred in enumerate(p):
+        orig_img = orig_imgs[i]
+        if predictor.args.retina_masks:
+            pred[:, :4] = ops.scale_boxes(img.shape[2:], pred[:, :4], orig_img.shape)
+            masks = ops.process_mask_native(proto[i], pred[:, 6:], pred[:, :4], orig_img.shape[:2])
+        else:
+            masks = ops.process_mask(proto[i], pred[:, 6:], pred[:, :4], img.shape[2:], upsample=True)
+            pred[:, :4] = ops.scale_boxes(img.shape[2:], pred[:, :4], orig_img.shape)
+        results.append(Results(orig_img=orig_img, path='image.jpg', names=predictor.model.names, boxes=pred[:, :6],
+                               masks=masks))
+    return results
+
+
+def run(mode, args, max_det):
+    """在当前进程中运行一个配置，返回 (中位耗时秒, 峰值内存增量 MB, 掩码数)"""
+    torch.set_num_threads(args.threads)
+    predictor = make_predictor(max_det, args.retina, args.chunk_size)
+    postprocess = predictor.postprocess if mode == "two_phase" else \
+        lambda *a: postprocess_legacy(predictor, *a)
+    preds, img, orig_imgs = make_inputs(args.size[0], args.size[1], args.imgsz)
+
+    # 第一次运行测峰值内存（之后的运行复用已分配的内存，ru_maxrss 不再增长）
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    results = postprocess(preds, img, orig_imgs)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline
+    count = len(results[0].masks.data) if results else 0
+    del results  # 输出本身就是 N×H×W，计时前释放，避免两份输出同时占用内存
+    times = []
+    for _ in range(args.runs):
+        start = time.perf_counter()
+        postprocess(preds, img, orig_imgs)
+        times.append(time.perf_counter() - start)
+    return float(np.median(times)), peak / 1024, count
+
+
+def check_agreement(args, max_det=100):
+    """两种实现应保留相同的框，掩码只允许在数值恰好接近 0 的像素上不同"""
+    preds, img, orig_imgs = make_inputs(args.size[0], args.size[1], args.imgsz)
+    predictor = make_predictor(max_det, args.retina, args.chunk_size)
+    old = postprocess_legacy(predictor, preds, img, orig_imgs)[0]
+    new = predictor.postprocess(preds, img, orig_imgs)[0]
+    assert torch.equal(old.boxes.data, new.boxes.data)
+    mismatch = (old.masks.data.bool() != new.masks.data).sum().item()
+    print(f"一致性检查（max_det={max_det}）：框完全一致，掩码不同的像素 {mismatch} / {old.masks.data.numel()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FastSAM 后处理基准（CPU）")
+    parser.add_argument("--max-dets", type=int, nargs="+", default=[100, 300, 1000], help="max_det 取值")
+    parser.add_argument("--size", type=int, nargs=2, default=[1024, 1365], metavar=("H", "W"), help="原图尺寸")
+    parser.add_argument("--imgsz", type=int, default=1024, help="模型输入尺寸")
+    parser.add_argument("--no-retina", dest="retina", action="store_false", help="不使用 retina_masks")
+    parser.add_argument("--chunk-size", type=int, default=FastSAMPredictor.mask_chunk_size, help="掩码分块大小")
+    parser.add_argument("--threads", type=int, default=4, help="torch CPU 线程数")
+    parser.add_argument("--runs", type=int, default=3, help="每个配置的计时次数")
+    parser.add_argument("--worker", nargs=2, metavar=("MODE", "MAX_DET"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        mode, max_det = args.worker
+        elapsed, peak, count = run(mode, args, int(max_det))
+        print(json.dumps({"elapsed": elapsed, "peak": peak, "count": count}))
+        return
+
+    print(f"{'max_det':>8} {'掩码数':>6} {'原耗时(ms)':>12} {'新耗时(ms)':>12} {'原峰值(MB)':>12} {'新峰值(MB)':>12}")
+    failed = False
+    for max_det in args.max_dets:
+        row = {}
+        for mode in ("legacy", "two_phase"):
+            command = [sys.executable, os.path.abspath(__file__), "--worker", mode, str(max_det),
+                       "--size", *map(str, args.size), "--imgsz", str(args.imgsz), "--chunk-size",
+                       str(args.chunk_size), "--threads", str(args.threads), "--runs", str(args.runs)]
+            if not args.retina:
+                command.append("--no-retina")
+            completed = subprocess.run(command, capture_output=True, text=True)
+            row[mode] = json.loads(completed.stdout.strip().splitlines()[-1]) if completed.returncode == 0 else None
+        old, new = row["legacy"], row["two_phase"]
+        failed |= old is None or new is None
+        fmt = lambda r, key, scale: f"{r[key] * scale:>12.1f}" if r else f"{'失败':>12}"  # noqa: E731
+        count = (new or old or {"count": 0})["count"]
+        print(f"{max_det:>8} {count:>6} {fmt(old, 'elapsed', 1000)} {fmt(new, 'elapsed', 1000)} "
+              f"{fmt(old, 'peak', 1)} {fmt(new, 'peak', 1)}")
+    if failed:
+        print("失败：子进程异常退出（通常是内存不足）")
+    # 放在最后：子进程会继承父进程的 ru_maxrss 峰值，先在父进程里跑大输出会让子进程的峰值增量测不出来
+    check_agreement(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+FastSAM 单图开销基准 - 对比每次调用重建预测器与复用常驻预测器
+
+旧实现每次 predict 都新建 FastSAMPredictor 并 setup_model（AutoBackend 包装、层融合、预热），
+新实现只在首次调用或设备/精度变化时构建一次，其余参数（conf、iou、imgsz、retina_masks）按调用覆盖。
+
+用法:
+    python benchmarks/bench_fastsam_predictor.py --model ./weights/FastSAM_X.pt --image ./images/cat.jpg --runs 10
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fastsam import FastSAM, FastSAMPredictor  # noqa: E402
+
+
+def predict_rebuild(model, image, **kwargs):
+    """原实现：每次调用都重建预测器"""
+    overrides = model.overrides.copy()
+    overrides.update(conf=0.25, mode='predict', save=False, **kwargs)
+    predictor = FastSAMPredictor(overrides=overrides)
+    predictor.setup_model(model=model.model, verbose=False)
+    return predictor(image, stream=False)
+
+
+def predict_persistent(model, image, **kwargs):
+    """新实现：复用常驻预测器"""
+    return model(image, **kwargs)
+
+
+def timeit(fn, *args, runs=10, **kwargs):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn(*args, **kwargs)
+        times.append(time.perf_counter() - start)
+    return np.median(times), np.min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FastSAM 单图开销基准")
+    parser.add_argument("--model", type=str, default="./weights/FastSAM_X.pt", help="模型权重路径")
+    parser.add_argument("--image", type=str, required=True, help="测试图像路径")
+    parser.add_argument("--imgsz", type=int, default=1024, help="输入尺寸")
+    parser.add_argument("--device", type=str, default="cpu", help="推理设备")
+    parser.add_argument("--runs", type=int, default=10, help="每种实现的运行次数")
+    args = parser.parse_args()
+
+    image = Image.open(args.image).convert("RGB")
+    model = FastSAM(args.model)
+    kwargs = dict(device=args.device, retina_masks=True, imgsz=args.imgsz, conf=0.4, iou=0.9)
+
+    # 两种实现的结果应一致
+    old = predict_rebuild(model, image, **kwargs)[0]
+    new = predict_persistent(model, image, **kwargs)[0]
+    assert len(old.masks.data) == len(new.masks.data)
+
+    rebuild_median, rebuild_best = timeit(predict_rebuild, model, image, runs=args.runs, **kwargs)
+    persistent_median, persistent_best = timeit(predict_persistent, model, image, runs=args.runs, **kwargs)
+
+    # 逐次改变 conf/iou 覆盖参数，确认不会触发重建
+    predictor = model.predictor
+    for conf in (0.25, 0.5):
+        model(image, **dict(kwargs, conf=conf, iou=0.7))
+    assert model.predictor is predictor
+
+    print(f"{'实现':<10} {'中位数(ms)':>12} {'最快(ms)':>12}")
+    print(f"{'每次重建':<10} {rebuild_median * 1000:>12.1f} {rebuild_best * 1000:>12.1f}")
+    print(f"{'常驻复用':<10} {persistent_median * 1000:>12.1f} {persistent_best * 1000:>12.1f}")
+    print(f"单图开销节省: {(rebuild_median - persistent_median) * 1000:.1f}ms "
+          f"({rebuild_median / persistent_median:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+掩码合成内存基准 - 对比原 fast_show_mask 的 N×H×W×4 颜色堆叠与"索引图 + 调色板取色"的合成方式
+
+原实现先构造 annotation[..., None] * visual（N×H×W×4 float64）和整幅 meshgrid 索引，峰值内存随掩码数量线性增长；
+新实现只分配一张 H×W 的索引图和 H×W×4 的输出，峰值内存与掩码数量无关。
+
+用法:
+    python benchmarks/bench_mask_compositing.py --size 512 --counts 10 25 50 100
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fastsam.render import composite_masks  # noqa: E402
+
+
+def composite_stack(annotation, visual):
+    """原实现：按面积排序后构造 N×H×W×4 颜色堆叠，再用 meshgrid 索引取每个像素最上层的颜色"""
+    height, width = annotation.shape[1:]
+    sorted_indices = np.argsort(np.sum(annotation, axis=(1, 2)))
+    annotation = annotation[sorted_indices]
+    index = (annotation != 0).argmax(axis=0)
+    mask_image = np.expand_dims(annotation, -1) * visual.reshape(-1, 1, 1, 4)
+    show = np.zeros((height, width, 4))
+    h_indices, w_indices = np.meshgrid(np.arange(height), np.arange(width), indexing='ij')
+    show[h_indices, w_indices, :] = mask_image[(index[h_indices, w_indices], h_indices, w_indices, slice(None))]
+    return show
+
+
+def composite_indexed(annotation, visual):
+    """新实现：索引图 + N×4 调色板取色"""
+    return composite_masks(annotation, visual)
+
+
+def measure(fn, *args):
+    """返回 (结果, 耗时秒, 峰值内存字节)"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn(*args)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def make_masks(count, size, rng):
+    masks = np.zeros((count, size, size), dtype=np.float32)
+    for mask in masks:
+        center = tuple(int(c) for c in rng.integers(0, size, 2))
+        cv2.circle(mask, center, int(rng.integers(size // 20, size // 3)), 1, -1)
+    return masks
+
+
+def main():
+    parser = argparse.ArgumentParser(description="掩码合成内存基准")
+    parser.add_argument("--size", type=int, default=512, help="掩码边长（像素）")
+    parser.add_argument("--counts", type=int, nargs="+", default=[10, 25, 50, 100], help="掩码数量")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'掩码数':>6} {'原峰值(MB)':>12} {'新峰值(MB)':>12} {'原耗时(ms)':>12} {'新耗时(ms)':>12}")
+    for count in args.counts:
+        annotation = make_masks(count, args.size, rng)
+        visual = np.concatenate([rng.random((count, 3)), np.full((count, 1), 0.6)], axis=1)
+        old, old_time, old_peak = measure(composite_stack, annotation, visual)
+        new, new_time, new_peak = measure(composite_indexed, annotation, visual)
+        assert np.allclose(old, new, atol=1e-6)
+        print(f"{count:>6} {old_peak / 2 ** 20:>12.1f} {new_peak / 2 ** 20:>12.1f} "
+              f"{old_time * 1000:>12.1f} {new_time * 1000:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
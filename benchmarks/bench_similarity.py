@@ -0,0 +1,60 @@
+"""
+相似度打分微基准 - 对比逐对调用 sklearn cosine_similarity 与向量化 SimilarityScorer
+
+用法:
+    python benchmarks/bench_similarity.py --dim 1024 --top_k 5
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from sklearn.metrics.pairwise import cosine_similarity
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from similarity import SimilarityScorer  # noqa: E402
+
+
+def score_per_pair(question, candidates, top_k):
+    """原实现：逐对计算相似度后整体排序"""
+    scored = [(cosine_similarity([question], [vec])[0][0], idx) for idx, vec in enumerate(candidates)]
+    scored.sort(key=lambda x: x[0], reverse=True)
+    return [idx for _, idx in scored[:top_k]]
+
+
+def score_vectorized(question, candidates, top_k):
+    """新实现：一次矩阵-向量乘法 + argpartition"""
+    indices, _ = SimilarityScorer(question).top_k(candidates, top_k)
+    return indices.tolist()
+
+
+def timeit(fn, *args, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="相似度打分微基准")
+    parser.add_argument("--dim", type=int, default=1024, help="向量维度")
+    parser.add_argument("--top_k", type=int, default=5, help="Top-K")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 10000], help="候选数量")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    question = rng.standard_normal(args.dim).tolist()
+    print(f"{'候选数':>8} {'逐对(ms)':>12} {'向量化(ms)':>12} {'加速比':>8}")
+    for n in args.sizes:
+        candidates = rng.standard_normal((n, args.dim)).tolist()
+        assert score_per_pair(question, candidates, args.top_k) == score_vectorized(question, candidates, args.top_k)
+        old = timeit(score_per_pair, question, candidates, args.top_k, repeat=1 if n >= 10000 else 3)
+        new = timeit(score_vectorized, question, candidates, args.top_k)
+        print(f"{n:>8} {old * 1000:>12.2f} {new * 1000:>12.2f} {old / new:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
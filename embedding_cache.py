@@ -0,0 +1,144 @@
+"""
+向量缓存模块 - 以 (模型名, 规范化文本) 为键的两级嵌入向量缓存（进程内LRU + SQLite持久化）
+"""
+import os
+import sqlite3
+import hashlib
+import threading
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+
+def normalize_text(text: str) -> str:
+    """规范化文本：全半角统一、去首尾空白、合并连续空白"""
+    text = unicodedata.normalize("NFKC", text or "")
+    return " ".join(text.split())
+
+
+class EmbeddingCache:
+    """嵌入向量缓存类
+
+    第一级为进程内 LRU（OrderedDict），第二级为 SQLite 持久化存储，
+    向量以 float32 二进制形式保存。两级均按条目数做容量淘汰。
+    get 返回向量的副本，调用方修改返回值不会影响缓存中的向量。
+    """
+
+    def __init__(self, db_path: str = "./cache/embeddings.sqlite3",
+                 memory_size: int = 4096, max_disk_entries: int = 200000):
+        """
+        初始化嵌入向量缓存
+        Args:
+            db_path: SQLite 数据库文件路径
+            memory_size: 进程内 LRU 的最大条目数
+            max_disk_entries: 磁盘缓存的最大条目数，超出后按最近访问时间淘汰
+        """
+        self.db_path = db_path
+        self.memory_size = memory_size
+        self.max_disk_entries = max_disk_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_count = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, model TEXT NOT NULL, text TEXT NOT NULL, "
+            "dim INTEGER NOT NULL, vector BLOB NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_access ON embeddings(last_access)")
+        self._conn.commit()
+        self._disk_count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    @staticmethod
+    def make_key(model: str, text: str) -> str:
+        """根据模型名和规范化后的文本生成内容寻址键"""
+        return hashlib.sha1(f"{model}\x1f{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+    def get(self, model: str, text: str) -> Optional[List[float]]:
+        """查询缓存，未命中返回 None（返回的是副本）"""
+        key = self.make_key(model, text)
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return list(vector)
+            row = self._conn.execute("SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            vector = array("f", row[0]).tolist()
+            self._conn.execute("UPDATE embeddings SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            self._remember(key, tuple(vector))
+            self.disk_hits += 1
+            return vector
+
+    def put(self, model: str, text: str, vector: List[float]):
+        """写入缓存（空向量不缓存）"""
+        if not vector:
+            return
+        key = self.make_key(model, text)
+        vector = tuple(vector)
+        with self._lock:
+            self._remember(key, vector)
+            exists = self._conn.execute("SELECT 1 FROM embeddings WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO embeddings (key, model, text, dim, vector, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, normalize_text(text), len(vector), array("f", vector).tobytes(), time.time()))
+            self._conn.commit()
+            if not exists:
+                self._disk_count += 1
+            if self._disk_count > self.max_disk_entries:
+                self._evict_disk()
+
+    def _remember(self, key: str, vector: Tuple[float, ...]):
+        """写入进程内 LRU（以元组保存，不会被调用方修改），超出容量时淘汰最久未使用的条目"""
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def _evict_disk(self):
+        """按最近访问时间淘汰磁盘缓存，淘汰到容量的 90% 以减少频繁淘汰"""
+        excess = self._disk_count - int(self.max_disk_entries * 0.9)
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE key IN "
+            "(SELECT key FROM embeddings ORDER BY last_access ASC LIMIT ?)", (excess,))
+        self._conn.commit()
+        self.evictions += excess
+        self._disk_count -= excess
+
+    def clear(self):
+        """清空两级缓存"""
+        with self._lock:
+            self._memory.clear()
+            self._conn.execute("DELETE FROM embeddings")
+            self._conn.commit()
+            self._disk_count = 0
+
+    def stats(self) -> Dict:
+        """获取缓存统计信息"""
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_entries": len(self._memory),
+                "disk_entries": self._disk_count,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0
+            }
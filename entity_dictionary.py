@@ -0,0 +1,267 @@
+"""
+实体词典模块 - 基于 Aho-Corasick 自动机的本地实体识别与关系线索匹配
+
+自动机由知识图谱中所有节点的 name 构建，一次扫描即可找出问题中出现的全部实体名称；
+关系线索（如"吃什么药"、"症状"）映射到关系类型。词典序列化到磁盘，图谱重新导入后按名称差异增量更新。
+"""
+import os
+import pickle
+import threading
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from embedding_cache import normalize_text
+
+# 关系线索 -> 关系类型（重叠时取最长的线索，如"不能吃"优先于"吃"）
+RELATION_CUES = {
+    "吃什么药": "RECOMMENDS_DRUG", "用什么药": "RECOMMENDS_DRUG", "吃啥药": "RECOMMENDS_DRUG",
+    "推荐药": "RECOMMENDS_DRUG", "药物": "RECOMMENDS_DRUG", "用药": "RECOMMENDS_DRUG",
+    "常用药": "COMMONLY_USES_DRUG", "常用什么药": "COMMONLY_USES_DRUG",
+    "症状": "HAS_SYMPTOM", "表现": "HAS_SYMPTOM", "征兆": "HAS_SYMPTOM", "有什么反应": "HAS_SYMPTOM",
+    "挂什么科": "TREATED_BY", "什么科": "TREATED_BY", "科室": "TREATED_BY", "挂号": "TREATED_BY",
+    "怎么治": "USES_TREATMENT", "如何治": "USES_TREATMENT", "治疗": "USES_TREATMENT", "治疗方法": "USES_TREATMENT",
+    "检查": "REQUIRES_CHECK", "化验": "REQUIRES_CHECK", "确诊": "REQUIRES_CHECK",
+    "吃什么": "SHOULD_EAT", "宜吃": "SHOULD_EAT", "可以吃": "SHOULD_EAT", "适合吃": "SHOULD_EAT", "饮食": "SHOULD_EAT",
+    "不能吃": "SHOULD_NOT_EAT", "不宜吃": "SHOULD_NOT_EAT", "忌口": "SHOULD_NOT_EAT", "忌吃": "SHOULD_NOT_EAT",
+    "不可以吃": "SHOULD_NOT_EAT", "避免吃": "SHOULD_NOT_EAT",
+    "食谱": "RECOMMENDS_RECIPE", "菜谱": "RECOMMENDS_RECIPE", "药膳": "RECOMMENDS_RECIPE",
+    "并发症": "ACCOMPANIES", "并发": "ACCOMPANIES", "伴随": "ACCOMPANIES",
+    "属于": "BELONGS_TO", "类别": "BELONGS_TO", "分类": "BELONGS_TO", "哪一类": "BELONGS_TO",
+}
+
+# 关系类型 -> 目标实体的泛称（与实体抽取提示词中的示例格式一致）
+RELATION_TARGETS = {
+    "RECOMMENDS_DRUG": "药物", "COMMONLY_USES_DRUG": "药物", "HAS_SYMPTOM": "症状",
+    "TREATED_BY": "科室", "USES_TREATMENT": "治疗方法", "REQUIRES_CHECK": "检查项目",
+    "SHOULD_EAT": "食物", "SHOULD_NOT_EAT": "食物", "RECOMMENDS_RECIPE": "食谱",
+    "ACCOMPANIES": "并发症", "BELONGS_TO": "分类",
+}
+
+# 同名节点有多个标签时的类型优先级
+LABEL_PRIORITY = ['Disease', 'Symptom', 'Drug', 'Check', 'Treatment', 'Department', 'Food', 'Recipe', 'Category']
+
+
+class AhoCorasick:
+    """Aho-Corasick 多模式匹配自动机
+
+    支持向已构建的自动机追加模式串（只重新计算失配指针）和移除模式串（只清除输出），
+    匹配结果按最左最长、互不重叠的规则返回。
+    """
+
+    def __init__(self, patterns: Iterable[str] = ()):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [None]
+        self.size = 0
+        self.add_patterns(patterns)
+
+    def add_patterns(self, patterns: Iterable[str]) -> int:
+        """追加模式串并重新计算失配指针，返回新增的模式串数量"""
+        added = 0
+        for pattern in patterns:
+            if not pattern:
+                continue
+            state = 0
+            for char in pattern:
+                next_state = self.goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self.goto)
+                    self.goto[state][char] = next_state
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append(None)
+                state = next_state
+            if self.output[state] is None:
+                self.output[state] = pattern
+                added += 1
+        if added:
+            self.size += added
+            self._build_failure_links()
+        return added
+
+    def remove_patterns(self, patterns: Iterable[str]) -> int:
+        """移除模式串（保留状态，只清除输出），返回移除的数量"""
+        removed = 0
+        for pattern in patterns:
+            state = 0
+            for char in pattern:
+                state = self.goto[state].get(char)
+                if state is None:
+                    break
+            if state and self.output[state] == pattern:
+                self.output[state] = None
+                removed += 1
+        self.size -= removed
+        return removed
+
+    def _build_failure_links(self):
+        """广度优先计算失配指针"""
+        queue = deque()
+        for state in self.goto[0].values():
+            self.fail[state] = 0
+            queue.append(state)
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(char, 0)
+
+    def iter_matches(self, text: str):
+        """逐个产生所有匹配 (起始位置, 结束位置, 模式串)，包括相互重叠的匹配"""
+        state = 0
+        for end, char in enumerate(text, 1):
+            while state and char not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(char, 0)
+            matched = state
+            while matched:
+                pattern = self.output[matched]
+                if pattern is not None:
+                    yield end - len(pattern), end, pattern
+                matched = self.fail[matched]
+
+    def find(self, text: str) -> List[Tuple[int, int, str]]:
+        """返回最左最长、互不重叠的匹配列表"""
+        matches = sorted(self.iter_matches(text), key=lambda m: (m[0], -(m[1] - m[0])))
+        selected = []
+        covered_until = 0
+        for start, end, pattern in matches:
+            if start >= covered_until:
+                selected.append((start, end, pattern))
+                covered_until = end
+        return selected
+
+
+class EntityDictionary:
+    """实体词典类
+
+    names 保存 名称 -> 标签列表；实体自动机与关系线索自动机分开构建，
+    线索中出现的词（如"症状"）不会被当作实体名称。
+    """
+
+    def __init__(self, path: str = "./cache/entity_dictionary.pkl", min_length: int = 2):
+        """
+        初始化实体词典
+        Args:
+            path: 序列化文件路径
+            min_length: 参与匹配的最短实体名称长度（过短的名称误匹配较多）
+        """
+        self.path = path
+        self.min_length = min_length
+        self.graph_version = None
+        self.names = {}
+        self.entity_automaton = AhoCorasick()
+        self.cue_automaton = AhoCorasick(RELATION_CUES.keys())
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        """词典是否已加载实体名称"""
+        return bool(self.names)
+
+    def _key(self, name: str) -> str:
+        """实体名称的匹配键（规范化并统一大小写）"""
+        return normalize_text(name).lower()
+
+    def load(self) -> bool:
+        """从磁盘加载词典，文件不存在或损坏时返回 False"""
+        if not os.path.exists(self.path):
+            return False
+        try:
+            with open(self.path, "rb") as f:
+                state = pickle.load(f)
+        except Exception:
+            return False
+        with self._lock:
+            self.graph_version = state["graph_version"]
+            self.names = state["names"]
+            self.entity_automaton = state["entity_automaton"]
+        return True
+
+    def save(self):
+        """序列化词典到磁盘（先写临时文件再替换，避免读到半个文件）"""
+        path_dir = os.path.dirname(self.path)
+        if path_dir:
+            os.makedirs(path_dir, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with self._lock:
+            state = {"graph_version": self.graph_version, "names": self.names,
+                     "entity_automaton": self.entity_automaton}
+            with open(tmp_path, "wb") as f:
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.path)
+
+    def update(self, records: Iterable[Dict], graph_version: Optional[str] = None) -> Dict:
+        """
+        按图谱中的节点名称增量更新词典：新增名称追加到自动机，消失的名称从自动机移除
+        Args:
+            records: 形如 {"name": ..., "labels": [...]} 的节点记录
+            graph_version: 对应的图谱版本号
+        Returns:
+            dict: 新增、移除的名称数量
+        """
+        names = {}
+        for record in records:
+            name = record.get("name")
+            if not isinstance(name, str) or len(normalize_text(name)) < self.min_length:
+                continue
+            key = self._key(name)
+            entry = names.setdefault(key, {"name": name, "labels": []})
+            for label in record.get("labels") or []:
+                if label not in entry["labels"]:
+                    entry["labels"].append(label)
+        with self._lock:
+            added = [key for key in names if key not in self.names]
+            removed = [key for key in self.names if key not in names]
+            self.entity_automaton.remove_patterns(removed)
+            self.entity_automaton.add_patterns(added)
+            self.names = names
+            self.graph_version = graph_version
+        return {"added": len(added), "removed": len(removed), "total": len(names)}
+
+    def extract(self, text: str) -> Dict:
+        """
+        在文本中查找实体名称和关系线索
+        Returns:
+            dict: 与LLM抽取结果格式相同的 {"entities": [...], "relations": [...]}
+        """
+        key_text = self._key(text)
+        with self._lock:
+            entity_matches = self.entity_automaton.find(key_text)
+            entities = []
+            seen = set()
+            for _, _, key in entity_matches:
+                if key in seen:
+                    continue
+                seen.add(key)
+                entry = self.names[key]
+                labels = sorted(entry["labels"], key=lambda l: LABEL_PRIORITY.index(l)
+                                if l in LABEL_PRIORITY else len(LABEL_PRIORITY))
+                entities.append({"name": entry["name"], "type": labels[0] if labels else "Other"})
+        relations = []
+        if entities:
+            # 关系的源实体优先取疾病，没有疾病时取第一个实体
+            source = next((e["name"] for e in entities if e["type"] == "Disease"), entities[0]["name"])
+            entity_spans = [(start, end) for start, end, _ in entity_matches]
+            rel_types = []
+            for start, end, cue in self.cue_automaton.find(key_text):
+                # 线索完全落在实体名称内部时不计（如"糖尿病并发症"作为实体名称时）
+                if any(s <= start and end <= e for s, e in entity_spans):
+                    continue
+                rel_type = RELATION_CUES[cue]
+                if rel_type not in rel_types:
+                    rel_types.append(rel_type)
+            relations = [{"source": source, "target": RELATION_TARGETS[t], "type": t} for t in rel_types]
+        return {"entities": entities, "relations": relations}
+
+    def stats(self) -> Dict:
+        """获取词典统计信息"""
+        with self._lock:
+            return {
+                "graph_version": self.graph_version,
+                "names": len(self.names),
+                "automaton_states": len(self.entity_automaton.goto)
+            }
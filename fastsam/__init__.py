@@ -5,5 +5,7 @@ from .predict import FastSAMPredictor
 from .prompt import FastSAMPrompt
 # from .val import FastSAMValidator
 from .decoder import FastSAMDecoder
+from .packed_mask import PackedMask
+from .clip_engine import ClipEngine, get_clip_engine
 
-__all__ = 'FastSAMPredictor', 'FastSAM', 'FastSAMPrompt', 'FastSAMDecoder'
+__all__ = 'FastSAMPredictor', 'FastSAM', 'FastSAMPrompt', 'FastSAMDecoder', 'PackedMask', 'ClipEngine', 'get_clip_engine'
@@ -0,0 +1,107 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import torch
+from PIL import Image
+
+
+def _import_clip():
+    try:
+        import clip  # for linear_assignment
+
+    except (ImportError, AssertionError, AttributeError):
+        from ultralytics.yolo.utils.checks import check_requirements
+
+        check_requirements('git+https://github.com/openai/CLIP.git')  # required before installing lap from source
+        import clip
+    return clip
+
+
+def _resolve_half(device, half):
+    '''float16 or not for a device: None means half on non-CPU devices; half is never used on CPU.'''
+    device = str(device)
+    return (device != 'cpu') if half is None else (bool(half) and device != 'cpu')
+
+
+class ClipEngine:
+    '''CLIP model loaded once, scoring image crops against text prompts.
+    Text embeddings are cached per prompt string (LRU), and crops are encoded in fixed-size batches under
+    no_grad, so a text prompt costs one batched image-encoder pass instead of a model load.
+    Use get_clip_engine() to share one engine per (model, device, precision) across the process;
+    batch_size is only a default, each encode_images/score call may pass its own.
+    '''
+
+    def __init__(self, model_name='ViT-B/32', device='cuda', half=None, batch_size=32, max_cached_texts=256):
+        '''
+        Args:
+        model_name: CLIP model name passed to clip.load
+        device: device the model runs on
+        half: run in float16; None means half on CUDA and float32 elsewhere (half is ignored on CPU)
+        batch_size: default number of crops per image-encoder pass
+        max_cached_texts: number of text embeddings kept in the cache
+        '''
+        clip = _import_clip()
+        self.device = str(device)
+        self.half = _resolve_half(self.device, half)
+        self.batch_size = batch_size
+        self.max_cached_texts = max_cached_texts
+        self._tokenize = clip.tokenize
+        # clip.load returns fp16 weights on CUDA and fp32 on CPU
+        self.model, self.preprocess = clip.load(model_name, device=self.device)
+        self.model = self.model.half() if self.half else self.model.float()
+        self.model.eval()
+        self._text_cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    @torch.no_grad()
+    def encode_text(self, text):
+        '''Normalized (1, d) embedding of a prompt string, cached.'''
+        with self._lock:
+            features = self._text_cache.get(text)
+            if features is not None:
+                self._text_cache.move_to_end(text)
+                return features
+        features = self.model.encode_text(self._tokenize([text]).to(self.device))
+        features = features / features.norm(dim=-1, keepdim=True)
+        with self._lock:
+            self._text_cache[text] = features
+            while len(self._text_cache) > self.max_cached_texts:
+                self._text_cache.popitem(last=False)
+        return features
+
+    @torch.no_grad()
+    def encode_images(self, crops, batch_size=None):
+        '''Normalized (n, d) embeddings of RGB uint8 crops (arrays or PIL images), batch_size crops at a time
+        (defaults to the engine's batch_size).'''
+        batch_size = batch_size or self.batch_size
+        features = []
+        for start in range(0, len(crops), batch_size):
+            batch = torch.stack([
+                self.preprocess(Image.fromarray(crop) if isinstance(crop, np.ndarray) else crop)
+                for crop in crops[start:start + batch_size]]).to(self.device)
+            batch_features = self.model.encode_image(batch)
+            features.append(batch_features / batch_features.norm(dim=-1, keepdim=True))
+        return torch.cat(features)
+
+    def score(self, crops, text, batch_size=None):
+        '''Softmax over crops of 100 * cosine similarity to the text, as a float32 tensor.'''
+        probs = 100.0 * self.encode_images(crops, batch_size) @ self.encode_text(text).T
+        return probs[:, 0].float().softmax(dim=0)
+
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def get_clip_engine(model_name='ViT-B/32', device='cuda', half=None):
+    '''Process-wide ClipEngine for (model_name, device, resolved half), loaded on first use.
+    half is resolved before the lookup, so half=None and an explicit default share one engine;
+    pass batch_size to score/encode_images per call.
+    '''
+    key = (model_name, str(device), _resolve_half(device, half))
+    with _engines_lock:
+        engine = _engines.get(key)
+        if engine is None:
+            engine = _engines[key] = ClipEngine(model_name, device=device, half=key[2])
+        return engine
@@ -9,6 +9,8 @@ Usage - Predict:
     results = model.predict('ultralytics/assets/bus.jpg')
 """
 
+import threading
+
 from ultralytics.yolo.cfg import get_cfg
 from ultralytics.yolo.engine.exporter import Exporter
 from ultralytics.yolo.engine.model import YOLO
@@ -21,6 +23,15 @@ from .predict import FastSAMPredictor
 
 class FastSAM(YOLO):
 
+    # Predictor args that change how AutoBackend wraps the network; any other arg (conf, iou, imgsz,
+    # retina_masks, ...) is applied to the live predictor without rebuilding it.
+    BACKEND_KEYS = ('device', 'half', 'dnn')
+
+    def __init__(self, model='FastSAM-x.pt', task=None):
+        self._predictor_lock = threading.Lock()
+        self._backend_key = None
+        super().__init__(model, task)
+
     @smart_inference_mode()
     def predict(self, source=None, stream=False, **kwargs):
         """
@@ -45,13 +56,45 @@ class FastSAM(YOLO):
         overrides['mode'] = kwargs.get('mode', 'predict')
         assert overrides['mode'] in ['track', 'predict']
         overrides['save'] = kwargs.get('save', False)  # do not save by default if called in Python
-        self.predictor = FastSAMPredictor(overrides=overrides)
-        self.predictor.setup_model(model=self.model, verbose=False)
         try:
-            return self.predictor(source, stream=stream)
+            if stream:
+                return self._stream(source, overrides)
+            # The predictor keeps per-call state (dataset, batch, results), so calls are serialized
+            with self._predictor_lock:
+                return self._get_predictor(overrides)(source, stream=False)
         except Exception as e:
             return None
 
+    def _stream(self, source, overrides):
+        """
+        Yield results from the shared predictor, holding the predictor lock for the lifetime of the stream.
+
+        Other calls (streaming or not) wait until the stream is exhausted or closed, so they cannot swap the
+        predictor args or rebuild the predictor mid-stream. Close streams that are not consumed to the end.
+        """
+        with self._predictor_lock:
+            yield from self._get_predictor(overrides)(source, stream=True)
+
+    def _get_predictor(self, overrides):
+        """
+        Return the persistent predictor, building it only on first use or when a backend arg changes.
+
+        Rebuilding re-wraps the network in AutoBackend, re-fuses layers and repeats the warm-up pass,
+        so per-call overrides are applied by replacing the predictor args instead.
+        """
+        backend_key = tuple(str(overrides.get(k)) for k in self.BACKEND_KEYS)
+        if self.predictor is None or backend_key != self._backend_key:
+            self.predictor = FastSAMPredictor(overrides=overrides)
+            self.predictor.setup_model(model=self.model, verbose=False)
+            self._backend_key = backend_key
+        else:
+            # Start from the defaults each call so overrides from a previous call do not leak
+            args = get_cfg(DEFAULT_CFG, overrides)
+            args.task = 'segment'
+            args.half &= self.predictor.device.type != 'cpu'
+            self.predictor.args = args
+        return self.predictor
+
     def train(self, **kwargs):
         """Function trains models but raises an error as FastSAM models do not support training."""
         raise NotImplementedError("Currently, the training codes are on the way.")
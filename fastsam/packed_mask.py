@@ -0,0 +1,116 @@
+import numpy as np
+
+if hasattr(np, 'bitwise_count'):  # numpy >= 2.0
+
+    def _popcount(bits):
+        return int(np.bitwise_count(bits).sum(dtype=np.int64))
+else:
+    _POPCOUNT_TABLE = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+    def _popcount(bits):
+        return int(_POPCOUNT_TABLE[bits].sum(dtype=np.int64))
+
+
+class PackedMask:
+    '''Binary mask stored bit-packed row by row (np.packbits along the width), 1/8 of a bool array.
+    Area and bbox are computed once at construction; area, intersection, union and point lookups work
+    on the packed bits (restricted to the bbox overlap), and the dense mask is only decoded on demand.
+    Attributes:
+    bits: (h, ceil(w / 8)) uint8 packed rows
+    shape: (h, w) of the dense mask
+    area: number of pixels set
+    bbox: [x1, y1, x2, y2] with exclusive x2/y2, all zero for an empty mask
+    '''
+
+    __slots__ = ('bits', 'shape', 'area', 'bbox')
+
+    def __init__(self, bits, shape, area, bbox):
+        self.bits = bits
+        self.shape = tuple(shape)
+        self.area = int(area)
+        self.bbox = list(bbox)
+
+    @classmethod
+    def from_dense(cls, mask):
+        '''Pack a dense (h, w) mask (bool, 0/1 integers or floats; non-zero counts as set).'''
+        mask = np.asarray(mask) != 0
+        rows = np.flatnonzero(mask.any(axis=1))
+        cols = np.flatnonzero(mask.any(axis=0))
+        if len(rows):
+            bbox = [int(cols[0]), int(rows[0]), int(cols[-1]) + 1, int(rows[-1]) + 1]
+        else:
+            bbox = [0, 0, 0, 0]
+        return cls(np.packbits(mask, axis=1), mask.shape, np.count_nonzero(mask), bbox)
+
+    def __len__(self):
+        return self.shape[0]
+
+    @property
+    def nbytes(self):
+        return self.bits.nbytes
+
+    def decode(self):
+        '''Decode to a dense (h, w) bool array.'''
+        return np.unpackbits(self.bits, axis=1, count=self.shape[1]).view(bool)
+
+    def decode_region(self, x1, y1, x2, y2):
+        '''Decode only the window [y1:y2, x1:x2] of the mask.'''
+        b1, b2 = x1 >> 3, (x2 + 7) >> 3
+        window = np.unpackbits(self.bits[y1:y2, b1:b2], axis=1).view(bool)
+        return window[:, x1 - b1 * 8:x2 - b1 * 8]
+
+    def contains(self, x, y):
+        '''Whether pixel (x, y) is set.'''
+        return bool((self.bits[y, x >> 3] >> (7 - (x & 7))) & 1)
+
+    def contains_many(self, xs, ys):
+        '''Vectorized contains: bool array, whether each pixel (xs[i], ys[i]) is set.'''
+        xs, ys = np.asarray(xs, dtype=np.intp), np.asarray(ys, dtype=np.intp)
+        return ((self.bits[ys, xs >> 3] >> (7 - (xs & 7)).astype(np.uint8)) & 1).astype(bool)
+
+    def region_sums(self, boxes):
+        '''Number of pixels set inside each box, from an integral image of the bbox window only.
+        Args:
+        boxes: (k, 4) integer [x1, y1, x2, y2] with exclusive x2/y2
+        Returns:
+        sums: (k,) int64 array
+        '''
+        boxes = np.asarray(boxes, dtype=np.intp).reshape(-1, 4)
+        x1, y1, x2, y2 = self.bbox
+        if self.area == 0:
+            return np.zeros(len(boxes), dtype=np.int64)
+        integral = np.zeros((y2 - y1 + 1, x2 - x1 + 1), dtype=np.int64)
+        np.cumsum(np.cumsum(self.decode_region(x1, y1, x2, y2), axis=0, dtype=np.int64), axis=1,
+                  out=integral[1:, 1:])
+        # Boxes are clipped to the bbox window; pixels outside it are all zero
+        bx1 = np.clip(boxes[:, 0] - x1, 0, x2 - x1)
+        by1 = np.clip(boxes[:, 1] - y1, 0, y2 - y1)
+        bx2 = np.clip(boxes[:, 2] - x1, 0, x2 - x1)
+        by2 = np.clip(boxes[:, 3] - y1, 0, y2 - y1)
+        sums = integral[by2, bx2] - integral[by1, bx2] - integral[by2, bx1] + integral[by1, bx1]
+        # Inverted (empty) boxes count nothing
+        return np.where((bx2 > bx1) & (by2 > by1), sums, 0)
+
+    def _overlap(self, other):
+        '''Byte-aligned window covering the intersection of both bboxes, or None if they are disjoint.'''
+        x1, y1 = max(self.bbox[0], other.bbox[0]), max(self.bbox[1], other.bbox[1])
+        x2, y2 = min(self.bbox[2], other.bbox[2]), min(self.bbox[3], other.bbox[3])
+        if x1 >= x2 or y1 >= y2:
+            return None
+        # Bits outside either bbox are zero, so widening to whole bytes does not change the AND
+        return slice(y1, y2), slice(x1 >> 3, (x2 + 7) >> 3)
+
+    def intersection(self, other):
+        '''Number of pixels set in both masks.'''
+        window = self._overlap(other)
+        if window is None:
+            return 0
+        return _popcount(self.bits[window] & other.bits[window])
+
+    def union(self, other):
+        '''Number of pixels set in either mask.'''
+        return self.area + other.area - self.intersection(other)
+
+    def iou(self, other):
+        union = self.union(other)
+        return self.intersection(other) / union if union else 0.0
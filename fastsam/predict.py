@@ -6,35 +6,47 @@ from ultralytics.yolo.v8.detect.predict import DetectionPredictor
 from .utils import bbox_iou
 
 class FastSAMPredictor(DetectionPredictor):
+    # Masks are assembled this many at a time into a preallocated [n, h, w] bool tensor; with retina_masks
+    # they are also upsampled only inside their boxes (see ops.process_mask_native_cropped)
+    mask_chunk_size = 32
 
     def __init__(self, cfg=DEFAULT_CFG, overrides=None, _callbacks=None):
         super().__init__(cfg, overrides, _callbacks)
         self.args.task = 'segment'
 
     def postprocess(self, preds, img, orig_imgs):
-        """TODO: filter by classes."""
-        p = ops.non_max_suppression(preds[0],
-                                    self.args.conf,
-                                    self.args.iou,
-                                    agnostic=self.args.agnostic_nms,
-                                    max_det=self.args.max_det,
-                                    nc=len(self.model.names),
-                                    classes=self.args.classes)
+        """TODO: filter by classes.
+        Two phases: NMS runs on boxes and scores only, then the mask coefficients of the kept boxes are gathered
+        and their masks assembled in chunks of mask_chunk_size, so neither step scales with the candidate count
+        or holds a float [max_det, h, w] stack.
+        """
+        nc = len(self.model.names)
+        p, keep = ops.non_max_suppression(preds[0],
+                                          self.args.conf,
+                                          self.args.iou,
+                                          agnostic=self.args.agnostic_nms,
+                                          max_det=self.args.max_det,
+                                          nc=nc,
+                                          classes=self.args.classes,
+                                          return_idxs=True)
 
         results = []
-        if len(p) == 0 or len(p[0]) == 0:
+        if all(len(pred) == 0 for pred in p):
             print("No object detected.")
             return results
 
-        full_box = torch.zeros_like(p[0][0])
-        full_box[2], full_box[3], full_box[4], full_box[6:] = img.shape[3], img.shape[2], 1.0, 1.0
-        full_box = full_box.view(1, -1)
-        critical_iou_index = bbox_iou(full_box[0][:4], p[0][:, :4], iou_thres=0.9, image_shape=img.shape[2:])
-        if critical_iou_index.numel() != 0:
-            full_box[0][4] = p[0][critical_iou_index][:,4]
-            full_box[0][6:] = p[0][critical_iou_index][:,6:]
-            p[0][critical_iou_index] = full_box
-        
+        for pred in p:  # every image of a batch gets the full-image box adjustment, not just the first
+            if not len(pred):
+                continue
+            full_box = torch.zeros_like(pred[0])
+            full_box[2], full_box[3], full_box[4], full_box[6:] = img.shape[3], img.shape[2], 1.0, 1.0
+            full_box = full_box.view(1, -1)
+            critical_iou_index = bbox_iou(full_box[0][:4], pred[:, :4], iou_thres=0.9, image_shape=img.shape[2:])
+            if critical_iou_index.numel() != 0:
+                full_box[0][4] = pred[critical_iou_index][:,4]
+                full_box[0][6:] = pred[critical_iou_index][:,6:]
+                pred[critical_iou_index] = full_box
+
         proto = preds[1][-1] if len(preds[1]) == 3 else preds[1]  # second output is len 3 if pt, but only 1 if exported
         for i, pred in enumerate(p):
             orig_img = orig_imgs[i] if isinstance(orig_imgs, list) else orig_imgs
@@ -43,12 +55,19 @@ class FastSAMPredictor(DetectionPredictor):
             if not len(pred):  # save empty boxes
                 results.append(Results(orig_img=orig_img, path=img_path, names=self.model.names, boxes=pred[:, :6]))
                 continue
+            # Mask coefficients of the kept boxes only, gathered from the raw prediction
+            coefficients = preds[0][i, 4 + nc:, keep[i]].T.float()
             if self.args.retina_masks:
                 if not isinstance(orig_imgs, torch.Tensor):
                     pred[:, :4] = ops.scale_boxes(img.shape[2:], pred[:, :4], orig_img.shape)
-                masks = ops.process_mask_native(proto[i], pred[:, 6:], pred[:, :4], orig_img.shape[:2])  # HWC
+                masks = ops.process_mask_native_cropped(proto[i], coefficients, pred[:, :4], orig_img.shape[:2],
+                                                        chunk_size=self.mask_chunk_size)  # NHW bool
             else:
-                masks = ops.process_mask(proto[i], pred[:, 6:], pred[:, :4], img.shape[2:], upsample=True)  # HWC
+                masks = torch.empty((len(pred), *img.shape[2:]), dtype=torch.bool, device=pred.device)
+                for start in range(0, len(pred), self.mask_chunk_size):
+                    end = start + self.mask_chunk_size
+                    masks[start:end] = ops.process_mask(proto[i], coefficients[start:end], pred[start:end, :4],
+                                                        img.shape[2:], upsample=True)  # NHW
                 if not isinstance(orig_imgs, torch.Tensor):
                     pred[:, :4] = ops.scale_boxes(img.shape[2:], pred[:, :4], orig_img.shape)
             results.append(
@@ -1,71 +1,150 @@
 import os
-import sys
 import cv2
 import matplotlib.pyplot as plt
 import numpy as np
 import torch
+from .clip_engine import _import_clip, get_clip_engine
+from .packed_mask import PackedMask
+from .render import composite_masks, render_masks
 from .utils import image_to_np_ndarray
 from PIL import Image
 
 
 class FastSAMPrompt:
 
-    def __init__(self, image, results, device='cuda'):
+    def __init__(self, image, results, device='cuda', annotations=None):
+        """
+        Args:
+            image: the image the results were predicted on (path, PIL image or array)
+            results: FastSAM results, or None when prompting against cached `annotations`
+            device: device the results live on
+            annotations: formatted annotations (see _format_results) cached from an earlier run; when given,
+                prompts run on these packed masks and no model output is needed
+        """
         if isinstance(image, str) or isinstance(image, Image.Image):
             image = image_to_np_ndarray(image)
         self.device = device
         self.results = results
         self.img = image
+        self._annotations = annotations
     
     def _segment_image(self, image, bbox):
+        """RGB crop of the bbox region as a bbox-sized array (no full-size canvas)."""
         if isinstance(image, Image.Image):
-            image_array = np.array(image)
-        else:
-            image_array = image
-        segmented_image_array = np.zeros_like(image_array)
+            image = np.asarray(image)
         x1, y1, x2, y2 = bbox
-        segmented_image_array[y1:y2, x1:x2] = image_array[y1:y2, x1:x2]
-        segmented_image = Image.fromarray(segmented_image_array)
-        black_image = Image.new('RGB', image.size, (255, 255, 255))
-        # transparency_mask = np.zeros_like((), dtype=np.uint8)
-        transparency_mask = np.zeros((image_array.shape[0], image_array.shape[1]), dtype=np.uint8)
-        transparency_mask[y1:y2, x1:x2] = 255
-        transparency_mask_image = Image.fromarray(transparency_mask, mode='L')
-        black_image.paste(segmented_image, mask=transparency_mask_image)
-        return black_image
+        return np.ascontiguousarray(image[y1:y2, x1:x2])
 
     def _format_results(self, result, filter=0):
         annotations = []
         n = len(result.masks.data)
         for i in range(n):
             annotation = {}
-            mask = result.masks.data[i] == 1.0
+            # Bit-packed with cached area/bbox; use annotation['segmentation'].decode() for the dense mask
+            mask = PackedMask.from_dense((result.masks.data[i] == 1.0).cpu().numpy())
 
-            if torch.sum(mask) < filter:
+            if mask.area < filter:
                 continue
             annotation['id'] = i
-            annotation['segmentation'] = mask.cpu().numpy()
+            annotation['segmentation'] = mask
             annotation['bbox'] = result.boxes.data[i]
             annotation['score'] = result.boxes.conf[i]
-            annotation['area'] = annotation['segmentation'].sum()
+            annotation['area'] = mask.area
             annotations.append(annotation)
         return annotations
 
-    def filter_masks(annotations):  # filte the overlap mask
+    def get_annotations(self, filter=0):
+        """Formatted annotations of the first result, computed once and shared by all prompts on this instance."""
+        if self._annotations is None:
+            self._annotations = self._format_results(self.results[0], 0)
+        return [annotation for annotation in self._annotations if annotation['area'] >= filter]
+
+    def filter_masks(self, annotations, threshold=0.8, downsample=1):  # filte the overlap mask
+        """
+        Drop masks that are mostly contained in a larger mask: sorted by area (descending), mask j is removed
+        when some earlier, larger mask i covers more than `threshold` of it.
+
+        Pairs are decided all at once: a bbox-overlap pre-filter keeps only pairs whose bboxes can overlap by
+        more than threshold * area_j, then the intersections of the masks involved come from matrix products
+        of their flattened coverage maps (band by band). downsample > 1 pools the masks by that factor first
+        (area-weighted coverage, approximate near mask borders, downsample**2 times cheaper).
+
+        Returns:
+            (kept annotations, set of removed positions in the area-sorted list)
+        """
         annotations.sort(key=lambda x: x['area'], reverse=True)
-        to_remove = set()
-        for i in range(0, len(annotations)):
-            a = annotations[i]
-            for j in range(i + 1, len(annotations)):
-                b = annotations[j]
-                if i != j and j not in to_remove:
-                    # check if
-                    if b['area'] < a['area']:
-                        if (a['segmentation'] & b['segmentation']).sum() / b['segmentation'].sum() > 0.8:
-                            to_remove.add(j)
+        n = len(annotations)
+        if n < 2:
+            return annotations, set()
+        masks = [a['segmentation'] if isinstance(a['segmentation'], PackedMask)
+                 else PackedMask.from_dense(a['segmentation']) for a in annotations]
+        areas = np.array([a['area'] for a in annotations], dtype=np.float64)
+        boxes = np.array([mask.bbox for mask in masks], dtype=np.float64)
+
+        overlap_w = np.minimum(boxes[:, None, 2], boxes[None, :, 2]) - np.maximum(boxes[:, None, 0], boxes[None, :, 0])
+        overlap_h = np.minimum(boxes[:, None, 3], boxes[None, :, 3]) - np.maximum(boxes[:, None, 1], boxes[None, :, 1])
+        bbox_overlap = np.clip(overlap_w, 0, None) * np.clip(overlap_h, 0, None)
+        candidates = (np.triu(np.ones((n, n), dtype=bool), k=1) & (areas[:, None] > areas[None, :]) &
+                      (bbox_overlap > threshold * areas[None, :]))
+        if not candidates.any():
+            return annotations, set()
+
+        involved = np.flatnonzero(candidates.any(axis=0) | candidates.any(axis=1))
+        intersection = np.zeros((n, n), dtype=np.float64)
+        own = np.zeros(n, dtype=np.float64)
+        intersection[np.ix_(involved, involved)], own[involved] = self._pairwise_intersections(
+            [masks[k] for k in involved], downsample)
+        ratio = np.divide(intersection, own[None, :], out=np.zeros_like(intersection), where=own[None, :] > 0)
+        to_remove = set(np.flatnonzero((candidates & (ratio > threshold)).any(axis=0)).tolist())
 
         return [a for i, a in enumerate(annotations) if i not in to_remove], to_remove
 
+    @staticmethod
+    def _pairwise_intersections(masks, downsample=1, band_bytes=64 << 20):
+        """
+        Intersections of every pair of PackedMasks and their own areas, as one matrix product per horizontal
+        band: only the masks crossing a band are decoded for it, and the flattened coverage of a band is
+        capped at `band_bytes`, so memory does not grow with image size times mask count.
+
+        Returns:
+            (m, m) intersection matrix and (m,) areas, in (downsampled) pixels
+        """
+        h, w = masks[0].shape
+        s = max(1, int(downsample))
+        cols = -(-w // s)
+        m = len(masks)
+        band_h = s * max(1, band_bytes // (4 * cols * m))
+        tops = np.array([mask.bbox[1] for mask in masks])
+        bottoms = np.array([mask.bbox[3] for mask in masks])
+        intersection = np.zeros((m, m), dtype=np.float64)
+        own = np.zeros(m, dtype=np.float64)
+        for r0 in range(0, h, band_h):
+            r1 = min(h, r0 + band_h)
+            active = np.flatnonzero((tops < r1) & (bottoms > r0))
+            if not len(active):
+                continue
+            rows = -(-(r1 - r0) // s)
+            band = np.zeros((len(active), rows, cols), dtype=np.float32)
+            for k, index in enumerate(active):
+                # Decode (and pool) only the mask's bbox inside this band, aligned to the pooling grid
+                x1, y1, x2, y2 = masks[index].bbox
+                gx1, gx2 = x1 // s, -(-x2 // s)
+                gy1, gy2 = (max(y1, r0) - r0) // s, -(-(min(y2, r1) - r0) // s)
+                window = masks[index].decode_region(gx1 * s, r0 + gy1 * s, min(w, gx2 * s), min(r1, r0 + gy2 * s))
+                if s > 1:
+                    # Area pooling: fraction of each s x s block covered by the mask (scaled to 0..255)
+                    padded = np.zeros(((gy2 - gy1) * s, (gx2 - gx1) * s), dtype=np.uint8)
+                    padded[:window.shape[0], :window.shape[1]] = window
+                    padded *= 255
+                    window = cv2.resize(padded, (gx2 - gx1, gy2 - gy1), interpolation=cv2.INTER_AREA)
+                band[k, gy1:gy2, gx1:gx2] = window
+            band = band.reshape(len(active), -1)
+            if s > 1:
+                band /= 255
+            intersection[np.ix_(active, active)] += band @ band.T
+            own[active] += band.sum(axis=1)
+        return intersection, own
+
     def _get_bbox_from_mask(self, mask):
         mask = mask.astype(np.uint8)
         contours, hierarchy = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
@@ -94,98 +173,32 @@ class FastSAMPrompt:
              withContours=True) -> np.ndarray:
         if isinstance(annotations[0], dict):
             annotations = [annotation['segmentation'] for annotation in annotations]
+        if isinstance(annotations[0], PackedMask):
+            annotations = [mask.decode() for mask in annotations]
         image = self.img
         image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        original_h = image.shape[0]
-        original_w = image.shape[1]
-        if sys.platform == "darwin":
-            plt.switch_backend("TkAgg")
-        plt.figure(figsize=(original_w / 100, original_h / 100))
-        # Add subplot with no margin.
-        plt.subplots_adjust(top=1, bottom=0, right=1, left=0, hspace=0, wspace=0)
-        plt.margins(0, 0)
-        plt.gca().xaxis.set_major_locator(plt.NullLocator())
-        plt.gca().yaxis.set_major_locator(plt.NullLocator())
-
-        plt.imshow(image)
         if better_quality:
             if isinstance(annotations[0], torch.Tensor):
                 annotations = np.array(annotations.cpu())
             for i, mask in enumerate(annotations):
                 mask = cv2.morphologyEx(mask.astype(np.uint8), cv2.MORPH_CLOSE, np.ones((3, 3), np.uint8))
                 annotations[i] = cv2.morphologyEx(mask.astype(np.uint8), cv2.MORPH_OPEN, np.ones((8, 8), np.uint8))
-        if self.device == 'cpu':
+        if isinstance(annotations, list):
             annotations = np.array(annotations)
-            self.fast_show_mask(
-                annotations,
-                plt.gca(),
-                random_color=mask_random_color,
-                bboxes=bboxes,
-                points=points,
-                pointlabel=point_label,
-                retinamask=retina,
-                target_height=original_h,
-                target_width=original_w,
-            )
-        else:
-            if isinstance(annotations[0], np.ndarray):
-                annotations = torch.from_numpy(annotations)
-            self.fast_show_mask_gpu(
-                annotations,
-                plt.gca(),
-                random_color=mask_random_color,
-                bboxes=bboxes,
-                points=points,
-                pointlabel=point_label,
-                retinamask=retina,
-                target_height=original_h,
-                target_width=original_w,
-            )
-        if isinstance(annotations, torch.Tensor):
-            annotations = annotations.cpu().numpy()
-        if withContours:
-            contour_all = []
-            temp = np.zeros((original_h, original_w, 1))
-            for i, mask in enumerate(annotations):
-                if type(mask) == dict:
-                    mask = mask['segmentation']
-                annotation = mask.astype(np.uint8)
-                if not retina:
-                    annotation = cv2.resize(
-                        annotation,
-                        (original_w, original_h),
-                        interpolation=cv2.INTER_NEAREST,
-                    )
-                contours, hierarchy = cv2.findContours(annotation, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
-                for contour in contours:
-                    contour_all.append(contour)
-            cv2.drawContours(temp, contour_all, -1, (255, 255, 255), 2)
-            color = np.array([0 / 255, 0 / 255, 255 / 255, 0.8])
-            contour_mask = temp / 255 * color.reshape(1, 1, -1)
-            plt.imshow(contour_mask)
-
-        plt.axis('off')
-        fig = plt.gcf()
-        plt.draw()
-
-        try:
-            buf = fig.canvas.tostring_rgb()
-        except AttributeError:
-            # For newer matplotlib versions, use buffer_rgba() and convert
-            fig.canvas.draw()
-            buf = fig.canvas.buffer_rgba()
-            cols, rows = fig.canvas.get_width_height()
-            img_array = np.frombuffer(buf, dtype=np.uint8).reshape(rows, cols, 4)
-            # Convert RGBA to RGB
-            img_array = img_array[:, :, :3]
-        else:
-            cols, rows = fig.canvas.get_width_height()
-            img_array = np.frombuffer(buf, dtype=np.uint8).reshape(rows, cols, 3)
-        
-        result = cv2.cvtColor(img_array, cv2.COLOR_RGB2BGR)
-        plt.close()
-        return result
-            
+        # Composite with NumPy/OpenCV instead of a matplotlib figure: no global pyplot state, so this is
+        # thread-safe, and the colors match the figure (drawn in the same RGB/BGR-swapped space).
+        result = render_masks(
+            image,
+            annotations,
+            bboxes=bboxes,
+            points=points,
+            point_label=point_label,
+            random_color=mask_random_color,
+            retina=retina,
+            with_contours=withContours,
+        )
+        return cv2.cvtColor(result, cv2.COLOR_RGB2BGR)
+
     # Remark for refactoring: IMO a function should do one thing only, storing the image and plotting should be seperated and do not necessarily need to be class functions but standalone utility functions that the user can chain in his scripts to have more fine-grained control. 
     def plot(self,
              annotations,
@@ -230,27 +243,15 @@ class FastSAMPrompt:
         target_width=960,
     ):
         msak_sum = annotation.shape[0]
-        height = annotation.shape[1]
-        weight = annotation.shape[2]
-        #Sort annotations based on area.
-        areas = np.sum(annotation, axis=(1, 2))
-        sorted_indices = np.argsort(areas)
-        annotation = annotation[sorted_indices]
-
-        index = (annotation != 0).argmax(axis=0)
         if random_color:
-            color = np.random.random((msak_sum, 1, 1, 3))
+            color = np.random.random((msak_sum, 3))
         else:
-            color = np.ones((msak_sum, 1, 1, 3)) * np.array([30 / 255, 144 / 255, 255 / 255])
-        transparency = np.ones((msak_sum, 1, 1, 1)) * 0.6
+            color = np.ones((msak_sum, 3)) * np.array([30 / 255, 144 / 255, 255 / 255])
+        transparency = np.ones((msak_sum, 1)) * 0.6
         visual = np.concatenate([color, transparency], axis=-1)
-        mask_image = np.expand_dims(annotation, -1) * visual
-
-        show = np.zeros((height, weight, 4))
-        h_indices, w_indices = np.meshgrid(np.arange(height), np.arange(weight), indexing='ij')
-        indices = (index[h_indices, w_indices], h_indices, w_indices, slice(None))
-        # Use vectorized indexing to update the values of 'show'.
-        show[h_indices, w_indices, :] = mask_image[indices]
+        # Pick the topmost (smallest-area) mask per pixel once and gather its color from the N x 4 palette,
+        # so peak memory is one H x W x 4 buffer instead of an N x H x W x 4 stack.
+        show = composite_masks(annotation, visual)
         if bboxes is not None:
             for bbox in bboxes:
                 x1, y1, x2, y2 = bbox
@@ -287,30 +288,15 @@ class FastSAMPrompt:
         target_width=960,
     ):
         msak_sum = annotation.shape[0]
-        height = annotation.shape[1]
-        weight = annotation.shape[2]
-        areas = torch.sum(annotation, dim=(1, 2))
-        sorted_indices = torch.argsort(areas, descending=False)
-        annotation = annotation[sorted_indices]
-        # Find the index of the first non-zero value at each position.
-        index = (annotation != 0).to(torch.long).argmax(dim=0)
         if random_color:
-            color = torch.rand((msak_sum, 1, 1, 3)).to(annotation.device)
+            color = torch.rand((msak_sum, 3)).to(annotation.device)
         else:
-            color = torch.ones((msak_sum, 1, 1, 3)).to(annotation.device) * torch.tensor([
+            color = torch.ones((msak_sum, 3)).to(annotation.device) * torch.tensor([
                 30 / 255, 144 / 255, 255 / 255]).to(annotation.device)
-        transparency = torch.ones((msak_sum, 1, 1, 1)).to(annotation.device) * 0.6
+        transparency = torch.ones((msak_sum, 1)).to(annotation.device) * 0.6
         visual = torch.cat([color, transparency], dim=-1)
-        mask_image = torch.unsqueeze(annotation, -1) * visual
-        # Select data according to the index. The index indicates which batch's data to choose at each position, converting the mask_image into a single batch form.
-        show = torch.zeros((height, weight, 4)).to(annotation.device)
-        try:
-            h_indices, w_indices = torch.meshgrid(torch.arange(height), torch.arange(weight), indexing='ij')
-        except:
-            h_indices, w_indices = torch.meshgrid(torch.arange(height), torch.arange(weight))
-        indices = (index[h_indices, w_indices], h_indices, w_indices, slice(None))
-        # Use vectorized indexing to update the values of 'show'.
-        show[h_indices, w_indices, :] = mask_image[indices]
+        # Same as the CPU path: one index map on the device, then a gather from the N x 4 palette.
+        show = composite_masks(annotation, visual)
         show_cpu = show.cpu().numpy()
         if bboxes is not None:
             for bbox in bboxes:
@@ -337,17 +323,10 @@ class FastSAMPrompt:
     # clip
     @torch.no_grad()
     def retrieve(self, model, preprocess, elements, search_text: str, device) -> int:
-        preprocessed_images = [preprocess(image).to(device) for image in elements]
-        try:
-           import clip  # for linear_assignment
-    
-        except (ImportError, AssertionError, AttributeError):
-           from ultralytics.yolo.utils.checks import check_requirements
-    
-           check_requirements('git+https://github.com/openai/CLIP.git')  # required before installing lap from source
-           import clip
-
-
+        clip = _import_clip()
+        preprocessed_images = [
+            preprocess(Image.fromarray(image) if isinstance(image, np.ndarray) else image).to(device)
+            for image in elements]
         tokenized_text = clip.tokenize([search_text]).to(device)
         stacked_images = torch.stack(preprocessed_images)
         image_features = model.encode_image(stacked_images)
@@ -358,13 +337,13 @@ class FastSAMPrompt:
         return probs[:, 0].softmax(dim=0)
 
     def _crop_image(self, format_results):
-
-        image = Image.fromarray(cv2.cvtColor(self.img, cv2.COLOR_BGR2RGB))
-        ori_w, ori_h = image.size
+        """Bbox-sized RGB crops of every mask larger than 100 pixels.
+        Crops are cut from the image directly (boxes are scaled when the masks are at another resolution),
+        so neither the image nor a per-mask canvas is copied at full size.
+        """
         annotations = format_results
+        ori_h, ori_w = self.img.shape[:2]
         mask_h, mask_w = annotations[0]['segmentation'].shape
-        if ori_w != mask_w or ori_h != mask_h:
-            image = image.resize((mask_w, mask_h))
         cropped_boxes = []
         cropped_images = []
         not_crop = []
@@ -372,92 +351,201 @@ class FastSAMPrompt:
         # annotations, _ = filter_masks(annotations)
         # filter_id = list(_)
         for _, mask in enumerate(annotations):
-            if np.sum(mask['segmentation']) <= 100:
+            if mask['area'] <= 100:
                 filter_id.append(_)
                 continue
-            bbox = self._get_bbox_from_mask(mask['segmentation'])  # mask 的 bbox
-            cropped_boxes.append(self._segment_image(image, bbox))  
-            # cropped_boxes.append(segment_image(image,mask["segmentation"]))
+            bbox = mask['segmentation'].bbox  # mask 的 bbox
+            x1, y1, x2, y2 = bbox
+            if ori_w != mask_w or ori_h != mask_h:
+                x1, x2 = x1 * ori_w // mask_w, max(-(-x2 * ori_w // mask_w), x1 * ori_w // mask_w + 1)
+                y1, y2 = y1 * ori_h // mask_h, max(-(-y2 * ori_h // mask_h), y1 * ori_h // mask_h + 1)
+            # self.img is BGR; the channel flip is a view, only the crop is copied
+            cropped_boxes.append(self._segment_image(self.img[:, :, ::-1], [x1, y1, x2, y2]))
             cropped_images.append(bbox)  # Save the bounding box of the cropped image.
 
         return cropped_boxes, cropped_images, not_crop, filter_id, annotations
 
+    @staticmethod
+    def _clip_box(bbox, h, w, target_height, target_width):
+        """Scale a box from image to mask resolution and clip it to the mask."""
+        if h != target_height or w != target_width:
+            bbox = [
+                int(bbox[0] * w / target_width),
+                int(bbox[1] * h / target_height),
+                int(bbox[2] * w / target_width),
+                int(bbox[3] * h / target_height), ]
+        bbox = list(bbox)
+        bbox[0] = round(bbox[0]) if round(bbox[0]) > 0 else 0
+        bbox[1] = round(bbox[1]) if round(bbox[1]) > 0 else 0
+        bbox[2] = round(bbox[2]) if round(bbox[2]) < w else w
+        bbox[3] = round(bbox[3]) if round(bbox[3]) < h else h
+        return bbox
+
+    def _scaled_boxes(self, bboxes, h, w):
+        """(k, 4) int array of boxes scaled to mask resolution and clipped to the mask."""
+        boxes = []
+        for bbox in bboxes:
+            assert (bbox[2] != 0 and bbox[3] != 0)
+            boxes.append(self._clip_box(bbox, h, w, self.img.shape[0], self.img.shape[1]))
+        return np.array(boxes, dtype=np.int64).reshape(-1, 4)
+
+    @staticmethod
+    def _best_iou_index(masks_area, orig_masks_area, boxes):
+        """Index of the mask with the highest IoU for every box.
+        Args:
+            masks_area: (n, k) pixels of mask i inside box j
+            orig_masks_area: (n,) mask areas
+            boxes: (k, 4) clipped boxes
+        """
+        bbox_area = (boxes[:, 3] - boxes[:, 1]) * (boxes[:, 2] - boxes[:, 0])
+        union = bbox_area[None, :] + orig_masks_area[:, None] - masks_area
+        with np.errstate(divide='ignore', invalid='ignore'):
+            IoUs = masks_area / union
+        return list(set(int(i) for i in np.argmax(IoUs, axis=0)))
+
+    @staticmethod
+    def _box_sums(masks, boxes, chunk_size=16):
+        """Pixels of every mask inside every box, from per-mask integral images.
+        The integral image covers only the window spanned by all boxes and is built once per mask (in chunks to
+        bound memory), then each box is four lookups, so the cost does not grow with the number of boxes.
+        Returns:
+            masks_area: (n, k) float64 array
+            orig_masks_area: (n,) float64 array
+        """
+        n, h, w = masks.shape
+        # Window spanned by all boxes, inside the mask
+        wx1, wy1 = min(max(int(boxes[:, 0].min()), 0), w), min(max(int(boxes[:, 1].min()), 0), h)
+        wx2, wy2 = min(max(int(boxes[:, 2].max()), wx1), w), min(max(int(boxes[:, 3].max()), wy1), h)
+        # Every corner is clamped into the window, so boxes starting past the mask edge sum to 0 as with slicing
+        x1, y1, x2, y2 = (torch.as_tensor(np.clip(boxes[:, i] - offset, 0, limit), device=masks.device)
+                          for i, offset, limit in zip(range(4), (wx1, wy1, wx1, wy1),
+                                                      (wx2 - wx1, wy2 - wy1, wx2 - wx1, wy2 - wy1)))
+        masks_area, orig_masks_area = [], []
+        for start in range(0, n, chunk_size):
+            chunk = masks[start:start + chunk_size] != 0
+            window = chunk[:, wy1:wy2, wx1:wx2].to(torch.int32)
+            integral = torch.zeros((len(chunk), wy2 - wy1 + 1, wx2 - wx1 + 1), dtype=torch.int32, device=masks.device)
+            integral[:, 1:, 1:] = window.cumsum(1).cumsum(2)
+            sums = integral[:, y2, x2] - integral[:, y1, x2] - integral[:, y2, x1] + integral[:, y1, x1]
+            masks_area.append(sums.cpu().numpy())
+            orig_masks_area.append(chunk.sum(dim=(1, 2)).cpu().numpy())
+        masks_area = np.concatenate(masks_area).astype(np.float64)
+        # Inverted (empty) boxes count nothing, as with slicing
+        masks_area[:, (boxes[:, 2] <= boxes[:, 0]) | (boxes[:, 3] <= boxes[:, 1])] = 0
+        return masks_area, np.concatenate(orig_masks_area).astype(np.float64)
+
     def box_prompt(self, bbox=None, bboxes=None):
-        if self.results == None:
+        if self.results == None and self._annotations is None:
             return []
         assert bbox or bboxes
         if bboxes is None:
             bboxes = [bbox]
-        max_iou_index = []
-        for bbox in bboxes:
-            assert (bbox[2] != 0 and bbox[3] != 0)
-            masks = self.results[0].masks.data
-            target_height = self.img.shape[0]
-            target_width = self.img.shape[1]
-            h = masks.shape[1]
-            w = masks.shape[2]
-            if h != target_height or w != target_width:
-                bbox = [
-                    int(bbox[0] * w / target_width),
-                    int(bbox[1] * h / target_height),
-                    int(bbox[2] * w / target_width),
-                    int(bbox[3] * h / target_height), ]
-            bbox[0] = round(bbox[0]) if round(bbox[0]) > 0 else 0
-            bbox[1] = round(bbox[1]) if round(bbox[1]) > 0 else 0
-            bbox[2] = round(bbox[2]) if round(bbox[2]) < w else w
-            bbox[3] = round(bbox[3]) if round(bbox[3]) < h else h
-
-            # IoUs = torch.zeros(len(masks), dtype=torch.float32)
-            bbox_area = (bbox[3] - bbox[1]) * (bbox[2] - bbox[0])
-
-            masks_area = torch.sum(masks[:, bbox[1]:bbox[3], bbox[0]:bbox[2]], dim=(1, 2))
-            orig_masks_area = torch.sum(masks, dim=(1, 2))
-
-            union = bbox_area + orig_masks_area - masks_area
-            IoUs = masks_area / union
-            max_iou_index.append(int(torch.argmax(IoUs)))
-        max_iou_index = list(set(max_iou_index))
+        if self.results == None:
+            return self._box_prompt_packed(bboxes)
+        masks = self.results[0].masks.data
+        boxes = self._scaled_boxes(bboxes, masks.shape[1], masks.shape[2])
+        masks_area, orig_masks_area = self._box_sums(masks, boxes)
+        max_iou_index = self._best_iou_index(masks_area, orig_masks_area, boxes)
         return np.array(masks[max_iou_index].cpu().numpy())
 
+    def _box_prompt_packed(self, bboxes):
+        """box_prompt on cached packed annotations: each mask integrates its own bbox window only."""
+        annotations = self.get_annotations(0)
+        h, w = annotations[0]['segmentation'].shape
+        boxes = self._scaled_boxes(bboxes, h, w)
+        masks_area = np.array([annotation['segmentation'].region_sums(boxes) for annotation in annotations],
+                              dtype=np.float64)
+        orig_masks_area = np.array([annotation['area'] for annotation in annotations], dtype=np.float64)
+        max_iou_index = self._best_iou_index(masks_area, orig_masks_area, boxes)
+        return np.array([annotations[i]['segmentation'].decode() for i in max_iou_index])
+
+    @staticmethod
+    def _point_mask_labels(hits, pointlabel):
+        """Label each mask takes from the points: the label of the last valid point inside it, -1 if none.
+        Args:
+            hits: (n, k) bool, whether point j falls inside mask i
+            pointlabel: (k,) labels, 1 positive, 0 negative; other values are ignored
+        """
+        pointlabel = np.asarray(pointlabel)
+        hits = hits & np.isin(pointlabel, (0, 1))[None, :]
+        last = hits.shape[1] - 1 - np.argmax(hits[:, ::-1], axis=1)
+        return np.where(hits.any(axis=1), pointlabel[last], -1)
+
     def point_prompt(self, points, pointlabel):  # numpy 
-        if self.results == None:
+        """Union of the masks picked by positive points minus those picked by negative points.
+        Masks are applied from largest to smallest, each taking the label of the last point inside it, so
+        smaller masks override larger ones. All points are looked up in all masks at once, and only masks
+        hit by a point are painted.
+        """
+        if self.results == None and self._annotations is None:
             return []
-        masks = self._format_results(self.results[0], 0)
+        if self.results != None:
+            masks = self.results[0].masks.data
+            h, w = masks.shape[1], masks.shape[2]
+        else:
+            annotations = self.get_annotations(0)
+            h, w = annotations[0]['segmentation'].shape
         target_height = self.img.shape[0]
         target_width = self.img.shape[1]
-        h = masks[0]['segmentation'].shape[0]
-        w = masks[0]['segmentation'].shape[1]
+        points = np.array(points, dtype=np.float64).reshape(-1, 2)
         if h != target_height or w != target_width:
-            points = [[int(point[0] * w / target_width), int(point[1] * h / target_height)] for point in points]
-        onemask = np.zeros((h, w))
-        masks = sorted(masks, key=lambda x: x['area'], reverse=True)
-        for i, annotation in enumerate(masks):
-            if type(annotation) == dict:
-                mask = annotation['segmentation']
+            points = points * [w / target_width, h / target_height]
+        xs = np.clip(points[:, 0].astype(np.int64), 0, w - 1)
+        ys = np.clip(points[:, 1].astype(np.int64), 0, h - 1)
+
+        if self.results != None:
+            hits = (masks[:, torch.as_tensor(ys, device=masks.device), torch.as_tensor(xs, device=masks.device)]
+                    != 0).cpu().numpy()
+            areas = (masks != 0).sum(dim=(1, 2)).cpu().numpy()
+        else:
+            hits = np.array([annotation['segmentation'].contains_many(xs, ys) for annotation in annotations])
+            areas = np.array([annotation['area'] for annotation in annotations])
+        labels = self._point_mask_labels(hits.reshape(len(areas), len(xs)), pointlabel)
+
+        onemask = np.zeros((h, w), dtype=bool)
+        for i in np.argsort(-areas, kind='stable'):
+            if labels[i] < 0:
+                continue
+            if self.results != None:
+                mask = (masks[i] != 0).cpu().numpy()
             else:
-                mask = annotation
-            for i, point in enumerate(points):
-                if mask[point[1], point[0]] == 1 and pointlabel[i] == 1:
-                    onemask[mask] = 1
-                if mask[point[1], point[0]] == 1 and pointlabel[i] == 0:
-                    onemask[mask] = 0
-        onemask = onemask >= 1
+                mask = annotations[i]['segmentation'].decode()
+            onemask[mask] = labels[i] == 1
         return np.array([onemask])
 
-    def text_prompt(self, text):
-        if self.results == None:
+    def text_prompt(self, text, device=None, half=None, batch_size=None):
+        """Mask whose crop best matches the text under CLIP.
+        Args:
+            text: prompt string
+            device: device for CLIP, defaults to this instance's device
+            half: float16 CLIP on non-CPU devices; None picks half on CUDA
+            batch_size: crops per CLIP image-encoder pass, defaults to the shared engine's batch size
+        """
+        if self.results == None and self._annotations is None:
             return []
-        format_results = self._format_results(self.results[0], 0)
+        format_results = self.get_annotations(0)
         cropped_boxes, cropped_images, not_crop, filter_id, annotations = self._crop_image(format_results)
-        clip_model, preprocess = clip.load('ViT-B/32', device=self.device)
-        scores = self.retrieve(clip_model, preprocess, cropped_boxes, text, device=self.device)
-        max_idx = scores.argsort()
-        max_idx = max_idx[-1]
-        max_idx += sum(np.array(filter_id) <= int(max_idx))
-        return np.array([annotations[max_idx]['segmentation']])
-
-    def everything_prompt(self):
-        if self.results == None:
+        if not cropped_boxes:
             return []
-        return self.results[0].masks.data
-        
+        engine = get_clip_engine(device=device or self.device, half=half)
+        scores = engine.score(cropped_boxes, text, batch_size=batch_size)
+        filtered = set(filter_id)
+        crop_ids = [i for i in range(len(annotations)) if i not in filtered]
+        max_idx = crop_ids[int(scores.argmax())]
+        return np.array([annotations[max_idx]['segmentation'].decode()])
+
+    def everything_prompt(self, filter_overlap=True, threshold=0.8, downsample=1):
+        if self.results == None and self._annotations is None:
+            return []
+        if self.results != None:
+            masks = self.results[0].masks.data
+            if not filter_overlap or len(masks) < 2:
+                return masks
+        annotations = self.get_annotations(0)
+        if filter_overlap:
+            # Drop masks that are mostly covered by a larger mask, keeping the original order
+            annotations, _ = self.filter_masks(annotations, threshold=threshold, downsample=downsample)
+        annotations = sorted(annotations, key=lambda annotation: annotation['id'])
+        if self.results != None:
+            return masks[[annotation['id'] for annotation in annotations]]
+        return np.array([annotation['segmentation'].decode() for annotation in annotations])
@@ -0,0 +1,134 @@
+import cv2
+import numpy as np
+import torch
+
+# Colors and sizes of the matplotlib figure previously used by FastSAMPrompt.plot_to_result
+# (1px == 1 figure unit at dpi=100), so the compositor reproduces the same look.
+DEFAULT_MASK_COLOR = np.array([30 / 255, 144 / 255, 255 / 255])
+MASK_ALPHA = 0.6
+CONTOUR_COLOR = np.array([0 / 255, 0 / 255, 255 / 255])
+CONTOUR_ALPHA = 0.8
+CONTOUR_THICKNESS = 2
+BOX_COLOR = (0, 0, 255)  # matplotlib 'b'
+POSITIVE_POINT_COLOR = (191, 191, 0)  # matplotlib 'y'
+NEGATIVE_POINT_COLOR = (191, 0, 191)  # matplotlib 'm'
+POINT_RADIUS = 3  # scatter s=20 -> ~6px diameter
+
+
+def mask_palette(num_masks, random_color=True):
+    '''Per-mask RGB colors in [0, 1], indexed by the mask's position in ascending area order.
+    Args:
+    num_masks: number of masks
+    random_color: random color per mask, otherwise the default blue for all
+    Returns:
+    palette: (num_masks, 3) float array
+    '''
+    if random_color:
+        return np.random.random((num_masks, 3))
+    return np.tile(DEFAULT_MASK_COLOR, (num_masks, 1))
+
+
+def topmost_mask_index(masks):
+    '''Pick, for every pixel, the smallest covering mask (masks are layered by area, smallest on top).
+    Masks are painted from largest to smallest into a single index map, so memory stays at one H x W
+    buffer regardless of the number of masks.
+    Args:
+    masks: (n, h, w) numpy array or torch tensor, non-zero where the mask covers
+    Returns:
+    index: (h, w) int32 array of the same kind (and device) as masks, holding the mask's position in
+           ascending area order, -1 where uncovered
+    '''
+    if isinstance(masks, torch.Tensor):
+        order = torch.argsort(masks.flatten(1).sum(dim=1), descending=False)
+        index = torch.full(masks.shape[1:], -1, dtype=torch.int32, device=masks.device)
+    else:
+        order = np.argsort(np.sum(masks, axis=(1, 2)))
+        index = np.full(masks.shape[1:], -1, dtype=np.int32)
+    for rank in range(len(order) - 1, -1, -1):
+        index[masks[order[rank]] != 0] = rank
+    return index
+
+
+def composite_masks(masks, palette):
+    '''Build the (h, w, c) overlay layer: the palette row of the topmost mask at every pixel, zeros elsewhere.
+    Only the index map and the output are allocated, instead of an (n, h, w, c) per-mask color stack.
+    Args:
+    masks: (n, h, w) numpy array or torch tensor
+    palette: (n, c) colors (e.g. RGBA) indexed by position in ascending area order
+    Returns:
+    layer: (h, w, c) float32 array of the same kind (and device) as masks
+    '''
+    index = topmost_mask_index(masks)
+    if isinstance(masks, torch.Tensor):
+        palette = torch.as_tensor(palette, dtype=torch.float32, device=masks.device)
+        # Extra transparent row: index -1 (uncovered) selects it
+        palette = torch.cat([palette, palette.new_zeros((1, palette.shape[1]))])
+        return palette[index.long()]
+    palette = np.asarray(palette, dtype=np.float32)
+    palette = np.concatenate([palette, np.zeros((1, palette.shape[1]), dtype=np.float32)])
+    return palette[index]
+
+
+def _blend(out, region, color, alpha):
+    '''Alpha-blend one color (or one color per selected pixel) into the selected pixels of out in place.'''
+    out[region] = out[region] * (1 - alpha) + np.asarray(color) * (255 * alpha)
+
+
+def render_masks(image,
+                 masks,
+                 bboxes=None,
+                 points=None,
+                 point_label=None,
+                 random_color=True,
+                 retina=True,
+                 with_contours=True):
+    '''Composite masks, contours, boxes and points onto an image with NumPy/OpenCV only.
+    Uses no global state, so it is safe to call from several threads at once.
+    Args:
+    image: (H, W, 3) uint8 image, channel order is the one the colors are given in
+    masks: (n, h, w) numpy array or torch tensor; (h, w) == (H, W) unless retina is False
+    bboxes: boxes [x1, y1, x2, y2] in image pixels
+    points: points [x, y] in image pixels
+    point_label: 1 for positive, 0 for negative points
+    random_color: random color per mask, otherwise the default blue
+    retina: masks are already at image resolution; otherwise they are upscaled with nearest neighbour
+    with_contours: draw mask contours
+    Returns:
+    result: (H, W, 3) uint8 image
+    '''
+    target_h, target_w = image.shape[:2]
+    out = image.astype(np.float32)
+
+    index = topmost_mask_index(masks)
+    if isinstance(index, torch.Tensor):
+        index = index.cpu().numpy()
+    if not retina and index.shape != (target_h, target_w):
+        index = cv2.resize(index.astype(np.float32), (target_w, target_h),
+                           interpolation=cv2.INTER_NEAREST).astype(np.int32)
+    palette = mask_palette(len(masks), random_color)
+    covered = index >= 0
+    _blend(out, covered, palette[index[covered]], MASK_ALPHA)
+
+    if with_contours:
+        stencil = np.zeros((target_h, target_w), dtype=np.uint8)
+        for mask in masks:
+            if isinstance(mask, torch.Tensor):
+                mask = mask.cpu().numpy()
+            mask = mask.astype(np.uint8)
+            if not retina:
+                mask = cv2.resize(mask, (target_w, target_h), interpolation=cv2.INTER_NEAREST)
+            contours, _ = cv2.findContours(mask, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
+            cv2.drawContours(stencil, contours, -1, 255, CONTOUR_THICKNESS)
+        _blend(out, stencil > 0, CONTOUR_COLOR, CONTOUR_ALPHA)
+
+    result = np.clip(np.rint(out), 0, 255).astype(np.uint8)
+    if bboxes is not None:
+        for x1, y1, x2, y2 in bboxes:
+            cv2.rectangle(result, (int(x1), int(y1)), (int(x2), int(y2)), BOX_COLOR, 1)
+    if points is not None:
+        for point, label in zip(points, point_label):
+            color = {1: POSITIVE_POINT_COLOR, 0: NEGATIVE_POINT_COLOR}.get(label)
+            if color is None:
+                continue
+            cv2.circle(result, (int(point[0]), int(point[1])), POINT_RADIUS, color, -1, cv2.LINE_AA)
+    return result
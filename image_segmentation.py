@@ -2,13 +2,14 @@
 图像分割模块 - 基于FastSAM的医学图像分割功能
 """
 import os
+import time
 import torch
 import numpy as np
 from PIL import Image
 import cv2
-import matplotlib.pyplot as plt
-import matplotlib.patches as patches
 from fastsam import FastSAM, FastSAMPrompt
+from segmentation_batcher import SegmentationBatcher, SegmentationQueueFull
+from segmentation_cache import SegmentationSessionCache
 import tempfile
 import uuid
 from pathlib import Path
@@ -17,14 +18,25 @@ from pathlib import Path
 class ImageSegmentationService:
     """图像分割服务类"""
 
-    def __init__(self, model_path="./weights/FastSAM_X.pt"):
+    def __init__(self, model_path="./weights/FastSAM_X.pt", enable_batching=True, enable_sessions=True):
         """
         初始化图像分割服务
         Args:
             model_path: FastSAM模型权重文件路径
+            enable_batching: 是否通过微批调度器合并并发请求的前向推理
+            enable_sessions: 是否缓存每张图像的分割结果，供后续提示直接复用
         """
         self.model_path = model_path
         self.model = None
+        self.batcher = None
+        self.enable_batching = enable_batching
+        self.session_cache = SegmentationSessionCache(
+            cache_dir=os.getenv("SEGMENT_SESSION_DIR", "./cache/segment_sessions"),
+            max_bytes=int(float(os.getenv("SEGMENT_SESSION_MAX_MB", "512")) * (1 << 20)),
+            ttl=float(os.getenv("SEGMENT_SESSION_TTL", "1800")),
+            max_disk_bytes=int(float(os.getenv("SEGMENT_SESSION_MAX_DISK_MB", "2048")) * (1 << 20))
+        ) if enable_sessions else None
+        self.inference_timeout = float(os.getenv("SEGMENT_TIMEOUT", "120"))
         self.device = torch.device(
             "cuda" if torch.cuda.is_available()
             else "mps" if torch.backends.mps.is_available()
@@ -48,6 +60,14 @@ class ImageSegmentationService:
 
             self.model = FastSAM(self.model_path)
             print(f"FastSAM模型加载成功，使用设备: {self.device}")
+            if self.enable_batching:
+                self.batcher = SegmentationBatcher(
+                    self.model,
+                    device=self.device,
+                    max_batch_size=int(os.getenv("SEGMENT_MAX_BATCH_SIZE", "4")),
+                    max_wait_ms=float(os.getenv("SEGMENT_MAX_WAIT_MS", "20")),
+                    max_queue_size=int(os.getenv("SEGMENT_MAX_QUEUE_SIZE", "16"))
+                )
             return True
         except Exception as e:
             print(f"加载FastSAM模型失败: {e}")
@@ -84,6 +104,9 @@ class ImageSegmentationService:
             
         Returns:
             tuple: (分割结果图像路径, 原始图像路径, 分割信息)
+
+        Raises:
+            SegmentationQueueFull: 启用微批时分割队列已满
         """
         if not self.model:
             return None, None, "模型未加载"
@@ -99,38 +122,37 @@ class ImageSegmentationService:
             new_h = int(h * scale)
             resized_image = input_image.resize((new_w, new_h))
 
-            # 运行FastSAM模型
-            results = self.model(
-                resized_image,
-                device=self.device,
-                retina_masks=use_retina,
-                iou=iou_threshold,
-                conf=conf_threshold,
-                imgsz=input_size,
-            )
+            # 运行FastSAM模型（启用微批时与其他并发请求合并为一次前向推理）
+            if self.batcher is not None:
+                result = self.batcher.segment(
+                    resized_image,
+                    timeout=self.inference_timeout,
+                    imgsz=input_size,
+                    conf=conf_threshold,
+                    iou=iou_threshold,
+                    retina_masks=use_retina,
+                )
+                results = [result] if result is not None else []
+            else:
+                results = self.model(
+                    resized_image,
+                    device=self.device,
+                    retina_masks=use_retina,
+                    iou=iou_threshold,
+                    conf=conf_threshold,
+                    imgsz=input_size,
+                )
+            if not results:
+                return None, None, "未检测到分割目标"
 
             # 使用FastSAMPrompt进行后处理
             prompt_process = FastSAMPrompt(resized_image, results, device=str(self.device))
 
             # 处理不同类型的提示
-            if text_prompt:
-                # 文本提示分割
-                annotations = prompt_process.text_prompt(text_prompt)
-            elif point_prompts and point_labels:
-                # 点提示分割
-                # 调整点坐标到缩放后的图像
-                scaled_points = [[int(x * scale) for x in point] for point in point_prompts]
-                annotations = prompt_process.point_prompt(scaled_points, point_labels)
-            elif box_prompts:
-                # 框提示分割
-                # 调整框坐标到缩放后的图像
-                scaled_boxes = [[int(coord * scale) for coord in box] for box in box_prompts]
-                annotations = prompt_process.box_prompt(bboxes=scaled_boxes)
-            else:
-                # 默认全图分割
-                annotations = prompt_process.everything_prompt()
+            annotations = self._apply_prompts(prompt_process, scale, text_prompt, point_prompts, point_labels,
+                                              box_prompts)
 
-            # 生成分割结果图像
+            # 生成并保存分割结果图像
             segmented_image_array = prompt_process.plot_to_result(
                 annotations=annotations,
                 mask_random_color=mask_random_color,
@@ -138,21 +160,7 @@ class ImageSegmentationService:
                 retina=use_retina,
                 withContours=withContours,
             )
-
-            # 保存分割结果
-            timestamp = str(uuid.uuid4())
-            segmented_filename = f"segmented_{timestamp}.png"
-            segmented_path = os.path.join("./static/segmented", segmented_filename)
-
-            # 将numpy数组转换为PIL图像并保存
-            if isinstance(segmented_image_array, np.ndarray):
-                if segmented_image_array.dtype != np.uint8:
-                    segmented_image_array = (segmented_image_array * 255).astype(np.uint8)
-                segmented_pil = Image.fromarray(segmented_image_array)
-                segmented_pil.save(segmented_path)
-            else:
-                # 如果是其他类型，尝试直接保存
-                segmented_image_array.save(segmented_path)
+            segmented_path = self._save_segmented(segmented_image_array)
 
             # 生成分割信息
             num_masks = len(annotations) if annotations is not None else 0
@@ -166,12 +174,121 @@ class ImageSegmentationService:
                 "processed_size": (new_w, new_h)
             }
 
+            # 缓存本次推理结果，后续提示通过 image_id 直接在缓存的掩码上计算
+            if self.session_cache is not None:
+                image_id = uuid.uuid4().hex
+                self.session_cache.put(image_id, {
+                    "image": prompt_process.img,
+                    "annotations": self._session_annotations(prompt_process),
+                    "scale": scale,
+                    "use_retina": use_retina,
+                    "info": segmentation_info
+                })
+                segmentation_info["image_id"] = image_id
+
             return segmented_path, image_path, segmentation_info
 
+        except SegmentationQueueFull:
+            raise
         except Exception as e:
             print(f"图像分割失败: {e}")
             return None, None, f"分割失败: {str(e)}"
 
+    def prompt_session(self, image_id,
+                       text_prompt=None,
+                       point_prompts=None,
+                       point_labels=None,
+                       box_prompts=None,
+                       better_quality=False,
+                       withContours=True,
+                       mask_random_color=True):
+        """
+        在已缓存的分割结果上执行提示分割（不重新打开、缩放图像，也不重新运行模型）
+
+        Args:
+            image_id: segment_image 返回的分割信息中的 image_id
+            其余参数与 segment_image 相同，点和框的坐标均为原始图像坐标
+
+        Returns:
+            tuple: (分割结果图像路径, 分割信息)；失败时路径为 None，分割信息为错误描述
+        """
+        if self.session_cache is None:
+            return None, "分割会话缓存未启用"
+        session = self.session_cache.get(image_id)
+        if session is None:
+            return None, "分割会话不存在或已过期，请重新上传图像"
+
+        try:
+            started = time.perf_counter()
+            prompt_process = FastSAMPrompt(session["image"], None, device=str(self.device),
+                                           annotations=session["annotations"])
+            annotations = self._apply_prompts(prompt_process, session["scale"], text_prompt, point_prompts,
+                                              point_labels, box_prompts)
+            if annotations is None or len(annotations) == 0:
+                return None, "未找到匹配的分割目标"
+
+            segmented_image_array = prompt_process.plot_to_result(
+                annotations=annotations,
+                mask_random_color=mask_random_color,
+                better_quality=better_quality,
+                retina=session["use_retina"],
+                withContours=withContours,
+            )
+            segmented_path = self._save_segmented(segmented_image_array)
+
+            segmentation_info = dict(session["info"], image_id=image_id, num_masks=len(annotations),
+                                     prompt_ms=round((time.perf_counter() - started) * 1000, 1))
+            return segmented_path, segmentation_info
+
+        except Exception as e:
+            print(f"提示分割失败: {e}")
+            return None, f"提示分割失败: {str(e)}"
+
+    def _apply_prompts(self, prompt_process, scale, text_prompt, point_prompts, point_labels, box_prompts):
+        """按提示类型调用 FastSAMPrompt，点和框坐标从原始图像缩放到处理后的图像"""
+        if text_prompt:
+            # 文本提示分割
+            return prompt_process.text_prompt(text_prompt)
+        elif point_prompts and point_labels:
+            # 点提示分割
+            scaled_points = [[int(x * scale) for x in point] for point in point_prompts]
+            return prompt_process.point_prompt(scaled_points, point_labels)
+        elif box_prompts:
+            # 框提示分割
+            scaled_boxes = [[int(coord * scale) for coord in box] for box in box_prompts]
+            return prompt_process.box_prompt(bboxes=scaled_boxes)
+        else:
+            # 默认全图分割
+            return prompt_process.everything_prompt()
+
+    def _save_segmented(self, segmented_image_array):
+        """保存分割结果图像，返回文件路径"""
+        timestamp = str(uuid.uuid4())
+        segmented_filename = f"segmented_{timestamp}.png"
+        segmented_path = os.path.join("./static/segmented", segmented_filename)
+
+        # 将numpy数组转换为PIL图像并保存
+        if isinstance(segmented_image_array, np.ndarray):
+            if segmented_image_array.dtype != np.uint8:
+                segmented_image_array = (segmented_image_array * 255).astype(np.uint8)
+            segmented_pil = Image.fromarray(segmented_image_array)
+            segmented_pil.save(segmented_path)
+        else:
+            # 如果是其他类型，尝试直接保存
+            segmented_image_array.save(segmented_path)
+        return segmented_path
+
+    @staticmethod
+    def _session_annotations(prompt_process):
+        """取出位压缩的标注并把张量字段转为 numpy/float，便于缓存和溢出到磁盘"""
+        return [{
+            "id": annotation["id"],
+            "segmentation": annotation["segmentation"],
+            "bbox": annotation["bbox"].cpu().numpy(),
+            "score": float(annotation["score"]),
+            "area": annotation["area"]
+        } for annotation in prompt_process.get_annotations(0)]
+
     def save_uploaded_image(self, image_file):
         """
         保存上传的图像文件
@@ -208,12 +325,17 @@ class ImageSegmentationService:
             "model_loaded": self.model is not None,
             "model_path": self.model_path,
             "device": str(self.device),
-            "model_exists": os.path.exists(self.model_path)
+            "model_exists": os.path.exists(self.model_path),
+            "batching": self.batcher.stats() if self.batcher is not None else None,
+            "sessions": self.session_cache.stats() if self.session_cache is not None else None
         }
 
 
 # 全局图像分割服务实例
-image_segmentation_service = ImageSegmentationService()
+image_segmentation_service = ImageSegmentationService(
+    enable_batching=os.getenv("SEGMENT_BATCHING", "true").lower() != "false",
+    enable_sessions=os.getenv("SEGMENT_SESSIONS", "true").lower() != "false"
+)
 
 
 def download_fastsam_model():
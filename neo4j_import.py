@@ -1,108 +1,720 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
+"""
+知识图谱导入脚本 - 将 症状.json（每行一条疾病记录）导入 Neo4j
 
+导入模式：
+- bulk（默认）：先创建 name 唯一性约束，逐行读取文件，按标签/关系类型分批执行 UNWIND MERGE，每批一个显式事务
+- merge：逐个节点、逐个关系执行 MERGE（原始实现，速度慢，仅用于对照）
+- parallel：流水线并行导入（读取、转换、多个写入线程），关系按端点分区调度，并发事务不会锁定相同节点
+- sync：增量同步，按每条疾病记录的内容哈希找出变化的记录，只写入变化部分并删除源数据中已去掉的关系
+- csv：导出 neo4j-admin database import 所需的 CSV 文件（离线全量重建，不连接数据库）
+"""
+import argparse
+import csv
+import hashlib
 import json
+import os
+import queue
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Tuple
+
 from dotenv import load_dotenv
 from py2neo import Graph, Node, Relationship
-import os
+from py2neo.errors import TransientError
+from rich.progress import BarColumn, Progress, TextColumn, TimeElapsedColumn
+
+from answer_cache import GRAPH_VERSION_UPDATE
+from neo4j_pool import CONNECTION_ERRORS, Neo4jConnectionPool
 
 # 配置Neo4j连接
 load_dotenv()
 NEO4J_URI = os.getenv("NEO4J_URI", "bolt://localhost:7687")
 NEO4J_USER = os.getenv("NEO4J_USER", "neo4j")
 NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD")
-if not NEO4J_PASSWORD:
-    raise EnvironmentError("请设置 NEO4J_PASSWORD 环境变量（参考 .env.example）")
-
-# 连接Neo4j
-graph = Graph(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
-
-# 读取JSON数据
-with open("症状.json", "r", encoding="utf-8") as f:
-    data = [json.loads(line) for line in f if line.strip()]
-
-
-def merge_node(label, name, **properties):
-    node = Node(label, name=name, **properties)
-    graph.merge(node, label, "name")
-    return node
-
-
-def create_relation(start_node, rel_type, end_node):
-    rel = Relationship(start_node, rel_type, end_node)
-    graph.merge(rel)
-
-
-for item in data:
-    # 疾病节点
-    disease_name = item.get("name")
-    disease_props = {
-        "desc": item.get("desc", ""),
-        "prevent": item.get("prevent", ""),
-        "cause": item.get("cause", ""),
-        "get_prob": item.get("get_prob", ""),
-        "easy_get": item.get("easy_get", ""),
-        "get_way": item.get("get_way", ""),
-        "cure_lasttime": item.get("cure_lasttime", ""),
-        "cured_prob": item.get("cured_prob", ""),
-        "cost_money": item.get("cost_money", ""),
-        "yibao_status": item.get("yibao_status", "")
+
+# 疾病节点的属性字段
+DISEASE_PROPERTIES = ["desc", "prevent", "cause", "get_prob", "easy_get", "get_way",
+                      "cure_lasttime", "cured_prob", "cost_money", "yibao_status"]
+
+# 记录中的列表字段 -> (目标节点标签, 关系类型)，关系均从疾病节点出发
+RELATION_FIELDS = [
+    ("category", "Category", "BELONGS_TO"),  # 分类
+    ("symptom", "Symptom", "HAS_SYMPTOM"),  # 症状
+    ("acompany", "Disease", "ACCOMPANIES"),  # 并发症
+    ("cure_department", "Department", "TREATED_BY"),  # 科室
+    ("cure_way", "Treatment", "USES_TREATMENT"),  # 治疗方法
+    ("check", "Check", "REQUIRES_CHECK"),  # 检查项目
+    ("recommand_drug", "Drug", "RECOMMENDS_DRUG"),  # 推荐药物
+    ("common_drug", "Drug", "COMMONLY_USES_DRUG"),  # 常用药物
+    ("do_eat", "Food", "SHOULD_EAT"),  # 宜吃食物
+    ("not_eat", "Food", "SHOULD_NOT_EAT"),  # 不宜吃食物
+    ("recommand_eat", "Recipe", "RECOMMENDS_RECIPE"),  # 推荐食谱
+]
+
+# 所有节点标签（疾病在前）
+NODE_LABELS = ["Disease"] + sorted({label for _, label, _ in RELATION_FIELDS if label != "Disease"})
+
+
+def connect() -> Graph:
+    """连接Neo4j"""
+    if not NEO4J_PASSWORD:
+        raise EnvironmentError("请设置 NEO4J_PASSWORD 环境变量（参考 .env.example）")
+    return Graph(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+
+
+def iter_records(path: str) -> Iterator[Dict]:
+    """逐行读取JSON记录（跳过空行和没有名称的记录）"""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            if item.get("name"):
+                yield item
+
+
+def disease_properties(item: Dict) -> Dict:
+    """疾病节点的属性"""
+    return {key: item.get(key, "") for key in DISEASE_PROPERTIES}
+
+
+def iter_relations(item: Dict) -> Iterator[tuple]:
+    """逐个产生记录中的关系 (目标标签, 关系类型, 目标名称)"""
+    for field, label, rel_type in RELATION_FIELDS:
+        for target in item.get(field) or []:
+            if target:
+                yield label, rel_type, target
+
+
+def content_hash(item: Dict) -> str:
+    """疾病记录的内容哈希（属性 + 去重排序后的关系），列表顺序和重复项不影响哈希"""
+    content = {
+        "props": disease_properties(item),
+        "relations": sorted({(rel_type, target) for _, rel_type, target in iter_relations(item)})
     }
-    disease_node = merge_node("Disease", disease_name, **disease_props)
-
-    # 分类节点
-    for cat in item.get("category", []):
-        cat_node = merge_node("Category", cat)
-        create_relation(disease_node, "BELONGS_TO", cat_node)
-
-    # 症状节点
-    for sym in item.get("symptom", []):
-        sym_node = merge_node("Symptom", sym)
-        create_relation(disease_node, "HAS_SYMPTOM", sym_node)
-
-    # 并发症
-    for acomp in item.get("acompany", []):
-        acomp_node = merge_node("Disease", acomp)
-        create_relation(disease_node, "ACCOMPANIES", acomp_node)
-
-    # 科室
-    for dept in item.get("cure_department", []):
-        dept_node = merge_node("Department", dept)
-        create_relation(disease_node, "TREATED_BY", dept_node)
-
-    # 治疗方法
-    for treat in item.get("cure_way", []):
-        treat_node = merge_node("Treatment", treat)
-        create_relation(disease_node, "USES_TREATMENT", treat_node)
-
-    # 检查项目
-    for check in item.get("check", []):
-        check_node = merge_node("Check", check)
-        create_relation(disease_node, "REQUIRES_CHECK", check_node)
-
-    # 推荐药物
-    for drug in item.get("recommand_drug", []):
-        drug_node = merge_node("Drug", drug)
-        create_relation(disease_node, "RECOMMENDS_DRUG", drug_node)
-
-    # 常用药物
-    for drug in item.get("common_drug", []):
-        drug_node = merge_node("Drug", drug)
-        create_relation(disease_node, "COMMONLY_USES_DRUG", drug_node)
-
-    # 宜吃食物
-    for food in item.get("do_eat", []):
-        food_node = merge_node("Food", food)
-        create_relation(disease_node, "SHOULD_EAT", food_node)
-
-    # 不宜吃食物
-    for food in item.get("not_eat", []):
-        food_node = merge_node("Food", food)
-        create_relation(disease_node, "SHOULD_NOT_EAT", food_node)
-
-    # 推荐食谱
-    for recipe in item.get("recommand_eat", []):
-        recipe_node = merge_node("Recipe", recipe)
-        create_relation(disease_node, "RECOMMENDS_RECIPE", recipe_node)
-
-print("导入完成！")
+    return hashlib.sha1(json.dumps(content, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def iter_batches(rows: List, batch_size: int) -> Iterator[List]:
+    """按批大小切分"""
+    for start in range(0, len(rows), batch_size):
+        yield rows[start:start + batch_size]
+
+
+def update_graph_version(graph: Graph):
+    """更新图谱版本号，问答服务据此使答案缓存失效、更新实体词典"""
+    graph.run(GRAPH_VERSION_UPDATE)
+
+
+# ---------- merge 模式（逐条 MERGE） ----------
+
+def merge_import(graph: Graph, path: str) -> Dict:
+    """逐个节点、逐个关系执行 MERGE"""
+    def merge_node(label, name, **properties):
+        node = Node(label, name=name, **properties)
+        graph.merge(node, label, "name")
+        return node
+
+    records = relationships = 0
+    for item in iter_records(path):
+        disease_node = merge_node("Disease", item["name"], **disease_properties(item))
+        for label, rel_type, target in iter_relations(item):
+            graph.merge(Relationship(disease_node, rel_type, merge_node(label, target)))
+            relationships += 1
+        records += 1
+    return {"records": records, "relationships": relationships}
+
+
+# ---------- bulk 模式（约束 + UNWIND 分批） ----------
+
+def create_constraints(graph: Graph):
+    """为每个标签的 name 创建唯一性约束（同时创建索引，MERGE 不再全标签扫描）"""
+    for label in NODE_LABELS:
+        graph.run(f"CREATE CONSTRAINT {label.lower()}_name_unique IF NOT EXISTS "
+                  f"FOR (n:{label}) REQUIRE n.name IS UNIQUE")
+    graph.run("CREATE CONSTRAINT graphmeta_key_unique IF NOT EXISTS FOR (m:GraphMeta) REQUIRE m.key IS UNIQUE")
+
+
+class BulkImporter:
+    """批量导入类
+
+    每读取 chunk_size 条记录，先按标签写入节点，再按关系类型写入关系；
+    每条 UNWIND 语句最多 batch_size 行，在一个显式事务中执行。
+    疾病节点同时写入 content_hash 属性，供增量同步比较。
+    """
+
+    DISEASE_QUERY = "UNWIND $rows AS row MERGE (n:Disease {name: row.name}) SET n += row.props"
+    NODE_QUERY = "UNWIND $rows AS name MERGE (n:`{label}` {{name: name}})"
+    RELATION_QUERY = ("UNWIND $rows AS row "
+                      "MATCH (s:Disease {{name: row.source}}) "
+                      "MATCH (t:`{label}` {{name: row.target}}) "
+                      "MERGE (s)-[:`{rel_type}`]->(t)")
+
+    def __init__(self, graph: Graph, batch_size: int = 5000, chunk_size: int = 1000):
+        """
+        初始化批量导入器
+        Args:
+            graph: Neo4j连接
+            batch_size: 每条 UNWIND 语句（每个事务）的最大行数
+            chunk_size: 每次读取并写入的记录条数
+        """
+        self.graph = graph
+        self.batch_size = batch_size
+        self.chunk_size = chunk_size
+        self.stats = {"records": 0, "node_rows": 0, "relationship_rows": 0, "transactions": 0}
+
+    def _write(self, query: str, rows: List) -> int:
+        """分批在显式事务中执行 UNWIND 语句，返回各批语句返回值（如有）之和"""
+        total = 0
+        for batch in iter_batches(rows, self.batch_size):
+            tx = self.graph.begin()
+            try:
+                total += tx.evaluate(query, rows=batch) or 0
+                self.graph.commit(tx)
+            except Exception:
+                self.graph.rollback(tx)
+                raise
+            self.stats["transactions"] += 1
+        return total
+
+    def write_chunk(self, items: List[Dict]):
+        """写入一批记录：疾病节点 -> 其他节点（按标签） -> 关系（按类型）"""
+        diseases = {}
+        nodes = {label: set() for label in NODE_LABELS}
+        relations = {}
+        for item in items:
+            diseases[item["name"]] = {"name": item["name"],
+                                      "props": dict(disease_properties(item), content_hash=content_hash(item))}
+            for label, rel_type, target in iter_relations(item):
+                nodes[label].add(target)
+                relations.setdefault((label, rel_type), set()).add((item["name"], target))
+        # 并发症指向的疾病节点只需存在，不覆盖属性
+        nodes["Disease"] -= diseases.keys()
+
+        self._write(self.DISEASE_QUERY, list(diseases.values()))
+        self.stats["node_rows"] += len(diseases)
+        for label, names in nodes.items():
+            if names:
+                self._write(self.NODE_QUERY.format(label=label), sorted(names))
+                self.stats["node_rows"] += len(names)
+        for (label, rel_type), pairs in relations.items():
+            rows = [{"source": source, "target": target} for source, target in sorted(pairs)]
+            self._write(self.RELATION_QUERY.format(label=label, rel_type=rel_type), rows)
+            self.stats["relationship_rows"] += len(rows)
+        self.stats["records"] += len(items)
+
+    def run(self, records: Iterable[Dict]) -> Dict:
+        """导入全部记录，返回统计信息"""
+        start = time.perf_counter()
+        chunk = []
+        for item in records:
+            chunk.append(item)
+            if len(chunk) >= self.chunk_size:
+                self.write_chunk(chunk)
+                chunk = []
+                elapsed = time.perf_counter() - start
+                print(f"已导入 {self.stats['records']} 条记录 ({self.stats['records'] / elapsed:.0f} 条/秒)")
+        if chunk:
+            self.write_chunk(chunk)
+        self.stats["seconds"] = time.perf_counter() - start
+        return self.stats
+
+
+# ---------- parallel 模式（流水线并行导入） ----------
+
+class ParallelImporter(BulkImporter):
+    """流水线并行导入类
+
+    读取线程按块解析 JSONL（记下每块占用的文件字节数，该块写入完成后才推进进度条），转换线程把每块记录
+    整理为节点行和按关系类型、端点分区的关系行，主线程把写入任务分发给 workers 个写入线程（各自从连接池借用连接）。
+    写入出错时通知读取、转换线程停止，不会阻塞在有界队列上。
+    块与块之间依次写入：节点（互不重复，全部并发）-> 关系（分轮并发）-> 疾病之间的并发症关系（单线程）。
+
+    关系的起点（疾病）和终点按名称哈希分到 workers 个桶，分区 (i, j) 包含起点在桶 i、终点在桶 j 的关系；
+    第 r 轮并发执行分区 (i, (i + r) % workers)，同一轮内任意两个分区的起点桶、终点桶都不相同，
+    因此并发事务不会锁定同一个节点，避免死锁。ACCOMPANIES 的两端都是疾病节点，无法这样分区，最后单独执行。
+    """
+
+    MAX_RETRIES = 3
+    # 只重试瞬时错误（死锁、锁等待超时等 TransientError）和连接层面的错误；语法、约束等错误直接抛出
+    RETRYABLE_ERRORS = (TransientError,) + CONNECTION_ERRORS
+
+    def __init__(self, pool: Neo4jConnectionPool, workers: int = 4, batch_size: int = 5000, chunk_size: int = 1000):
+        """
+        初始化并行导入器
+        Args:
+            pool: Neo4j连接池（大小不小于 workers）
+            workers: 写入线程数（也是关系分区的桶数）
+        """
+        super().__init__(None, batch_size=batch_size, chunk_size=chunk_size)
+        self.pool = pool
+        self.workers = workers
+        self._stats_lock = threading.Lock()
+
+    def _bucket(self, name: str) -> int:
+        """按名称哈希分桶（进程间稳定）"""
+        return zlib.crc32(name.encode("utf-8")) % self.workers
+
+    def _write(self, query: str, rows: List) -> int:
+        """在一个借出的连接上分批执行 UNWIND 语句，瞬时错误（如死锁、锁等待超时、连接中断）时重试"""
+        total = 0
+        for batch in iter_batches(rows, self.batch_size):
+            for attempt in range(self.MAX_RETRIES):
+                try:
+                    with self.pool.acquire() as graph:
+                        tx = graph.begin()
+                        try:
+                            total += tx.evaluate(query, rows=batch) or 0
+                            graph.commit(tx)
+                        except Exception:
+                            graph.rollback(tx)
+                            raise
+                    break
+                except self.RETRYABLE_ERRORS:
+                    if attempt == self.MAX_RETRIES - 1:
+                        raise
+                    time.sleep(0.5 * (2 ** attempt))
+            with self._stats_lock:
+                self.stats["transactions"] += 1
+        return total
+
+    def transform(self, items: List[Dict]) -> Dict:
+        """把一块记录整理为写入任务：节点行、分区后的关系行和并发症关系行"""
+        diseases = {}
+        nodes = {label: set() for label in NODE_LABELS}
+        partitions = {}
+        accompanies = set()
+        for item in items:
+            diseases[item["name"]] = {"name": item["name"],
+                                      "props": dict(disease_properties(item), content_hash=content_hash(item))}
+            source_bucket = self._bucket(item["name"])
+            for label, rel_type, target in iter_relations(item):
+                nodes[label].add(target)
+                if rel_type == "ACCOMPANIES":
+                    accompanies.add((item["name"], target))
+                    continue
+                partition = partitions.setdefault((source_bucket, self._bucket(target)), {})
+                partition.setdefault((label, rel_type), set()).add((item["name"], target))
+        nodes["Disease"] -= diseases.keys()
+        return {"records": len(items), "diseases": list(diseases.values()),
+                "nodes": {label: sorted(names) for label, names in nodes.items() if names},
+                "partitions": partitions, "accompanies": sorted(accompanies)}
+
+    def _write_partition(self, partition: Dict) -> int:
+        """依次写入一个分区内各关系类型的关系，返回写入行数"""
+        written = 0
+        for (label, rel_type), pairs in partition.items():
+            rows = [{"source": source, "target": target} for source, target in sorted(pairs)]
+            self._write(self.RELATION_QUERY.format(label=label, rel_type=rel_type), rows)
+            written += len(rows)
+        return written
+
+    def write_task(self, executor: ThreadPoolExecutor, task: Dict) -> int:
+        """写入一块记录，返回写入的行数"""
+        # 1. 节点：各批节点互不重复，全部并发写入
+        node_jobs = [executor.submit(self._write, self.DISEASE_QUERY, batch)
+                     for batch in iter_batches(task["diseases"], self.batch_size)]
+        for label, names in task["nodes"].items():
+            node_jobs += [executor.submit(self._write, self.NODE_QUERY.format(label=label), batch)
+                          for batch in iter_batches(names, self.batch_size)]
+        for job in node_jobs:
+            job.result()
+        node_rows = len(task["diseases"]) + sum(len(names) for names in task["nodes"].values())
+        # 2. 关系：第 r 轮执行分区 (i, (i + r) % workers)，同轮分区之间没有共同的节点
+        relationship_rows = 0
+        for round_index in range(self.workers):
+            jobs = [executor.submit(self._write_partition, task["partitions"][key])
+                    for key in ((i, (i + round_index) % self.workers) for i in range(self.workers))
+                    if key in task["partitions"]]
+            relationship_rows += sum(job.result() for job in jobs)
+        # 3. 并发症关系：两端都是疾病节点，单线程写入
+        if task["accompanies"]:
+            self._write(self.RELATION_QUERY.format(label="Disease", rel_type="ACCOMPANIES"),
+                        [{"source": source, "target": target} for source, target in task["accompanies"]])
+            relationship_rows += len(task["accompanies"])
+        with self._stats_lock:
+            self.stats["records"] += task["records"]
+            self.stats["node_rows"] += node_rows
+            self.stats["relationship_rows"] += relationship_rows
+        return node_rows + relationship_rows
+
+    @staticmethod
+    def _put(out: queue.Queue, item, stop: threading.Event) -> bool:
+        """放入有界队列，队列满时等待；收到停止信号时放弃并返回 False"""
+        while not stop.is_set():
+            try:
+                out.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    @staticmethod
+    def _get(source: queue.Queue, stop: threading.Event):
+        """从队列取出一项；收到停止信号时返回 None"""
+        while not stop.is_set():
+            try:
+                return source.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return None
+
+    def _read(self, path: str, out: queue.Queue, stop: threading.Event):
+        """读取线程：按块解析 JSONL，每块附带其占用的文件字节数"""
+        try:
+            chunk, size = [], 0
+            with open(path, "rb") as f:
+                for line in f:
+                    size += len(line)
+                    if not line.strip():
+                        continue
+                    item = json.loads(line)
+                    if not item.get("name"):
+                        continue
+                    chunk.append(item)
+                    if len(chunk) >= self.chunk_size:
+                        if not self._put(out, (chunk, size), stop):
+                            return
+                        chunk, size = [], 0
+            if chunk or size:
+                self._put(out, (chunk, size), stop)
+        except Exception as e:
+            self._put(out, e, stop)
+        finally:
+            self._put(out, None, stop)
+
+    def _transform(self, source: queue.Queue, out: queue.Queue, stop: threading.Event):
+        """转换线程：把读取到的记录块整理为写入任务"""
+        while True:
+            chunk = self._get(source, stop)
+            if chunk is None or isinstance(chunk, Exception):
+                if chunk is not None:
+                    self._put(out, chunk, stop)
+                self._put(out, None, stop)
+                return
+            items, size = chunk
+            task = self.transform(items)
+            task["bytes"] = size
+            if not self._put(out, task, stop):
+                return
+
+    def run_file(self, path: str) -> Dict:
+        """流水线导入整个文件，返回统计信息"""
+        start = time.perf_counter()
+        chunks = queue.Queue(maxsize=4)
+        tasks = queue.Queue(maxsize=4)
+        progress = Progress(TextColumn("[bold blue]导入中"), BarColumn(), TextColumn("{task.percentage:>5.1f}%"),
+                            TextColumn("{task.fields[records]} 条记录"), TextColumn("{task.fields[rows_per_second]} 行/秒"),
+                            TimeElapsedColumn())
+        stop = threading.Event()
+        threads = [threading.Thread(target=self._read, args=(path, chunks, stop), daemon=True),
+                   threading.Thread(target=self._transform, args=(chunks, tasks, stop), daemon=True)]
+        with progress, ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="import-writer") as executor:
+            progress_task = progress.add_task("import", total=os.path.getsize(path), records=0, rows_per_second=0)
+            for thread in threads:
+                thread.start()
+            rows = 0
+            try:
+                while True:
+                    task = tasks.get()
+                    if task is None:
+                        break
+                    if isinstance(task, Exception):
+                        raise task
+                    rows += self.write_task(executor, task)
+                    # 进度按已写入的块推进，而不是按读取线程读到的位置
+                    progress.update(progress_task, advance=task["bytes"], records=self.stats["records"],
+                                    rows_per_second=f"{rows / (time.perf_counter() - start):.0f}")
+            finally:
+                # 写入出错（或正常结束）时通知读取、转换线程停止，它们不会阻塞在已满的队列上
+                stop.set()
+                for thread in threads:
+                    thread.join()
+        self.stats["seconds"] = time.perf_counter() - start
+        return self.stats
+
+
+# ---------- sync 模式（按内容哈希增量同步） ----------
+
+class IncrementalSync(BulkImporter):
+    """增量同步类
+
+    先读取图谱中每个疾病节点的 content_hash，再逐行比较源数据：哈希相同的记录跳过，
+    新增或变化的记录按 bulk 模式写入节点和关系，并删除该疾病在源数据中已去掉的关系。
+    """
+
+    HASHES_QUERY = "MATCH (d:Disease) WHERE d.content_hash IS NOT NULL RETURN d.name AS name, d.content_hash AS hash"
+    PRUNE_QUERY = ("UNWIND $rows AS row "
+                   "MATCH (s:Disease {{name: row.source}})-[r:`{rel_type}`]->(t:`{label}`) "
+                   "WHERE NOT t.name IN row.targets "
+                   "DELETE r RETURN count(r)")
+    REMOVE_QUERY = "UNWIND $rows AS name MATCH (d:Disease {name: name}) DETACH DELETE d RETURN count(*)"
+
+    def __init__(self, graph: Graph, batch_size: int = 5000, chunk_size: int = 1000, prune_missing: bool = False):
+        """
+        Args:
+            prune_missing: 是否删除源数据中已不存在的疾病节点（DETACH DELETE）
+        """
+        super().__init__(graph, batch_size=batch_size, chunk_size=chunk_size)
+        self.prune_missing = prune_missing
+        self.stats.update({"unchanged": 0, "changed": 0, "new": 0, "relationships_deleted": 0, "diseases_removed": 0})
+
+    def write_chunk(self, items: List[Dict]):
+        """写入变化的记录，并删除这些疾病在源数据中已去掉的关系"""
+        super().write_chunk(items)
+        for field, label, rel_type in RELATION_FIELDS:
+            rows = [{"source": item["name"], "targets": [t for t in item.get(field) or [] if t]} for item in items]
+            self.stats["relationships_deleted"] += self._write(
+                self.PRUNE_QUERY.format(label=label, rel_type=rel_type), rows)
+
+    def run(self, records: Iterable[Dict]) -> Dict:
+        """比较内容哈希，只同步新增和变化的记录"""
+        stored = {record["name"]: record["hash"] for record in self.graph.run(self.HASHES_QUERY).data()}
+        print(f"图谱中已有 {len(stored)} 条带内容哈希的疾病记录")
+        seen = set()
+
+        def changed_records():
+            for item in records:
+                seen.add(item["name"])
+                previous = stored.get(item["name"])
+                if previous == content_hash(item):
+                    self.stats["unchanged"] += 1
+                    continue
+                self.stats["new" if previous is None else "changed"] += 1
+                yield item
+
+        stats = super().run(changed_records())
+        if self.prune_missing:
+            missing = sorted(set(stored) - seen)
+            if missing:
+                self.stats["diseases_removed"] = self._write(self.REMOVE_QUERY, missing)
+        return stats
+
+    @property
+    def has_changes(self) -> bool:
+        """本次同步是否修改了图谱"""
+        return bool(self.stats["records"] or self.stats["diseases_removed"])
+
+
+# ---------- csv 模式（neo4j-admin 离线导入） ----------
+
+class AdminCsvExporter:
+    """neo4j-admin 导入文件导出类
+
+    每个标签、每种关系类型各写一个表头文件和一个数据文件，边读边写；
+    节点按标签在内存中去重并分配稳定的整数ID（按首次出现的顺序），ID空间按标签区分。
+    并发症指向的疾病若没有对应的疾病记录，在最后以只有名称的节点写出。
+    """
+
+    def __init__(self, output_dir: str):
+        """
+        初始化导出器
+        Args:
+            output_dir: CSV 文件输出目录
+        """
+        self.output_dir = output_dir
+        self.ids = {label: {} for label in NODE_LABELS}
+        self.disease_written = set()
+        self.stats = {"records": 0, "duplicate_records": 0, "nodes": 0, "relationships": 0}
+        self._files = []
+        self._node_writers = {}
+        self._relation_writers = {}
+        self._counts = {}
+
+    def _open(self, name: str, header: List[str]):
+        """创建表头文件和数据文件，返回数据文件的 csv writer"""
+        with open(os.path.join(self.output_dir, f"{name}_header.csv"), "w", encoding="utf-8", newline="") as f:
+            csv.writer(f).writerow(header)
+        data_file = open(os.path.join(self.output_dir, f"{name}.csv"), "w", encoding="utf-8", newline="")
+        self._files.append(data_file)
+        self._counts[name] = 0
+        return csv.writer(data_file)
+
+    def _node_id(self, label: str, name: str) -> Tuple[int, bool]:
+        """获取节点ID，返回 (ID, 是否新分配)"""
+        ids = self.ids[label]
+        if name in ids:
+            return ids[name], False
+        ids[name] = len(ids)
+        return ids[name], True
+
+    def _write_node(self, label: str, row: List):
+        self._node_writers[label].writerow(row)
+        self._counts[f"nodes_{label}"] += 1
+        self.stats["nodes"] += 1
+
+    def run(self, records: Iterable[Dict]) -> Dict:
+        """导出全部记录，返回统计信息"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        for label in NODE_LABELS:
+            header = [f":ID({label})", "name"] + (DISEASE_PROPERTIES + ["content_hash"] if label == "Disease" else [])
+            self._node_writers[label] = self._open(f"nodes_{label}", header)
+        for _, label, rel_type in RELATION_FIELDS:
+            self._relation_writers[rel_type] = self._open(
+                f"relationships_{rel_type}", [":START_ID(Disease)", f":END_ID({label})"])
+        try:
+            for item in records:
+                self._export_record(item)
+            # 没有疾病记录的并发症节点
+            for name, node_id in self.ids["Disease"].items():
+                if name not in self.disease_written:
+                    self._write_node("Disease", [node_id, name] + [""] * (len(DISEASE_PROPERTIES) + 1))
+        finally:
+            for data_file in self._files:
+                data_file.close()
+        with open(os.path.join(self.output_dir, "manifest.json"), "w", encoding="utf-8") as f:
+            json.dump({"node_labels": NODE_LABELS,
+                       "relationship_types": {rel_type: label for _, label, rel_type in RELATION_FIELDS},
+                       "counts": self._counts}, f, ensure_ascii=False, indent=2)
+        return self.stats
+
+    def _export_record(self, item: Dict):
+        name = item["name"]
+        if name in self.disease_written:
+            self.stats["duplicate_records"] += 1
+            return
+        disease_id, _ = self._node_id("Disease", name)
+        props = disease_properties(item)
+        self._write_node("Disease", [disease_id, name] + [props[key] for key in DISEASE_PROPERTIES] + [content_hash(item)])
+        self.disease_written.add(name)
+        written = set()
+        for label, rel_type, target in iter_relations(item):
+            target_id, created = self._node_id(label, target)
+            if created and label != "Disease":
+                self._write_node(label, [target_id, target])
+            if (rel_type, target_id) in written:
+                continue
+            written.add((rel_type, target_id))
+            self._relation_writers[rel_type].writerow([disease_id, target_id])
+            self._counts[f"relationships_{rel_type}"] += 1
+            self.stats["relationships"] += 1
+        self.stats["records"] += 1
+
+    def command(self, database: str = "neo4j") -> str:
+        """生成 neo4j-admin 导入命令"""
+        def files(name):
+            return f"{os.path.join(self.output_dir, name + '_header.csv')},{os.path.join(self.output_dir, name + '.csv')}"
+        parts = ["neo4j-admin database import full", "--multiline-fields=true", "--overwrite-destination=true"]
+        parts += [f"--nodes={label}={files('nodes_' + label)}" for label in NODE_LABELS]
+        parts += [f"--relationships={rel_type}={files('relationships_' + rel_type)}"
+                  for _, _, rel_type in RELATION_FIELDS]
+        parts.append(database)
+        return " \\\n  ".join(parts)
+
+
+def validate_admin_csv(output_dir: str) -> List[str]:
+    """
+    校验导出的 CSV 文件：表头格式、列数、节点ID唯一、关系两端节点存在、行数与 manifest 一致
+    Returns:
+        list: 错误信息列表，为空表示校验通过
+    """
+    errors = []
+    with open(os.path.join(output_dir, "manifest.json"), encoding="utf-8") as f:
+        manifest = json.load(f)
+
+    def read(name):
+        with open(os.path.join(output_dir, f"{name}_header.csv"), encoding="utf-8", newline="") as f:
+            header = next(csv.reader(f))
+        with open(os.path.join(output_dir, f"{name}.csv"), encoding="utf-8", newline="") as f:
+            rows = list(csv.reader(f))
+        if len(rows) != manifest["counts"].get(name):
+            errors.append(f"{name}: 行数 {len(rows)} 与 manifest 记录的 {manifest['counts'].get(name)} 不一致")
+        for line_no, row in enumerate(rows, 1):
+            if len(row) != len(header):
+                errors.append(f"{name}.csv 第 {line_no} 行: 列数 {len(row)} 与表头 {len(header)} 不一致")
+        return header, rows
+
+    ids = {}
+    for label in manifest["node_labels"]:
+        header, rows = read(f"nodes_{label}")
+        if header[:2] != [f":ID({label})", "name"]:
+            errors.append(f"nodes_{label}: 表头应以 :ID({label}),name 开头，实际为 {header[:2]}")
+        label_ids = [row[0] for row in rows]
+        if len(set(label_ids)) != len(label_ids):
+            errors.append(f"nodes_{label}: 存在重复的节点ID")
+        names = [row[1] for row in rows]
+        if len(set(names)) != len(names):
+            errors.append(f"nodes_{label}: 存在重复的节点名称")
+        ids[label] = set(label_ids)
+    for rel_type, label in manifest["relationship_types"].items():
+        header, rows = read(f"relationships_{rel_type}")
+        if header != [":START_ID(Disease)", f":END_ID({label})"]:
+            errors.append(f"relationships_{rel_type}: 表头不正确 {header}")
+        for line_no, row in enumerate(rows, 1):
+            if row[0] not in ids.get("Disease", ()):
+                errors.append(f"relationships_{rel_type}.csv 第 {line_no} 行: 起点ID {row[0]} 不存在")
+            if row[1] not in ids.get(label, ()):
+                errors.append(f"relationships_{rel_type}.csv 第 {line_no} 行: 终点ID {row[1]} 不存在")
+    return errors
+
+
+def print_stats(stats: Dict, seconds: float):
+    """输出导入耗时和吞吐量"""
+    print(f"导入完成！用时 {seconds:.2f} 秒")
+    for key, value in stats.items():
+        if key != "seconds":
+            rate = f" ({value / seconds:.0f}/秒)" if seconds > 0 and key != "transactions" else ""
+            print(f"  {key}: {value}{rate}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="将疾病JSON数据导入Neo4j知识图谱")
+    parser.add_argument("--file", type=str, default="症状.json", help="每行一条疾病记录的JSON文件")
+    parser.add_argument("--mode", type=str, default="bulk", choices=["bulk", "parallel", "sync", "merge", "csv"],
+                        help="导入模式：bulk 约束 + UNWIND 分批导入，parallel 流水线多线程导入，sync 按内容哈希增量同步，"
+                             "merge 逐条 MERGE（原始实现），csv 导出 neo4j-admin 离线导入文件")
+    parser.add_argument("--batch_size", type=int, default=5000, help="bulk / parallel / sync 模式下每条 UNWIND 语句（每个事务）的最大行数")
+    parser.add_argument("--chunk_size", type=int, default=1000, help="bulk / parallel / sync 模式下每次读取并写入的记录条数")
+    parser.add_argument("--workers", type=int, default=4, help="parallel 模式下的写入线程数")
+    parser.add_argument("--output_dir", type=str, default="./import", help="csv 模式下的输出目录")
+    parser.add_argument("--prune_missing", action="store_true",
+                        help="sync 模式下删除源数据中已不存在的疾病节点")
+    args = parser.parse_args()
+
+    if args.mode == "csv":
+        start = time.perf_counter()
+        exporter = AdminCsvExporter(args.output_dir)
+        stats = exporter.run(iter_records(args.file))
+        print_stats(stats, time.perf_counter() - start)
+        errors = validate_admin_csv(args.output_dir)
+        if errors:
+            print(f"CSV 校验失败（{len(errors)} 个错误）：")
+            for error in errors[:20]:
+                print(f"  {error}")
+            raise SystemExit(1)
+        print("CSV 校验通过。停止 Neo4j 后执行以下命令导入（导入后运行一次 sync 模式以创建约束）：")
+        print(exporter.command())
+        return
+
+    graph = connect()
+    start = time.perf_counter()
+    if args.mode == "merge":
+        stats = merge_import(graph, args.file)
+    elif args.mode == "parallel":
+        create_constraints(graph)
+        pool = Neo4jConnectionPool(NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD, max_size=args.workers)
+        stats = ParallelImporter(pool, workers=args.workers, batch_size=args.batch_size,
+                                 chunk_size=args.chunk_size).run_file(args.file)
+    elif args.mode == "sync":
+        create_constraints(graph)
+        syncer = IncrementalSync(graph, batch_size=args.batch_size, chunk_size=args.chunk_size,
+                                 prune_missing=args.prune_missing)
+        stats = syncer.run(iter_records(args.file))
+        if not syncer.has_changes:
+            # 没有变化时不更新图谱版本号，问答服务的缓存保持有效
+            print_stats(stats, time.perf_counter() - start)
+            return
+    else:
+        create_constraints(graph)
+        stats = BulkImporter(graph, batch_size=args.batch_size, chunk_size=args.chunk_size).run(
+            iter_records(args.file))
+    update_graph_version(graph)
+    print_stats(stats, time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    main()
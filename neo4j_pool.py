@@ -0,0 +1,167 @@
+"""
+Neo4j连接池模块 - 供多个请求线程共享的有界py2neo连接池
+"""
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List
+
+from py2neo import Graph
+from py2neo.errors import ConnectionBroken, ConnectionUnavailable, ProtocolError, ServiceUnavailable
+
+# 连接层面的错误（连接中断、服务不可用、协议错误、套接字错误）：出错的连接不再放回连接池
+CONNECTION_ERRORS = (ConnectionBroken, ConnectionUnavailable, ServiceUnavailable, ProtocolError, OSError)
+
+
+class PoolTimeoutError(Exception):
+    """在超时时间内未能从连接池获取连接"""
+
+
+class Neo4jConnectionPool:
+    """Neo4j连接池类
+
+    连接按需创建，最多 max_size 个；空闲连接放回队列复用。
+    借出期间出现连接层面的错误（CONNECTION_ERRORS）时关闭并丢弃该连接，空出的名额在下次借出时重新创建连接。
+    所有计数器在锁内更新，可通过 metrics() 查看连接池使用情况。
+    """
+
+    def __init__(self, uri: str, user: str, password: str, max_size: int = 8, acquire_timeout: float = 30.0):
+        """
+        初始化连接池
+        Args:
+            uri: Neo4j数据库URI
+            user: 用户名
+            password: 密码
+            max_size: 最大连接数
+            acquire_timeout: 获取连接的默认超时时间（秒）
+        """
+        self.uri = uri
+        self.auth = (user, password)
+        self.max_size = max_size
+        self.acquire_timeout = acquire_timeout
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._in_use = 0
+        self._peak_in_use = 0
+        self._acquisitions = 0
+        self._waits = 0
+        self._timeouts = 0
+        self._errors = 0
+        self._discarded = 0
+        self._total_wait = 0.0
+
+    def _create_graph(self) -> Graph:
+        """创建新的连接"""
+        return Graph(self.uri, auth=self.auth)
+
+    @staticmethod
+    def _close_graph(graph: Graph):
+        """关闭连接（出错的连接可能已经断开，关闭失败时忽略）"""
+        try:
+            graph.service.connector.close()
+        except Exception:
+            pass
+
+    @contextmanager
+    def acquire(self, timeout: float = None):
+        """
+        从连接池借出一个连接，使用完毕后自动归还
+        Args:
+            timeout: 等待空闲连接的超时时间（秒），默认使用 acquire_timeout
+        """
+        timeout = self.acquire_timeout if timeout is None else timeout
+        start = time.perf_counter()
+        graph = None
+        create = False
+        try:
+            graph = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                if self._created < self.max_size:
+                    self._created += 1
+                    create = True
+            if create:
+                try:
+                    graph = self._create_graph()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                        self._errors += 1
+                    raise
+            else:
+                with self._lock:
+                    self._waits += 1
+                try:
+                    graph = self._idle.get(timeout=timeout)
+                except queue.Empty:
+                    with self._lock:
+                        self._timeouts += 1
+                    raise PoolTimeoutError(f"等待Neo4j连接超时（{timeout}秒，连接池大小 {self.max_size}）")
+        if graph is None:
+            # 被丢弃的连接留下的名额：重新创建连接，失败时把名额放回
+            try:
+                graph = self._create_graph()
+            except Exception:
+                with self._lock:
+                    self._errors += 1
+                self._idle.put(None)
+                raise
+        with self._lock:
+            self._acquisitions += 1
+            self._in_use += 1
+            self._peak_in_use = max(self._peak_in_use, self._in_use)
+            self._total_wait += time.perf_counter() - start
+        broken = False
+        try:
+            yield graph
+        except CONNECTION_ERRORS:
+            broken = True
+            raise
+        finally:
+            with self._lock:
+                self._in_use -= 1
+                if broken:
+                    self._discarded += 1
+            if broken:
+                self._close_graph(graph)
+                self._idle.put(None)
+            else:
+                self._idle.put(graph)
+
+    def run(self, query: str, **parameters) -> List[Dict]:
+        """借出一个连接执行Cypher查询，返回结果记录列表"""
+        with self.acquire() as graph:
+            try:
+                return graph.run(query, **parameters).data()
+            except Exception:
+                with self._lock:
+                    self._errors += 1
+                raise
+
+    def health_check(self) -> Dict:
+        """检查数据库连通性"""
+        start = time.perf_counter()
+        try:
+            self.run("RETURN 1")
+            return {"ok": True, "latency_ms": round((time.perf_counter() - start) * 1000, 2)}
+        except Exception as e:
+            return {"ok": False, "error": str(e)}
+
+    def metrics(self) -> Dict:
+        """获取连接池使用情况"""
+        with self._lock:
+            return {
+                "max_size": self.max_size,
+                "created": self._created,
+                "in_use": self._in_use,
+                "idle": self._created - self._in_use,
+                "peak_in_use": self._peak_in_use,
+                "acquisitions": self._acquisitions,
+                "waits": self._waits,
+                "timeouts": self._timeouts,
+                "errors": self._errors,
+                "discarded": self._discarded,
+                "avg_wait_ms": round(self._total_wait / self._acquisitions * 1000, 3) if self._acquisitions else 0.0
+            }
@@ -4,23 +4,31 @@
 import os
 import json
 import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
 import requests
-from typing import Dict, List
+from typing import Callable, Dict, List, Optional, Tuple
 from dotenv import load_dotenv
-from py2neo import Graph
-from sklearn.metrics.pairwise import cosine_similarity
 from rich.console import Console
 from rich.panel import Panel
 from rich.table import Table
 from rich.markdown import Markdown
 from collections import defaultdict
 import argparse
+from embedding_cache import EmbeddingCache, normalize_text
+from similarity import SimilarityScorer, rank_scores
+from neo4j_pool import Neo4jConnectionPool
+from answer_cache import AnswerCache, GRAPH_VERSION_QUERY
+from entity_dictionary import EntityDictionary
 
 # 阿里云通义千问API配置
 load_dotenv()
 ALI_API_KEY = os.getenv("ALI_API_KEY")
 ALI_BASE_URL = os.getenv("ALI_BASE_URL")
 ALI_MODEL = os.getenv("ALI_MODEL0")
+EMBEDDING_MODEL = os.getenv("ALI_EMBEDDING_MODEL", "text-embedding-v4")
+# 嵌入API单次请求的最大输入条数（text-embedding-v4 为 10）
+EMBEDDING_BATCH_SIZE = int(os.getenv("ALI_EMBEDDING_BATCH_SIZE", "10"))
 
 # 校验必填项
 if not ALI_API_KEY:
@@ -31,8 +39,60 @@ if not ALI_BASE_URL:
 # 初始化rich控制台
 console = Console()
 
+# 全局嵌入向量缓存、答案缓存和实体词典在首次创建问答系统时才构建（进程内共享），
+# 导入本模块不会在 ./cache 下创建文件
+_shared_lock = threading.Lock()
+_shared_instances = {}
 
-class Neo4jRAGSystem:
+
+def _get_shared(name: str, factory: Callable):
+    """获取全局共享实例，不存在时用 factory 创建"""
+    with _shared_lock:
+        if name not in _shared_instances:
+            _shared_instances[name] = factory()
+        return _shared_instances[name]
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    """全局嵌入向量缓存实例"""
+    return _get_shared("embedding_cache", lambda: EmbeddingCache(
+        db_path=os.getenv("EMBEDDING_CACHE_PATH", "./cache/embeddings.sqlite3"),
+        memory_size=int(os.getenv("EMBEDDING_CACHE_MEMORY_SIZE", "4096")),
+        max_disk_entries=int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
+    ))
+
+
+def get_answer_cache() -> AnswerCache:
+    """全局答案缓存实例（精确匹配 + 语义相似 + 抽取结果）"""
+    return _get_shared("answer_cache", lambda: AnswerCache(
+        db_path=os.getenv("ANSWER_CACHE_PATH", "./cache/answers.sqlite3"),
+        max_answers=int(os.getenv("ANSWER_CACHE_SIZE", "2048")),
+        answer_ttl=float(os.getenv("ANSWER_CACHE_TTL", "86400")),
+        similarity_threshold=float(os.getenv("ANSWER_CACHE_SIMILARITY_THRESHOLD", "0.95")),
+        max_extractions=int(os.getenv("EXTRACTION_CACHE_MAX_ENTRIES", "50000")),
+        extraction_ttl=float(os.getenv("EXTRACTION_CACHE_TTL", "604800")),
+        version_check_interval=float(os.getenv("ANSWER_CACHE_VERSION_CHECK_INTERVAL", "30"))
+    ))
+
+
+def get_entity_dictionary() -> EntityDictionary:
+    """全局实体词典实例（由图谱节点名称构建，本地识别问题中的实体）"""
+    return _get_shared("entity_dictionary", lambda: EntityDictionary(
+        path=os.getenv("ENTITY_DICTIONARY_PATH", "./cache/entity_dictionary.pkl"),
+        min_length=int(os.getenv("ENTITY_DICTIONARY_MIN_LENGTH", "2"))
+    ))
+
+# 生成答案失败时返回的默认回答（不写入答案缓存）
+FALLBACK_ANSWER = "抱歉，我无法回答这个问题。"
+
+
+class RAGSystemBase:
+    """知识图谱问答系统的公共部分
+
+    同步版本 Neo4jRAGSystem 与异步版本 AsyncNeo4jRAGSystem 共用的搜索预算、检索查询、提示词、
+    结果解析和答案缓存逻辑，本身不做任何网络 I/O。
+    子类需提供 console 属性（当前调用的日志控制台）和 _record_timing（记录阶段耗时）。
+    """
     BUDGET_MODES = {
         "Deeper": {
             "entity_limit": 3,
@@ -51,44 +111,114 @@ class Neo4jRAGSystem:
             "multi_hop_limit": 2
         }
     }
+    # 知识图谱中参与检索的节点标签
+    GRAPH_LABELS = ['Disease', 'Category', 'Symptom', 'Department', 'Treatment', 'Check', 'Drug', 'Food', 'Recipe']
+    # 实体类型和关系类型定义
+    ENTITY_TYPES = [
+        'Disease', 'Category', 'Symptom', 'Department', 'Treatment',
+        'Check', 'Drug', 'Food', 'Recipe', 'Person', 'Organization',
+        'Time', 'Location', 'Other'
+    ]
+    RELATION_TYPES = [
+        'BELONGS_TO', 'HAS_SYMPTOM', 'TREATED_BY', 'USES_TREATMENT',
+        'REQUIRES_CHECK', 'RECOMMENDS_DRUG', 'COMMONLY_USES_DRUG',
+        'SHOULD_EAT', 'SHOULD_NOT_EAT', 'RECOMMENDS_RECIPE',
+        'ACCOMPANIES', 'OTHER'
+    ]
+    # 批量检索：一次往返查询实体属性、关系三元组和第一跳相连实体（每种关系类型最多5条）
+    BATCHED_RETRIEVAL_QUERY = """
+    CALL {
+        UNWIND $entities AS e
+        CALL {
+            WITH e
+            MATCH (n {name: e.name})
+            WHERE (e.type = 'Disease' AND n:Disease)
+               OR (e.type <> 'Disease' AND any(label IN labels(n) WHERE label IN $labels))
+            RETURN n LIMIT $entity_limit
+        }
+        RETURN collect({idx: e.idx, n: n}) AS entity_nodes
+    }
+    CALL {
+        UNWIND $relations AS rel
+        CALL {
+            WITH rel
+            MATCH (s)-[r]->(t)
+            WHERE s.name = rel.source
+            RETURN s, r, t LIMIT $relation_limit
+            UNION
+            WITH rel
+            MATCH (s)-[r]->(t)
+            WHERE t.name = rel.target
+            RETURN s, r, t LIMIT $relation_limit
+        }
+        RETURN collect({idx: rel.idx, s: s, r: r, t: t}) AS relation_triples
+    }
+    CALL {
+        UNWIND $entities AS e
+        CALL {
+            WITH e
+            MATCH (n)-[r]->(m)
+            WHERE n.name = e.name AND any(label IN labels(m) WHERE label IN $labels)
+            RETURN n, r, m, 'out' AS direction LIMIT $one_hop_limit
+            UNION ALL
+            WITH e
+            MATCH (n)<-[r]-(m)
+            WHERE n.name = e.name AND any(label IN labels(m) WHERE label IN $labels)
+            RETURN n, r, m, 'in' AS direction LIMIT $one_hop_limit
+        }
+        WITH e, direction, type(r) AS rel_type, collect({n: n, r: r, m: m, rel_type: type(r)}) AS records
+        RETURN collect({idx: e.idx, direction: direction, records: records[..5]}) AS one_hop
+    }
+    RETURN entity_nodes, relation_triples, one_hop
+    """
+    # 批量检索：一次往返查询多个实体的第二跳相连实体
+    BATCHED_SECOND_HOP_QUERY = """
+    UNWIND $names AS name
+    CALL {
+        WITH name
+        MATCH (n)-[r]->(m)
+        WHERE n.name = name AND any(label IN labels(m) WHERE label IN $labels)
+        RETURN n, r, m LIMIT $multi_hop_limit
+        UNION
+        WITH name
+        MATCH (n)<-[r]-(m)
+        WHERE n.name = name AND any(label IN labels(m) WHERE label IN $labels)
+        RETURN n, r, m LIMIT $multi_hop_limit
+    }
+    RETURN name, collect({n: n, r: r, m: m}) AS records
+    """
+    # 实体词典：图谱中所有节点的名称和标签
+    ENTITY_NAMES_QUERY = """
+    MATCH (n)
+    WHERE n.name IS NOT NULL AND any(label IN labels(n) WHERE label IN $labels)
+    RETURN n.name AS name, labels(n) AS labels
+    """
 
-    def __init__(self, neo4j_uri: str, neo4j_user: str, neo4j_password: str,
-                 enable_multi_hop: bool = True, search_budget_mode: str = "Deeper"):
-        """初始化RAG系统"""
-        # 初始化Rich控制台
-        self.console = console
+    def __init__(self, enable_multi_hop: bool = True, search_budget_mode: str = "Deeper",
+                 enable_answer_cache: bool = True, enable_dictionary_extraction: bool = True):
+        """初始化同步、异步版本共用的设置（console 属性需在调用前可用）"""
+        self._default_console = console
+        # 进程内共享的缓存与实体词典（首次创建问答系统时构建）
+        self.embedding_cache = get_embedding_cache()
+        self.answer_cache = get_answer_cache()
+        self.entity_dictionary = get_entity_dictionary()
         self.enable_multi_hop = enable_multi_hop
+        self.enable_answer_cache = enable_answer_cache
+        self.enable_dictionary_extraction = enable_dictionary_extraction
         # 设置搜索预算参数
+        self.search_budget = self._resolve_search_budget(search_budget_mode)
+        # 系统提示词
+        self.entity_extraction_prompt = self._get_entity_extraction_prompt()
+        self.answer_generation_prompt = self._get_answer_generation_prompt()
+
+    def _resolve_search_budget(self, search_budget_mode: str) -> Dict:
+        """根据搜索预算模式名称获取预算参数"""
         if search_budget_mode not in self.BUDGET_MODES:
             self.console.print(
                 f"[bold red]警告：未知的搜索预算模式 '{search_budget_mode}'。将使用默认的 'Deeper' 模式。[/bold red]")
             search_budget_mode = "Deeper"
-        self.search_budget = self.BUDGET_MODES[search_budget_mode]
         self.console.print(f"搜索预算模式已设置为: [bold magenta]{search_budget_mode}[/bold magenta]")
-        # 显示初始化信息
-        with self.console.status("[bold green]正在初始化系统...", spinner="dots"):
-            # 初始化Neo4j连接
-            self.console.print("连接Neo4j数据库...", style="blue")
-            self.graph = Graph(neo4j_uri, auth=(neo4j_user, neo4j_password))
-            self.console.print("Neo4j数据库连接成功", style="green")
-            # 初始化阿里云通义千问API
-            self.console.print("阿里云通义千问API初始化成功", style="green")
-            # 实体类型和关系类型定义
-            self.ENTITY_TYPES = [
-                'Disease', 'Category', 'Symptom', 'Department', 'Treatment',
-                'Check', 'Drug', 'Food', 'Recipe', 'Person', 'Organization',
-                'Time', 'Location', 'Other'
-            ]
-            self.RELATION_TYPES = [
-                'BELONGS_TO', 'HAS_SYMPTOM', 'TREATED_BY', 'USES_TREATMENT',
-                'REQUIRES_CHECK', 'RECOMMENDS_DRUG', 'COMMONLY_USES_DRUG',
-                'SHOULD_EAT', 'SHOULD_NOT_EAT', 'RECOMMENDS_RECIPE',
-                'ACCOMPANIES', 'OTHER'
-            ]
-            # 系统提示词
-            self.entity_extraction_prompt = self._get_entity_extraction_prompt()
-            self.answer_generation_prompt = self._get_answer_generation_prompt()
-            self.console.print("系统初始化完成!", style="bold green")
+        return self.BUDGET_MODES[search_budget_mode]
 
     def _get_entity_extraction_prompt(self) -> str:
         """获取实体抽取的系统提示词"""
@@ -228,11 +358,376 @@ class Neo4jRAGSystem:
             # 如果无法识别格式，返回空关系
             return {"source": "", "target": "", "type": "OTHER"}
 
+    def _extract_with_dictionary(self, text: str) -> Optional[Dict]:
+        """用实体词典在本地识别实体和关系线索，识别不到实体时返回 None（改用LLM抽取）"""
+        if not self._dictionary_ready():
+            return None
+        return self._accept_dictionary_result(self.entity_dictionary.extract(text))
+
+    def _dictionary_ready(self) -> bool:
+        """是否可以用实体词典在本地识别实体"""
+        return self.enable_dictionary_extraction and self.entity_dictionary.ready
+
+    def _accept_dictionary_result(self, result: Dict) -> Optional[Dict]:
+        """展示实体词典的识别结果，没有识别到实体时返回 None"""
+        if not result["entities"]:
+            self.console.print("实体词典未识别到实体，改用LLM抽取", style="yellow")
+            return None
+        self.console.print("实体词典识别到实体，跳过LLM抽取", style="blue")
+        self._show_extraction(result)
+        return result
+
+    def _show_extraction(self, result: Dict):
+        """以表格形式展示实体和关系"""
+        # 创建实体表格
+        entity_table = Table(title="提取的实体", show_header=True, header_style="bold green")
+        entity_table.add_column("实体名称", style="cyan")
+        entity_table.add_column("实体类型", style="magenta")
+        for entity in result["entities"]:
+            entity_table.add_row(
+                entity.get("name", "未知"),
+                entity.get("type", "未知")
+            )
+        self.console.print(entity_table)
+        # 创建关系表格
+        relation_table = Table(title="提取的关系", show_header=True, header_style="bold blue")
+        relation_table.add_column("源实体", style="cyan")
+        relation_table.add_column("关系类型", style="yellow")
+        relation_table.add_column("目标实体", style="green")
+        for relation in result["relations"]:
+            relation_table.add_row(
+                relation.get("source", "未知"),
+                relation.get("type", "未知"),
+                relation.get("target", "未知")
+            )
+        self.console.print(relation_table)
+        self.console.print("实体和关系提取完成!", style="bold green")
+
+    def _parse_extraction_content(self, content: str) -> Dict:
+        """解析LLM返回的实体关系抽取结果并展示"""
+        # 提取JSON部分
+        if "```json" in content:
+            content = content.split("```json")[1].split("```")[0].strip()
+        elif "```" in content:
+            content = content.split("```")[1].split("```")[0].strip()
+        try:
+            result = json.loads(content)
+            if "entities" not in result or "relations" not in result:
+                raise ValueError("API返回的格式不正确")
+            # 统一实体和关系格式
+            normalized_entities = [self._normalize_entity(e) for e in result["entities"]]
+            normalized_relations = [self._normalize_relation(r) for r in result["relations"]]
+            result = {
+                "entities": normalized_entities,
+                "relations": normalized_relations
+            }
+            self._show_extraction(result)
+            return result
+        except json.JSONDecodeError:
+            # 如果JSON解析失败，返回空结果
+            self.console.print("JSON解析失败！", style="bold red")
+            return {"entities": [], "relations": []}
+
+    @staticmethod
+    def _parse_stream_line(line: str) -> Optional[str]:
+        """
+        解析流式响应中的一行 SSE 数据
+        Returns:
+            增量文本；非数据行、空增量返回空字符串；流结束标记 [DONE] 返回 None
+        """
+        line = line.strip()
+        if not line.startswith("data:"):
+            return ""
+        payload = line[len("data:"):].strip()
+        if payload == "[DONE]":
+            return None
+        chunk = json.loads(payload)
+        choices = chunk.get("choices") or []
+        if not choices:
+            return ""
+        return (choices[0].get("delta") or {}).get("content") or ""
+
+    def calculate_similarity(self, vec1: List[float], vec2: List[float]) -> float:
+        """计算两个向量的余弦相似度"""
+        if not vec1 or not vec2:
+            return 0.0
+        return float(SimilarityScorer(vec1).score([vec2])[0])
+
+    def _batched_parameters(self, entities: List[Dict], relations: List[Dict], search_budget: Dict) -> Dict:
+        """构建批量检索查询（BATCHED_RETRIEVAL_QUERY）的参数"""
+        entity_rows = [{"idx": idx, "name": e["name"], "type": e.get("type", "Other")}
+                       for idx, e in enumerate(entities) if "name" in e]
+        relation_rows = [{"idx": idx, "source": r["source"], "target": r["target"]}
+                         for idx, r in enumerate(relations)
+                         if all(key in r for key in ["source", "target", "type"])]
+        return {
+            "entities": entity_rows,
+            "relations": relation_rows,
+            "labels": self.GRAPH_LABELS,
+            "entity_limit": search_budget['entity_limit'],
+            "relation_limit": search_budget['relation_limit'],
+            "one_hop_limit": search_budget['one_hop_limit']
+        }
+
+    @staticmethod
+    def _parse_batched_record(record: Dict) -> Dict:
+        """
+        解析批量检索查询的结果
+        Returns:
+            dict: entity_nodes / relation_triples / one_hop，均以实体或关系在输入列表中的下标为键，
+                  值的结构与逐个查询的结果一致
+        """
+        prefetched = {"entity_nodes": defaultdict(list), "relation_triples": defaultdict(list), "one_hop": {}}
+        for row in record["entity_nodes"]:
+            prefetched["entity_nodes"][row["idx"]].append({"n": row["n"]})
+        for row in record["relation_triples"]:
+            prefetched["relation_triples"][row["idx"]].append({"s": row["s"], "r": row["r"], "t": row["t"]})
+        for row in record["one_hop"]:
+            outgoing, incoming = prefetched["one_hop"].setdefault(row["idx"], ([], []))
+            (outgoing if row["direction"] == "out" else incoming).extend(row["records"])
+        return prefetched
+
+    def _build_answer_prompt(self, question: str, knowledge: Dict) -> str:
+        """根据问题和知识图谱查询结果构建答案生成的提示词（过长时自动缩减）"""
+        # 限制知识图谱信息的数量以避免提示词过长
+        max_entities = 10  # 最多10个实体
+        max_triples = 20  # 最多20个关系三元组
+        # 截取实体属性信息
+        limited_entities = knowledge['entity_properties'][:max_entities]
+        # 截取关系三元组信息（按相似度排序，取前20个）
+        limited_triples = knowledge['related_triples'][:max_triples]
+        # 简化实体和关系信息的表示
+        entities_summary = []
+        for entity in limited_entities:
+            # 只保留关键属性，简化信息
+            simplified_entity = {
+                "name": entity.get("name", ""),
+                "type": entity.get("type", ""),
+                "key_properties": {k: v for k, v in entity.get("properties", {}).items()
+                                   if k in ["name", "description", "category", "type"] and len(str(v)) < 100}
+            }
+            entities_summary.append(simplified_entity)
+        triples_summary = []
+        for triple in limited_triples:
+            # 简化关系三元组表示
+            simplified_triple = {
+                "source": triple.get("source", {}).get("name", ""),
+                "relation": triple.get("relation", ""),
+                "target": triple.get("target", {}).get("name", ""),
+                "similarity": round(triple.get("similarity", 0.0), 2)
+            }
+            triples_summary.append(simplified_triple)
+        # 构建简化的提示词
+        full_prompt = f"""{self.answer_generation_prompt}
+        问题：{question}
+
+        知识图谱信息：
+        相关实体（共{len(entities_summary)}个）：
+        {json.dumps(entities_summary, ensure_ascii=False, indent=2)}
+
+        相关关系（共{len(triples_summary)}个，按相似度排序）：
+        {json.dumps(triples_summary, ensure_ascii=False, indent=2)}
+
+        请基于以上医学知识图谱信息回答问题。如果信息不足以回答问题，请说明。"""
+        # 检查提示词长度
+        prompt_length = len(full_prompt)
+        self.console.print(f"提示词长度: {prompt_length:,} 字符", style="blue")
+        # 如果提示词仍然太长，进一步缩减
+        if prompt_length > 8000:  # 设置一个安全阈值
+            self.console.print("提示词过长，进一步缩减信息...", style="yellow")
+            # 进一步减少数量
+            max_entities = 5
+            max_triples = 10
+            limited_entities = knowledge['entity_properties'][:max_entities]
+            limited_triples = knowledge['related_triples'][:max_triples]
+            # 重新构建更简化的提示词
+            entities_text = "; ".join([f"{e.get('name', '')}({e.get('type', '')})" for e in limited_entities])
+            triples_text = "; ".join([
+                f"{t.get('source', {}).get('name', '')}-{t.get('relation', '')}-{t.get('target', {}).get('name', '')}"
+                for t in limited_triples])
+
+            full_prompt = f"""{self.answer_generation_prompt}
+            问题：{question} 
+            知识图谱信息：
+            相关实体：{entities_text}
+            相关关系：{triples_text}
+
+            请基于以上医学知识图谱信息回答问题。"""
+            self.console.print(f"缩减后提示词长度: {len(full_prompt):,} 字符", style="blue")
+        return full_prompt
+
+    def _answer_cache_variant(self, enable_multi_hop: bool = None, search_budget: Dict = None) -> str:
+        """影响答案内容的检索参数（是否多跳、搜索预算），作为答案缓存的 variant"""
+        enable_multi_hop = self.enable_multi_hop if enable_multi_hop is None else enable_multi_hop
+        return json.dumps({"multi_hop": enable_multi_hop, "budget": search_budget or self.search_budget},
+                          sort_keys=True)
+
+    def _entity_dictionary_stale(self, version: str) -> bool:
+        """实体词典是否需要按当前图谱版本号更新"""
+        return self.enable_dictionary_extraction and (not self.entity_dictionary.ready or
+                                                      self.entity_dictionary.graph_version != version)
+
+    def _report_dictionary_update(self, changes: Dict):
+        """保存更新后的实体词典并输出变化情况"""
+        self.entity_dictionary.save()
+        self._print_dictionary_update(changes)
+
+    def _print_dictionary_update(self, changes: Dict):
+        """输出实体词典的变化情况"""
+        self.console.print(f"实体词典已更新: 新增 {changes['added']} 个, 移除 {changes['removed']} 个, "
+                           f"共 {changes['total']} 个名称", style="green")
+
+    def _lookup_semantic_answer(self, question_embedding: List[float], variant: str, entities: List[Dict]):
+        """按问题向量查找语义相似、且抽取出的实体相同的已缓存答案，未命中返回 None"""
+        return self._accept_semantic_hit(self.answer_cache.get_semantic(question_embedding, variant, entities))
+
+    def _accept_semantic_hit(self, hit: Optional[Dict]) -> Optional[str]:
+        """展示语义缓存的命中结果并返回答案，未命中返回 None"""
+        if hit is None:
+            return None
+        self.console.print(
+            f"命中答案缓存（语义相似）: [cyan]{hit['question']}[/cyan] (相似度: {hit['similarity']:.3f})",
+            style="bold green")
+        return hit["answer"]
+
+    def _show_cached_answer(self, answer: str, on_delta: Optional[Callable[[str], None]] = None):
+        """展示缓存的答案；流式调用方一次性收到完整答案"""
+        if on_delta is not None:
+            on_delta(answer)
+        self.console.print(Panel(Markdown(answer),
+                                 title="回答（缓存）",
+                                 border_style="green",
+                                 expand=False))
+
+    def _print_timings(self, timings: Dict):
+        """以表格形式展示各阶段耗时"""
+        if not timings:
+            return
+        timing_table = Table(title="阶段耗时", show_header=True, header_style="bold cyan")
+        timing_table.add_column("阶段", style="cyan")
+        timing_table.add_column("耗时 (ms)", style="magenta", justify="right")
+        for stage, elapsed in timings.items():
+            timing_table.add_row(stage, f"{elapsed * 1000:.1f}")
+        self.console.print(timing_table)
+
+
+class Neo4jRAGSystem(RAGSystemBase):
+    # 图谱检索模式：standard 逐个查询，batched 使用 UNWIND 批量查询
+    RETRIEVAL_MODES = ("standard", "batched")
+    # 执行模式：sequential 串行执行，concurrent 通过线程池并发执行各阶段内相互独立的查询和向量请求
+    EXECUTION_MODES = ("sequential", "concurrent")
+
+    def __init__(self, neo4j_uri: str, neo4j_user: str, neo4j_password: str,
+                 enable_multi_hop: bool = True, search_budget_mode: str = "Deeper",
+                 pool_size: int = 8, retrieval_mode: str = "standard",
+                 execution_mode: str = "sequential", max_workers: int = 8, stage_timeout: float = 15.0,
+                 enable_answer_cache: bool = True, enable_dictionary_extraction: bool = True):
+        """
+        初始化RAG系统
+
+        实例可在多个请求线程间共享：enable_multi_hop、search_budget_mode、retrieval_mode 和 execution_mode
+        只作为默认值，每次调用 answer_question 时可以单独指定；日志控制台也可以按调用（线程）单独指定。
+        concurrent 模式下使用有界线程池（max_workers）并发执行，每个阶段最多等待 stage_timeout 秒。
+        enable_answer_cache 为 True 时先查询答案缓存（精确匹配、语义相似），并复用缓存的实体关系抽取结果。
+        enable_dictionary_extraction 为 True 时先用实体词典在本地识别实体，识别不到时才调用LLM抽取。
+        """
+        # 初始化Rich控制台（按线程覆盖，见 console 属性）
+        self._local = threading.local()
+        super().__init__(enable_multi_hop=enable_multi_hop, search_budget_mode=search_budget_mode,
+                         enable_answer_cache=enable_answer_cache,
+                         enable_dictionary_extraction=enable_dictionary_extraction)
+        if retrieval_mode not in self.RETRIEVAL_MODES:
+            self.console.print(
+                f"[bold red]警告：未知的检索模式 '{retrieval_mode}'。将使用默认的 'standard' 模式。[/bold red]")
+            retrieval_mode = "standard"
+        self.retrieval_mode = retrieval_mode
+        if execution_mode not in self.EXECUTION_MODES:
+            self.console.print(
+                f"[bold red]警告：未知的执行模式 '{execution_mode}'。将使用默认的 'sequential' 模式。[/bold red]")
+            execution_mode = "sequential"
+        self.execution_mode = execution_mode
+        self.stage_timeout = stage_timeout
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="rag-stage")
+        # 显示初始化信息
+        with self.console.status("[bold green]正在初始化系统...", spinner="dots"):
+            # 初始化Neo4j连接池
+            self.console.print("连接Neo4j数据库...", style="blue")
+            self.pool = Neo4jConnectionPool(neo4j_uri, neo4j_user, neo4j_password, max_size=pool_size)
+            health = self.pool.health_check()
+            if health["ok"]:
+                self.console.print(f"Neo4j数据库连接成功 (连接池大小: {pool_size})", style="green")
+            else:
+                self.console.print(f"Neo4j数据库连接失败: {health['error']}", style="bold red")
+            # 初始化阿里云通义千问API
+            self.console.print("阿里云通义千问API初始化成功", style="green")
+            # 加载实体词典（与图谱版本号不一致时在提问时增量更新）
+            if self.enable_dictionary_extraction and self.entity_dictionary.load():
+                self.console.print(f"实体词典加载完成 ({len(self.entity_dictionary.names)} 个名称)", style="green")
+            self.console.print("系统初始化完成!", style="bold green")
+
+    @property
+    def console(self) -> Console:
+        """当前线程使用的控制台（未单独指定时使用全局控制台）"""
+        return getattr(self._local, "console", None) or self._default_console
+
+    def _record_timing(self, stage: str, start: float):
+        """记录当前调用中某个阶段的耗时（秒）"""
+        timings = getattr(self._local, "timings", None)
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - start
+
+    def _submit(self, fn, *args):
+        """提交任务到线程池，任务内沿用当前线程的日志控制台"""
+        task_console = getattr(self._local, "console", None)
+
+        def task():
+            self._local.console = task_console
+            try:
+                return fn(*args)
+            finally:
+                self._local.console = None
+
+        return self.executor.submit(task)
+
+    def _gather(self, stage: str, calls: Dict) -> Dict:
+        """
+        并发执行一组相互独立的调用，按键返回结果
+        Args:
+            stage: 阶段名称（用于超时提示）
+            calls: 键 -> (函数, 参数元组)
+        Returns:
+            dict: 键 -> 返回值；调用出错或超过 stage_timeout 时值为对应的异常对象
+        """
+        futures = {key: self._submit(fn, *args) for key, (fn, args) in calls.items()}
+        done, _ = wait(futures.values(), timeout=self.stage_timeout)
+        results = {}
+        for key, future in futures.items():
+            if future in done:
+                try:
+                    results[key] = future.result()
+                except Exception as e:
+                    results[key] = e
+            else:
+                future.cancel()
+                results[key] = TimeoutError(f"{stage}超时（{self.stage_timeout}秒）")
+        return results
+
+    @staticmethod
+    def _take(fetched: Dict, key, default):
+        """读取预取结果，预取时出错则在此处抛出，交由各阶段原有的异常处理"""
+        value = fetched.get(key, default)
+        if isinstance(value, Exception):
+            raise value
+        return value
+
     def extract_entities_relations(self, text: str) -> Dict:
         """使用LLM提取实体和关系"""
         self.console.print(Panel(f"[bold blue]问题分析[/bold blue]：\n{text}",
                                  border_style="blue", expand=False))
         # 使用进度指示器
+        dictionary_result = self._extract_with_dictionary(text)
+        if dictionary_result is not None:
+            return dictionary_result
         with self.console.status("[bold green]正在分析问题...", spinner="dots") as status:
             try:
                 self.console.print("正在提取实体和关系...", style="blue")
@@ -240,55 +735,45 @@ class Neo4jRAGSystem:
                 full_prompt = f"{self.entity_extraction_prompt}\n\n请从以下文本中提取关键实体和实体间的关系:\n\n{text}"
                 # 调用阿里云通义千问API
                 content = self.call_llm(full_prompt, temperature=0.2)
-                # 提取JSON部分
-                if "```json" in content:
-                    content = content.split("```json")[1].split("```")[0].strip()
-                elif "```" in content:
-                    content = content.split("```")[1].split("```")[0].strip()
-                try:
-                    result = json.loads(content)
-                    if "entities" not in result or "relations" not in result:
-                        raise ValueError("API返回的格式不正确")
-                    # 统一实体和关系格式
-                    normalized_entities = [self._normalize_entity(e) for e in result["entities"]]
-                    normalized_relations = [self._normalize_relation(r) for r in result["relations"]]
-                    # 创建实体表格
-                    entity_table = Table(title="提取的实体", show_header=True, header_style="bold green")
-                    entity_table.add_column("实体名称", style="cyan")
-                    entity_table.add_column("实体类型", style="magenta")
-                    for entity in normalized_entities:
-                        entity_table.add_row(
-                            entity.get("name", "未知"),
-                            entity.get("type", "未知")
-                        )
-                    self.console.print(entity_table)
-                    # 创建关系表格
-                    relation_table = Table(title="提取的关系", show_header=True, header_style="bold blue")
-                    relation_table.add_column("源实体", style="cyan")
-                    relation_table.add_column("关系类型", style="yellow")
-                    relation_table.add_column("目标实体", style="green")
-                    for relation in normalized_relations:
-                        relation_table.add_row(
-                            relation.get("source", "未知"),
-                            relation.get("type", "未知"),
-                            relation.get("target", "未知")
-                        )
-                    self.console.print(relation_table)
-                    self.console.print("实体和关系提取完成!", style="bold green")
-                    return {
-                        "entities": normalized_entities,
-                        "relations": normalized_relations
-                    }
-                except json.JSONDecodeError:
-                    # 如果JSON解析失败，返回空结果
-                    self.console.print("JSON解析失败！", style="bold red")
-                    return {"entities": [], "relations": []}
+                return self._parse_extraction_content(content)
             except Exception as e:
                 self.console.print(f"实体关系抽取出错: {str(e)}", style="bold red")
                 return {"entities": [], "relations": []}
 
     def get_embedding(self, text: str) -> List[float]:
-        """获取文本的向量表示（阿里云通义千问API embedding）"""
+        """获取文本的向量表示（优先读取缓存，未命中时调用阿里云通义千问API embedding）"""
+        return self.get_embeddings([text])[0]
+
+    def get_embeddings(self, texts: List[str], parallel: bool = False) -> List[List[float]]:
+        """批量获取文本的向量表示（去重并读取缓存，未命中部分按批量上限分块请求，parallel 时各分块并发请求）"""
+        embeddings = [[] for _ in texts]
+        # 规范化文本 -> 需要填充的位置列表
+        missing = {}
+        for idx, text in enumerate(texts):
+            if not text or not text.strip():
+                continue
+            cached = self.embedding_cache.get(EMBEDDING_MODEL, text)
+            if cached is not None:
+                embeddings[idx] = cached
+            else:
+                missing.setdefault(normalize_text(text), []).append(idx)
+        pending = list(missing.keys())
+        chunks = [pending[start:start + EMBEDDING_BATCH_SIZE] for start in range(0, len(pending), EMBEDDING_BATCH_SIZE)]
+        if parallel and len(chunks) > 1:
+            fetched = self._gather("向量请求", {i: (self._request_embeddings, (chunk,)) for i, chunk in enumerate(chunks)})
+            chunk_vectors = [fetched[i] if not isinstance(fetched[i], Exception) else [[] for _ in chunk]
+                             for i, chunk in enumerate(chunks)]
+        else:
+            chunk_vectors = [self._request_embeddings(chunk) for chunk in chunks]
+        for chunk, vectors in zip(chunks, chunk_vectors):
+            for text, vector in zip(chunk, vectors):
+                self.embedding_cache.put(EMBEDDING_MODEL, text, vector)
+                for idx in missing[text]:
+                    embeddings[idx] = vector
+        return embeddings
+
+    def _request_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """调用阿里云通义千问API批量获取文本的向量表示（单次请求，输入数量不超过批量上限）"""
         max_retries = 3
         base_delay = 1.0
         headers = {
@@ -302,8 +787,8 @@ class Neo4jRAGSystem:
                     delay = base_delay * (2 ** attempt)
                     time.sleep(delay)
                 data = {
-                    'model': "text-embedding-v4",
-                    'input': text
+                    'model': EMBEDDING_MODEL,
+                    'input': texts
                 }
                 response = requests.post(url, headers=headers, json=data)
                 if response.status_code == 429:
@@ -315,9 +800,11 @@ class Neo4jRAGSystem:
                 if response.status_code != 200:
                     raise Exception(f"嵌入API调用失败: {response.status_code}, {response.text}")
                 result = response.json()
-                if 'data' in result and len(result['data']) > 0 and 'embedding' in result['data'][0]:
-                    embedding_vector = result['data'][0]['embedding']
-                    return embedding_vector
+                if 'data' in result and len(result['data']) == len(texts) and \
+                        all('embedding' in item for item in result['data']):
+                    # 按index字段还原输入顺序
+                    items = sorted(result['data'], key=lambda item: item.get('index', 0))
+                    return [item['embedding'] for item in items]
                 else:
                     raise Exception(f"嵌入API返回格式错误: {result}")
             except Exception as e:
@@ -325,11 +812,19 @@ class Neo4jRAGSystem:
                     continue
                 else:
                     self.console.print(f"获取向量表示出错: {str(e)}", style="bold red")
-                    return []
-        return []
+                    return [[] for _ in texts]
+        return [[] for _ in texts]
 
-    def call_llm(self, prompt: str, temperature: float = 0.7) -> str:
-        """调用阿里云通义千问API，带重试机制"""
+    def call_llm(self, prompt: str, temperature: float = 0.7,
+                 on_delta: Optional[Callable[[str], None]] = None) -> str:
+        """
+        调用阿里云通义千问API，带重试机制
+        Args:
+            on_delta: 提供时以流式模式（stream: true）调用，每收到一段增量文本即回调一次；
+                      返回值仍为完整文本。已输出增量后出错不再重试，以免重复输出
+        """
+        if on_delta is not None:
+            return self._call_llm_stream(prompt, temperature, on_delta)
         max_retries = 3
         base_delay = 1.0  # 基础延迟时间（秒）
         headers = {
@@ -372,14 +867,178 @@ class Neo4jRAGSystem:
                     raise e
         raise Exception("LLM调用失败")
 
-    def calculate_similarity(self, vec1: List[float], vec2: List[float]) -> float:
-        """计算两个向量的余弦相似度"""
-        if not vec1 or not vec2:
-            return 0.0
-        return cosine_similarity([vec1], [vec2])[0][0]
+    def _call_llm_stream(self, prompt: str, temperature: float, on_delta: Callable[[str], None]) -> str:
+        """以流式模式调用阿里云通义千问API，逐段回调增量文本并返回完整文本"""
+        max_retries = 3
+        base_delay = 1.0  # 基础延迟时间（秒）
+        headers = {
+            'Authorization': f'Bearer {ALI_API_KEY}',
+            'Content-Type': 'application/json'
+        }
+        url = f'{ALI_BASE_URL}/chat/completions'
+        data = {
+            'model': ALI_MODEL,
+            'messages': [
+                {"role": "user", "content": prompt}
+            ],
+            'temperature': temperature,
+            'stream': True
+        }
+        for attempt in range(max_retries):
+            parts = []
+            try:
+                if attempt > 0:
+                    time.sleep(base_delay * (2 ** attempt))
+                with requests.post(url, headers=headers, json=data, stream=True) as response:
+                    if response.status_code == 429:
+                        if attempt < max_retries - 1:
+                            continue
+                        raise Exception(
+                            f"LLM API调用频率受限，已达到最大重试次数: {response.status_code}, {response.text}")
+                    if response.status_code != 200:
+                        raise Exception(f"LLM API调用失败: {response.status_code}, {response.text}")
+                    response.encoding = 'utf-8'
+                    for line in response.iter_lines(decode_unicode=True):
+                        if not line:
+                            continue
+                        delta = self._parse_stream_line(line)
+                        if delta is None:
+                            break
+                        if delta:
+                            parts.append(delta)
+                            on_delta(delta)
+                if not parts:
+                    raise Exception("LLM API流式响应为空")
+                return "".join(parts)
+            except Exception as e:
+                if parts or attempt >= max_retries - 1:
+                    raise e
+        raise Exception("LLM调用失败")
+
+    def warm_up_embedding_cache(self) -> Dict:
+        """预热嵌入向量缓存：加载图谱中所有节点名称和关系类型的向量"""
+        self.console.print(Panel("[bold green]预热向量缓存[/bold green]", border_style="green", expand=False))
+        names = [record["name"] for record in self.pool.run(
+            "MATCH (n) WHERE n.name IS NOT NULL RETURN DISTINCT n.name AS name")]
+        rel_types = [record["rel_type"] for record in self.pool.run(
+            "CALL db.relationshipTypes() YIELD relationshipType RETURN relationshipType AS rel_type")]
+        texts = names + rel_types
+        self.console.print(f"共 [bold]{len(texts)}[/bold] 个文本需要预热", style="blue")
+        loaded = 0
+        chunk_size = 500
+        with self.console.status("[bold green]正在预热向量缓存...", spinner="dots"):
+            for start in range(0, len(texts), chunk_size):
+                chunk = texts[start:start + chunk_size]
+                loaded += sum(1 for vector in self.get_embeddings(chunk) if vector)
+                self.console.print(f"已处理 {start + len(chunk)}/{len(texts)}", style="blue")
+        stats = self.embedding_cache.stats()
+        self.console.print(
+            f"向量缓存预热完成: 成功 {loaded}/{len(texts)}，磁盘缓存 {stats['disk_entries']} 条",
+            style="bold green")
+        return stats
+
+    def _fetch_entity_nodes(self, entity_name: str, entity_type: str, search_budget: Dict) -> List[Dict]:
+        """查询单个实体的节点"""
+        # 根据节点类型构建查询
+        if entity_type == "Disease":
+            query = f"""
+            MATCH (n:Disease {{name: $name}})
+            RETURN n LIMIT {search_budget['entity_limit']}
+            """
+        else:
+            query = f"""
+            MATCH (n {{name: $name}})
+            WHERE any(label in labels(n) WHERE label in ['Disease', 'Category', 'Symptom', 'Department', 'Treatment', 'Check', 'Drug', 'Food', 'Recipe'])
+            RETURN n LIMIT {search_budget['entity_limit']}
+            """
+        return self.pool.run(query, name=entity_name)
+
+    def _fetch_relation_triples(self, source: str, target: str, search_budget: Dict) -> List[Dict]:
+        """查询单个关系的候选三元组"""
+        query = f"""
+        MATCH (s)-[r]->(t)
+        WHERE s.name = $source
+        RETURN s, r, t LIMIT {search_budget['relation_limit']}
+        UNION
+        MATCH (s)-[r]->(t)
+        WHERE t.name = $target
+        RETURN s, r, t LIMIT {search_budget['relation_limit']}
+        """
+        return self.pool.run(query, source=source, target=target)
+
+    def _fetch_one_hop(self, entity_name: str, search_budget: Dict) -> Tuple[List[Dict], List[Dict]]:
+        """查询单个实体的第一跳相连实体（出边、入边），每种关系类型最多保留5条"""
+        query1 = f"""
+        MATCH (n)-[r]->(m)  
+        WHERE n.name = $name  
+        AND any(label IN labels(m) WHERE label IN ['Disease', 'Category', 'Symptom', 'Department', 'Treatment', 'Check', 'Drug', 'Food', 'Recipe'])  
+        RETURN n, r, m, type(r) AS rel_type  
+        LIMIT {search_budget['one_hop_limit']}  
+        """
+        query2 = f""" 
+        MATCH (n)<-[r]-(m)  
+        WHERE n.name = $name  
+        AND any(label IN labels(m) WHERE label IN ['Disease', 'Category', 'Symptom', 'Department', 'Treatment', 'Check', 'Drug', 'Food', 'Recipe'])  
+        RETURN n, r, m, type(r) AS rel_type  
+        LIMIT {search_budget['one_hop_limit']}
+        """
+        connected = []
+        for query in (query1, query2):
+            grouped = defaultdict(list)
+            for record in self.pool.run(query, name=entity_name):
+                rel_type = record['rel_type']
+                if len(grouped[rel_type]) < 5:
+                    grouped[rel_type].append(record)
+            # 再把所有分组的结果合并为最终结果
+            final_results = []
+            for rel_list in grouped.values():
+                final_results.extend(rel_list)
+            connected.append(final_results)
+        return connected[0], connected[1]
+
+    def _fetch_second_hop(self, entity_name: str, search_budget: Dict) -> List[Dict]:
+        """查询单个实体的第二跳相连实体"""
+        query = f"""
+        MATCH (n)-[r]->(m)
+        WHERE n.name = $name
+        AND any(label in labels(m) WHERE label in ['Disease', 'Category', 'Symptom', 'Department', 'Treatment', 'Check', 'Drug', 'Food', 'Recipe'])
+        RETURN n, r, m LIMIT {search_budget['multi_hop_limit']}
+        UNION  
+        MATCH (n)<-[r]-(m)  
+        WHERE n.name = $name  
+        AND any(label IN labels(m) WHERE label IN ['Disease', 'Category', 'Symptom', 'Department', 'Treatment', 'Check', 'Drug', 'Food', 'Recipe'])  
+        RETURN n, r, m  
+        LIMIT {search_budget['multi_hop_limit']}
+        """
+        return self.pool.run(query, name=entity_name)
+
+    def _fetch_batched(self, entities: List[Dict], relations: List[Dict], search_budget: Dict) -> Dict:
+        """一次往返批量查询实体属性、关系三元组和第一跳相连实体"""
+        record = self.pool.run(self.BATCHED_RETRIEVAL_QUERY,
+                               **self._batched_parameters(entities, relations, search_budget))[0]
+        return self._parse_batched_record(record)
+
+    def _fetch_second_hop_batched(self, entity_names: List[str], search_budget: Dict) -> Dict[str, List[Dict]]:
+        """一次往返批量查询多个实体的第二跳相连实体，返回 实体名称 -> 三元组列表"""
+        records = self.pool.run(self.BATCHED_SECOND_HOP_QUERY, names=list(dict.fromkeys(entity_names)),
+                                labels=self.GRAPH_LABELS, multi_hop_limit=search_budget['multi_hop_limit'])
+        return {record["name"]: record["records"] for record in records}
+
+    def query_neo4j(self, entities: List[Dict], relations: List[Dict],
+                    enable_multi_hop: bool = None, search_budget: Dict = None,
+                    retrieval_mode: str = None, execution_mode: str = None) -> Dict:
+        """
+        查询Neo4j数据库（每个阶段先收集候选文本，再通过一次批量请求获取向量并打分）
 
-    def query_neo4j(self, entities: List[Dict], relations: List[Dict]) -> Dict:
-        """查询Neo4j数据库"""
+        retrieval_mode 为 "standard" 时逐个实体/关系查询；为 "batched" 时实体属性、关系三元组和
+        第一跳通过一次 UNWIND 查询取回，第二跳再通过一次 UNWIND 查询取回，结果结构保持不变。
+        execution_mode 为 "concurrent" 时，每个阶段内相互独立的查询和向量请求通过线程池并发执行，
+        按原顺序汇总结果，超过 stage_timeout 的调用按出错处理。
+        """
+        enable_multi_hop = self.enable_multi_hop if enable_multi_hop is None else enable_multi_hop
+        search_budget = search_budget or self.search_budget
+        retrieval_mode = retrieval_mode or self.retrieval_mode
+        concurrent = (execution_mode or self.execution_mode) == "concurrent"
         self.console.print(Panel("[bold green]知识图谱查询[/bold green]", border_style="green", expand=False))
 
         result = {
@@ -390,14 +1049,44 @@ class Neo4jRAGSystem:
         processed_entities = set()
         # 存储需要进行多跳查询的实体及其相似度
         entities_for_multi_hop = []
-        # 获取问题的向量表示，用于计算实体相似度
-        question_embedding = self.get_embedding(
-            " ".join([e.get("name", "") for e in entities] + [r.get("type", "") for r in relations]))
+        # 获取问题的向量表示，用于计算实体相似度（并发模式下与第一阶段查询同时进行）
+        question_text = " ".join([e.get("name", "") for e in entities] + [r.get("type", "") for r in relations])
+        question_future = self._submit(self.get_embedding, question_text) if concurrent else None
+        if question_future is None:
+            stage_start = time.perf_counter()
+            question_embedding = self.get_embedding(question_text)
+            self._record_timing("问题向量", stage_start)
 
         with self.console.status("[bold blue]正在查询知识图谱...", spinner="dots") as status:
+            # 批量模式：一次往返取回实体属性、关系三元组和第一跳相连实体
+            prefetched = None
+            if retrieval_mode == "batched":
+                stage_start = time.perf_counter()
+                try:
+                    prefetched = self._fetch_batched(entities, relations, search_budget)
+                except Exception as e:
+                    self.console.print(f"批量查询失败，改为逐个查询: {str(e)}", style="yellow")
+                self._record_timing("批量查询", stage_start)
+            if prefetched is None and concurrent:
+                prefetched = {}
+
             # 1. 查询实体属性
+            stage_start = time.perf_counter()
             self.console.print("正在查询实体属性...", style="blue")
-            for entity in entities:
+            if concurrent and "entity_nodes" not in prefetched:
+                prefetched["entity_nodes"] = self._gather("查询实体属性", {
+                    idx: (self._fetch_entity_nodes, (entity["name"], entity.get("type", "Other"), search_budget))
+                    for idx, entity in enumerate(entities) if "name" in entity})
+            if question_future is not None:
+                try:
+                    question_embedding = question_future.result(timeout=self.stage_timeout)
+                except Exception as e:
+                    self.console.print(f"获取问题向量出错: {str(e)}", style="bold red")
+                    question_embedding = []
+            # 问题向量只归一化一次，各阶段候选向量统一通过矩阵运算打分
+            scorer = SimilarityScorer(question_embedding)
+            matched_entity_names = []
+            for idx, entity in enumerate(entities):
                 # 检查实体字典中是否包含必要的键
                 if "name" not in entity:
                     self.console.print(f"警告：实体缺少name属性: {entity}", style="yellow")
@@ -411,21 +1100,11 @@ class Neo4jRAGSystem:
 
                 self.console.print(f"查询实体: [cyan]{entity_name}[/cyan] ([magenta]{entity_type}[/magenta])")
 
-                # 根据节点类型构建查询
-                if entity_type == "Disease":
-                    query = f"""
-                    MATCH (n:Disease {{name: $name}})
-                    RETURN n LIMIT {self.search_budget['entity_limit']}
-                    """
-                else:
-                    query = f"""
-                    MATCH (n {{name: $name}})
-                    WHERE any(label in labels(n) WHERE label in ['Disease', 'Category', 'Symptom', 'Department', 'Treatment', 'Check', 'Drug', 'Food', 'Recipe'])
-                    RETURN n LIMIT {self.search_budget['entity_limit']}
-                    """
-
                 try:
-                    nodes = self.graph.run(query, name=entity_name).data()
+                    if prefetched is not None and "entity_nodes" in prefetched:
+                        nodes = self._take(prefetched["entity_nodes"], idx, [])
+                    else:
+                        nodes = self._fetch_entity_nodes(entity_name, entity_type, search_budget)
                     if nodes:
                         self.console.print(f"找到 [bold]{len(nodes)}[/bold] 个匹配实体")
                         for node in nodes:
@@ -437,21 +1116,32 @@ class Neo4jRAGSystem:
                                 "type": entity_type,
                                 "properties": properties
                             })
-                            # 计算实体与问题的相似度
-                            entity_embedding = self.get_embedding(entity_name)
-                            similarity = self.calculate_similarity(question_embedding, entity_embedding)
-                            # 添加到多跳查询候选列表
-                            entities_for_multi_hop.append({
-                                "name": entity_name,
-                                "similarity": similarity
-                            })
+                            # 添加到多跳查询候选列表，相似度在批量获取向量后计算
+                            matched_entity_names.append(entity_name)
                     else:
                         self.console.print(f"未找到实体: [cyan]{entity_name}[/cyan]", style="yellow")
                 except Exception as e:
                     self.console.print(f"查询实体属性出错: {str(e)}", style="bold red")
+            # 批量计算实体与问题的相似度
+            entity_scores = scorer.score(self.get_embeddings(matched_entity_names, parallel=concurrent))
+            for entity_name, similarity in zip(matched_entity_names, entity_scores):
+                entities_for_multi_hop.append({
+                    "name": entity_name,
+                    "similarity": float(similarity)
+                })
+            self._record_timing("实体属性", stage_start)
+
             # 2. 查询关系三元组
+            stage_start = time.perf_counter()
             self.console.print("正在查询关系三元组...", style="blue")
-            for relation in relations:
+            if concurrent and "relation_triples" not in prefetched:
+                prefetched["relation_triples"] = self._gather("查询关系三元组", {
+                    idx: (self._fetch_relation_triples, (relation["source"], relation["target"], search_budget))
+                    for idx, relation in enumerate(relations)
+                    if all(key in relation for key in ["source", "target", "type"])})
+            # 每个关系查询到的候选三元组，待批量获取向量后统一打分
+            relation_candidates = []
+            for idx, relation in enumerate(relations):
                 # 检查关系字典中是否包含必要的键
                 if not all(key in relation for key in ["source", "target", "type"]):
                     self.console.print(f"警告：关系缺少必要属性: {relation}", style="yellow")
@@ -461,106 +1151,81 @@ class Neo4jRAGSystem:
                 rel_type = relation["type"]
                 self.console.print(
                     f"  查询关系: [cyan]{source}[/cyan] --[yellow]{rel_type}[/yellow]--> [green]{target}[/green]")
-                # 获取关系类型的向量表示
-                rel_embedding = self.get_embedding(rel_type)
-                # 查询所有可能的关系三元组
-                query = f"""
-                MATCH (s)-[r]->(t)
-                WHERE s.name = $source
-                RETURN s, r, t LIMIT {self.search_budget['relation_limit']}
-                UNION
-                MATCH (s)-[r]->(t)
-                WHERE t.name = $target
-                RETURN s, r, t LIMIT {self.search_budget['relation_limit']}
-                """
-
                 try:
-                    triples = self.graph.run(query, source=source, target=target).data()
+                    # 查询所有可能的关系三元组
+                    if prefetched is not None and "relation_triples" in prefetched:
+                        triples = self._take(prefetched["relation_triples"], idx, [])
+                    else:
+                        triples = self._fetch_relation_triples(source, target, search_budget)
                     if triples:
                         self.console.print(f"找到 [bold]{len(triples)}[/bold] 个匹配三元组")
-                        # 计算相似度并排序
-                        scored_triples = []
+                        candidates = []
                         for triple_data in triples:  # Renamed to avoid conflict with outer 'triple'
-                            # 获取关系的向量表示
                             current_rel_type = type(triple_data["r"]).__name__
                             current_entity_name = triple_data["s"].get("name") or triple_data["t"].get("name", "")
-                            current_embedding = self.get_embedding(f"{current_entity_name} {current_rel_type}")
-                            # 计算相似度
-                            similarity = self.calculate_similarity(question_embedding, current_embedding)
-                            scored_triples.append({
-                                "similarity": similarity,
+                            candidates.append({
+                                "text": f"{current_entity_name} {current_rel_type}",
                                 "source": dict(triple_data["s"]),
                                 "relation": current_rel_type,
                                 "target": dict(triple_data["t"])
                             })
-
-                        # 按相似度排序
-                        scored_triples.sort(key=lambda x: x["similarity"], reverse=True)
-
-                        # 添加相似度最高的三元组
-                        if scored_triples:
-                            # 添加相似度最高的前k个三元组
-                            top_triples = scored_triples[:self.search_budget['top_k_triples']]
-                            for idx, top_triple_item in enumerate(top_triples):  # Renamed to avoid conflict
-                                result["related_triples"].append(top_triple_item)
-                                source_name = top_triple_item['source'].get('name', '')
-                                target_name = top_triple_item['target'].get('name', '')
-
-                                self.console.print(
-                                    f"匹配 #{idx + 1}: [cyan]{source_name}[/cyan] --[yellow]{top_triple_item['relation']}[/yellow]--> [green]{target_name}[/green] (相似度: {top_triple_item['similarity']:.2f})"
-                                )
+                        relation_candidates.append((relation, candidates))
                     else:
                         self.console.print(f"未找到关系三元组", style="yellow")
 
                 except Exception as e:
                     self.console.print(f"查询关系三元组出错: {str(e)}", style="bold red")
 
+            # 批量获取所有候选三元组的向量表示
+            triple_texts = [c["text"] for _, candidates in relation_candidates for c in candidates]
+            triple_embeddings = self.get_embeddings(triple_texts, parallel=concurrent)
+            offset = 0
+            for relation, candidates in relation_candidates:
+                # 计算相似度并选出相似度最高的前k个三元组
+                indices, scores = scorer.top_k(triple_embeddings[offset:offset + len(candidates)],
+                                               search_budget['top_k_triples'])
+                offset += len(candidates)
+                top_triples = [{
+                    "similarity": float(similarity),
+                    "source": candidates[i]["source"],
+                    "relation": candidates[i]["relation"],
+                    "target": candidates[i]["target"]
+                } for i, similarity in zip(indices, scores)]
+
+                self.console.print(
+                    f"  关系 [cyan]{relation['source']}[/cyan] --[yellow]{relation['type']}[/yellow]--> [green]{relation['target']}[/green] 的匹配结果:")
+                for idx, top_triple_item in enumerate(top_triples):  # Renamed to avoid conflict
+                    result["related_triples"].append(top_triple_item)
+                    source_name = top_triple_item['source'].get('name', '')
+                    target_name = top_triple_item['target'].get('name', '')
+
+                    self.console.print(
+                        f"匹配 #{idx + 1}: [cyan]{source_name}[/cyan] --[yellow]{top_triple_item['relation']}[/yellow]--> [green]{target_name}[/green] (相似度: {top_triple_item['similarity']:.2f})"
+                    )
+
+            self._record_timing("关系三元组", stage_start)
+
             # 3. 查询与实体相连的其他实体（第一跳）
+            stage_start = time.perf_counter()
             self.console.print("正在查询相连实体（第一跳）...", style="blue")
-            for entity in entities:
+            if concurrent and "one_hop" not in prefetched:
+                prefetched["one_hop"] = self._gather("查询第一跳相连实体", {
+                    idx: (self._fetch_one_hop, (entity["name"], search_budget))
+                    for idx, entity in enumerate(entities) if "name" in entity})
+            # 第一跳新发现的实体，待批量获取向量后计算相似度
+            one_hop_names = []
+            for idx, entity in enumerate(entities):
                 # 检查实体字典中是否包含必要的键
                 if "name" not in entity:
                     continue
                 entity_name = entity.get("name")
                 self.console.print(f"  查询与 [cyan]{entity_name}[/cyan] 相连的实体")
-                # 查询与该实体相连的所有其他实体
-                query1 = f"""
-                MATCH (n)-[r]->(m)  
-                WHERE n.name = $name  
-                AND any(label IN labels(m) WHERE label IN ['Disease', 'Category', 'Symptom', 'Department', 'Treatment', 'Check', 'Drug', 'Food', 'Recipe'])  
-                RETURN n, r, m, type(r) AS rel_type  
-                LIMIT {self.search_budget['one_hop_limit']}  
-                """
-                query2 = f""" 
-                MATCH (n)<-[r]-(m)  
-                WHERE n.name = $name  
-                AND any(label IN labels(m) WHERE label IN ['Disease', 'Category', 'Symptom', 'Department', 'Treatment', 'Check', 'Drug', 'Food', 'Recipe'])  
-                RETURN n, r, m, type(r) AS rel_type  
-                LIMIT {self.search_budget['one_hop_limit']}
-                """
                 try:
-                    results1 = self.graph.run(query1, name=entity_name).data()
-                    grouped = defaultdict(list)
-                    for record in results1:
-                        rel_type = record['rel_type']
-                        if len(grouped[rel_type]) < 5:
-                            grouped[rel_type].append(record)
-                            # 再把所有分组的结果合并为最终结果
-                    final_results1 = []
-                    for rel_list in grouped.values():
-                        final_results1.extend(rel_list)
-                    connected_triples1 = final_results1
-                    results2 = self.graph.run(query2, name=entity_name).data()
-                    grouped = defaultdict(list)
-                    for record in results2:
-                        rel_type = record['rel_type']
-                        if len(grouped[rel_type]) < 5:
-                            grouped[rel_type].append(record)
-                            # 再把所有分组的结果合并为最终结果
-                    final_results2 = []
-                    for rel_list in grouped.values():
-                        final_results2.extend(rel_list)
-                    connected_triples2 = final_results2
+                    # 查询与该实体相连的所有其他实体（出边、入边，每种关系最多5条）
+                    if prefetched is not None and "one_hop" in prefetched:
+                        connected_triples1, connected_triples2 = self._take(prefetched["one_hop"], idx, ([], []))
+                    else:
+                        connected_triples1, connected_triples2 = self._fetch_one_hop(entity_name, search_budget)
                     if connected_triples1 or connected_triples2:
                         self.console.print(f"找到 [bold]{len(connected_triples1)}[/bold] 个相连实体")
                         self.console.print(f"找到 [bold]{len(connected_triples2)}[/bold] 个被相连实体")
@@ -578,15 +1243,10 @@ class Neo4jRAGSystem:
                             # 获取实体名称
                             source_name = triple["n"].get("name", "未知")
                             target_name = triple["m"].get("name", "未知")
-                            # 如果目标实体未处理过，计算其与问题的相似度
+                            # 如果目标实体未处理过，记录下来稍后计算其与问题的相似度
                             if target_name not in processed_entities:
                                 processed_entities.add(target_name)
-                                target_embedding = self.get_embedding(target_name)
-                                target_similarity = self.calculate_similarity(question_embedding, target_embedding)
-                                entities_for_multi_hop.append({
-                                    "name": target_name,
-                                    "similarity": target_similarity
-                                })
+                                one_hop_names.append(target_name)
 
                             self.console.print(
                                 f"相连实体: [cyan]{source_name}[/cyan] --[yellow]{rel_type}[/yellow]--> [green]{target_name}[/green]")
@@ -604,15 +1264,10 @@ class Neo4jRAGSystem:
                             # 获取实体名称
                             source_name = triple["m"].get("name", "未知")
                             target_name = triple["n"].get("name", "未知")
-                            # 如果目标实体未处理过，计算其与问题的相似度
+                            # 如果目标实体未处理过，记录下来稍后计算其与问题的相似度
                             if target_name not in processed_entities:
                                 processed_entities.add(target_name)
-                                target_embedding = self.get_embedding(target_name)
-                                target_similarity = self.calculate_similarity(question_embedding, target_embedding)
-                                entities_for_multi_hop.append({
-                                    "name": target_name,
-                                    "similarity": target_similarity
-                                })
+                                one_hop_names.append(target_name)
                             self.console.print(
                                 f"相连实体: [cyan]{source_name}[/cyan] --[yellow]{rel_type}[/yellow]--> [green]{target_name}[/green]")
                     else:
@@ -620,69 +1275,91 @@ class Neo4jRAGSystem:
 
                 except Exception as e:
                     self.console.print(f"查询相连实体出错: {str(e)}", style="bold red")
+            # 批量计算第一跳实体与问题的相似度
+            one_hop_scores = scorer.score(self.get_embeddings(one_hop_names, parallel=concurrent))
+            for target_name, similarity in zip(one_hop_names, one_hop_scores):
+                entities_for_multi_hop.append({
+                    "name": target_name,
+                    "similarity": float(similarity)
+                })
+            self._record_timing("第一跳", stage_start)
 
             # 4. 多跳查询 - 选择相似度最高的前10个实体进行第二跳查询
-            if self.enable_multi_hop and entities_for_multi_hop:
-                # 按相似度排序并选择前10个
-                entities_for_multi_hop.sort(key=lambda x: x["similarity"], reverse=True)
-                top_entities = entities_for_multi_hop[:self.search_budget['top_k_multi_hop_entities']]
+            if enable_multi_hop and entities_for_multi_hop:
+                stage_start = time.perf_counter()
+                # 按相似度选择前k个
+                top_indices = rank_scores([e["similarity"] for e in entities_for_multi_hop],
+                                          search_budget['top_k_multi_hop_entities'])
+                top_entities = [entities_for_multi_hop[i] for i in top_indices]
                 self.console.print(
                     Panel("[bold yellow]多跳查询（第二跳）[/bold yellow]", border_style="yellow", expand=False))
                 self.console.print("选择以下实体进行第二跳查询:", style="blue")
                 for idx, entity in enumerate(top_entities):
                     self.console.print(
                         f"  {idx + 1}. [cyan]{entity['name']}[/cyan] (相似度: {entity['similarity']:.2f})")
+                # 第二跳新发现的三元组，待批量获取向量后计算相似度
+                second_hop_triples = []
+                second_hop_prefetched = None
+                if retrieval_mode == "batched":
+                    try:
+                        second_hop_prefetched = self._fetch_second_hop_batched(
+                            [entity["name"] for entity in top_entities], search_budget)
+                    except Exception as e:
+                        self.console.print(f"批量第二跳查询失败，改为逐个查询: {str(e)}", style="yellow")
+                if second_hop_prefetched is None and concurrent:
+                    second_hop_prefetched = self._gather("查询第二跳相连实体", {
+                        entity["name"]: (self._fetch_second_hop, (entity["name"], search_budget))
+                        for entity in top_entities})
                 # 对每个高相似度实体进行第二跳查询
                 for entity in top_entities:
                     entity_name = entity["name"]
                     self.console.print(f"  查询与 [cyan]{entity_name}[/cyan] 相连的实体（第二跳）")
-                    # 查询与该实体相连的所有其他实体
-                    query = f"""
-                    MATCH (n)-[r]->(m)
-                    WHERE n.name = $name
-                    AND any(label in labels(m) WHERE label in ['Disease', 'Category', 'Symptom', 'Department', 'Treatment', 'Check', 'Drug', 'Food', 'Recipe'])
-                    RETURN n, r, m LIMIT {self.search_budget['multi_hop_limit']}
-                    UNION  
-                    MATCH (n)<-[r]-(m)  
-                    WHERE n.name = $name  
-                    AND any(label IN labels(m) WHERE label IN ['Disease', 'Category', 'Symptom', 'Department', 'Treatment', 'Check', 'Drug', 'Food', 'Recipe'])  
-                    RETURN n, r, m  
-                    LIMIT {self.search_budget['multi_hop_limit']}
-                    """
                     try:
-                        connected_triples = self.graph.run(query, name=entity_name).data()
+                        # 查询与该实体相连的所有其他实体
+                        if second_hop_prefetched is not None:
+                            connected_triples = self._take(second_hop_prefetched, entity_name, [])
+                        else:
+                            connected_triples = self._fetch_second_hop(entity_name, search_budget)
                         if connected_triples:
                             self.console.print(f"找到 [bold]{len(connected_triples)}[/bold] 个相连实体（第二跳）")
                             for triple in connected_triples:
-                                # 获取关系的向量表示
-                                rel_type = type(triple["r"]).__name__
                                 # 获取实体名称
-                                source_name = triple["n"].get("name", "未知")
                                 target_name = triple["m"].get("name", "未知")
-                                # 如果目标实体未处理过，则添加到结果
+                                # 如果目标实体未处理过，则添加到候选
                                 if target_name not in processed_entities:
                                     processed_entities.add(target_name)
-                                    # 计算与问题的相似度
-                                    target_embedding = self.get_embedding(target_name)
-                                    target_similarity = self.calculate_similarity(question_embedding, target_embedding)
-                                    # 添加到结果
-                                    result["related_triples"].append({
-                                        "similarity": target_similarity,
-                                        "source": dict(triple["n"]),
-                                        "relation": rel_type,
-                                        "target": dict(triple["m"]),
-                                        "hop": 2  # 标记为第二跳查询结果
-                                    })
-                                    self.console.print(
-                                        f"第二跳实体: [cyan]{source_name}[/cyan] --[yellow]{rel_type}[/yellow]--> [green]{target_name}[/green] (相似度: {target_similarity:.2f})")
+                                    second_hop_triples.append(triple)
                         else:
                             self.console.print(f"未找到第二跳相连实体", style="yellow")
 
                     except Exception as e:
                         self.console.print(f"查询第二跳实体出错: {str(e)}", style="bold red")
 
+                # 批量计算第二跳实体与问题的相似度
+                second_hop_names = [triple["m"].get("name", "未知") for triple in second_hop_triples]
+                second_hop_indices, second_hop_scores = scorer.top_k(
+                    self.get_embeddings(second_hop_names, parallel=concurrent))
+                for i, target_similarity in zip(second_hop_indices, second_hop_scores):
+                    triple = second_hop_triples[i]
+                    rel_type = type(triple["r"]).__name__
+                    source_name = triple["n"].get("name", "未知")
+                    target_name = triple["m"].get("name", "未知")
+                    target_similarity = float(target_similarity)
+                    # 添加到结果
+                    result["related_triples"].append({
+                        "similarity": target_similarity,
+                        "source": dict(triple["n"]),
+                        "relation": rel_type,
+                        "target": dict(triple["m"]),
+                        "hop": 2  # 标记为第二跳查询结果
+                    })
+                    self.console.print(
+                        f"第二跳实体: [cyan]{source_name}[/cyan] --[yellow]{rel_type}[/yellow]--> [green]{target_name}[/green] (相似度: {target_similarity:.2f})")
+                self._record_timing("第二跳", stage_start)
+
             # 5. 按相似度排序所有关系三元组
-            result["related_triples"].sort(key=lambda x: x["similarity"], reverse=True)
+            result["related_triples"] = [result["related_triples"][i] for i in
+                                         rank_scores([t["similarity"] for t in result["related_triples"]])]
 
             # 显示查询结果摘要
             self.console.print("知识图谱查询完成!", style="bold green")
@@ -690,120 +1367,162 @@ class Neo4jRAGSystem:
                 f"查询结果: {len(result['entity_properties'])} 个实体, {len(result['related_triples'])} 个关系三元组",
                 style="bold blue")
             # 统计多跳查询的结果
-            if self.enable_multi_hop:
+            if enable_multi_hop:
                 second_hop_count = sum(1 for triple in result["related_triples"] if triple.get("hop") == 2)
                 if second_hop_count > 0:
                     self.console.print(f"其中包含 {second_hop_count} 个第二跳查询结果", style="bold yellow")
         return result
 
-    def generate_answer(self, question: str, knowledge: Dict) -> str:
-        """生成答案"""
+    def generate_answer(self, question: str, knowledge: Dict,
+                        on_delta: Optional[Callable[[str], None]] = None) -> str:
+        """生成答案（提供 on_delta 时流式生成，每段增量文本回调一次）"""
         self.console.print(Panel("[bold purple]生成回答[/bold purple]", border_style="purple", expand=False))
 
         with self.console.status("[bold green]正在生成回答...", spinner="dots") as status:
             try:
-                # 限制知识图谱信息的数量以避免提示词过长
-                max_entities = 10  # 最多10个实体
-                max_triples = 20  # 最多20个关系三元组
-                # 截取实体属性信息
-                limited_entities = knowledge['entity_properties'][:max_entities]
-                # 截取关系三元组信息（按相似度排序，取前20个）
-                limited_triples = knowledge['related_triples'][:max_triples]
-                # 简化实体和关系信息的表示
-                entities_summary = []
-                for entity in limited_entities:
-                    # 只保留关键属性，简化信息
-                    simplified_entity = {
-                        "name": entity.get("name", ""),
-                        "type": entity.get("type", ""),
-                        "key_properties": {k: v for k, v in entity.get("properties", {}).items()
-                                           if k in ["name", "description", "category", "type"] and len(str(v)) < 100}
-                    }
-                    entities_summary.append(simplified_entity)
-                triples_summary = []
-                for triple in limited_triples:
-                    # 简化关系三元组表示
-                    simplified_triple = {
-                        "source": triple.get("source", {}).get("name", ""),
-                        "relation": triple.get("relation", ""),
-                        "target": triple.get("target", {}).get("name", ""),
-                        "similarity": round(triple.get("similarity", 0.0), 2)
-                    }
-                    triples_summary.append(simplified_triple)
-                # 构建简化的提示词
-                full_prompt = f"""{self.answer_generation_prompt}
-                问题：{question}
-                
-                知识图谱信息：
-                相关实体（共{len(entities_summary)}个）：
-                {json.dumps(entities_summary, ensure_ascii=False, indent=2)}
-                
-                相关关系（共{len(triples_summary)}个，按相似度排序）：
-                {json.dumps(triples_summary, ensure_ascii=False, indent=2)}
-                
-                请基于以上医学知识图谱信息回答问题。如果信息不足以回答问题，请说明。"""
-                # 检查提示词长度
-                prompt_length = len(full_prompt)
-                self.console.print(f"提示词长度: {prompt_length:,} 字符", style="blue")
-                # 如果提示词仍然太长，进一步缩减
-                if prompt_length > 8000:  # 设置一个安全阈值
-                    self.console.print("提示词过长，进一步缩减信息...", style="yellow")
-                    # 进一步减少数量
-                    max_entities = 5
-                    max_triples = 10
-                    limited_entities = knowledge['entity_properties'][:max_entities]
-                    limited_triples = knowledge['related_triples'][:max_triples]
-                    # 重新构建更简化的提示词
-                    entities_text = "; ".join([f"{e.get('name', '')}({e.get('type', '')})" for e in limited_entities])
-                    triples_text = "; ".join([
-                        f"{t.get('source', {}).get('name', '')}-{t.get('relation', '')}-{t.get('target', {}).get('name', '')}"
-                        for t in limited_triples])
-
-                    full_prompt = f"""{self.answer_generation_prompt}
-                    问题：{question} 
-                    知识图谱信息：
-                    相关实体：{entities_text}
-                    相关关系：{triples_text}
-                    
-                    请基于以上医学知识图谱信息回答问题。"""
-                    self.console.print(f"缩减后提示词长度: {len(full_prompt):,} 字符", style="blue")
+                full_prompt = self._build_answer_prompt(question, knowledge)
                 self.console.print("阿里云通义千问思考中...", style="blue")
                 # 调用阿里云通义千问API
-                answer = self.call_llm(full_prompt)
+                if on_delta is None:
+                    answer = self.call_llm(full_prompt)
+                else:
+                    stage_start = time.perf_counter()
+                    first_delta = []
+
+                    def forward(delta: str):
+                        if not first_delta:
+                            first_delta.append(delta)
+                            self._record_timing("首字延迟", stage_start)
+                        on_delta(delta)
+                    answer = self.call_llm(full_prompt, on_delta=forward)
                 self.console.print("回答生成完成!", style="bold green")
                 return answer
 
             except Exception as e:
                 self.console.print(f"生成答案出错: {str(e)}", style="bold red")
-                return "抱歉，我无法回答这个问题。"
-
-    def answer_question(self, question: str) -> str:
-        """回答问题的主函数"""
-        # 1. 提取实体和关系
-        self.console.print(Panel(f"[bold]问题[/bold]: {question}",
-                                 title="医学知识图谱问答系统",
-                                 border_style="cyan",
-                                 expand=False))
+                return FALLBACK_ANSWER
+
+    def answer_question(self, question: str, enable_multi_hop: bool = None,
+                        search_budget_mode: str = None, console: Console = None,
+                        retrieval_mode: str = None, execution_mode: str = None,
+                        on_delta: Optional[Callable[[str], None]] = None) -> str:
+        """
+        回答问题的主函数
+        Args:
+            question: 用户问题
+            enable_multi_hop: 本次调用是否启用多跳查询，默认使用初始化时的设置
+            search_budget_mode: 本次调用的搜索预算模式，默认使用初始化时的设置
+            console: 本次调用输出日志的控制台，默认使用全局控制台
+            retrieval_mode: 本次调用的图谱检索模式（standard / batched），默认使用初始化时的设置
+            execution_mode: 本次调用的执行模式（sequential / concurrent），默认使用初始化时的设置
+            on_delta: 答案增量文本回调，提供时答案以流式模式生成
+        """
+        previous_console = getattr(self._local, "console", None)
+        if console is not None:
+            self._local.console = console
+        self._local.timings = {}
+        try:
+            search_budget = self._resolve_search_budget(search_budget_mode) if search_budget_mode else None
+            variant = self._answer_cache_variant(enable_multi_hop, search_budget)
 
-        extraction_result = self.extract_entities_relations(question)
+            self.console.print(Panel(f"[bold]问题[/bold]: {question}",
+                                     title="医学知识图谱问答系统",
+                                     border_style="cyan",
+                                     expand=False))
 
-        # 2. 查询Neo4j数据库
-        knowledge = self.query_neo4j(
-            extraction_result["entities"],
-            extraction_result["relations"]
-        )
+            # 0. 查询答案缓存（精确匹配）
+            question_embedding = None
+            if self.enable_answer_cache or self.enable_dictionary_extraction:
+                self._refresh_graph_version()
+            if self.enable_answer_cache:
+                stage_start = time.perf_counter()
+                cached_answer = self.answer_cache.get_exact(question, variant)
+                self._record_timing("答案缓存", stage_start)
+                if cached_answer is not None:
+                    self.console.print("命中答案缓存（精确匹配）", style="bold green")
+                    self._show_cached_answer(cached_answer, on_delta)
+                    self._print_timings(self._local.timings)
+                    return cached_answer
 
-        # 3. 生成答案
-        answer = self.generate_answer(question, knowledge)
+            # 1. 提取实体和关系
+            stage_start = time.perf_counter()
+            extraction_result = self.answer_cache.get_extraction(question) if self.enable_answer_cache else None
+            if extraction_result is not None:
+                self.console.print(
+                    f"命中抽取缓存: {len(extraction_result['entities'])} 个实体, "
+                    f"{len(extraction_result['relations'])} 个关系", style="bold green")
+            else:
+                extraction_result = self.extract_entities_relations(question)
+                if self.enable_answer_cache:
+                    self.answer_cache.put_extraction(question, extraction_result)
+            self._record_timing("实体抽取", stage_start)
 
-        # 4. 展示答案
-        self.console.print(Panel(Markdown(answer),
-                                 title="回答",
-                                 border_style="green",
-                                 expand=False))
+            # 按问题向量做语义匹配（抽取出的实体必须相同，避免返回另一种疾病的答案）
+            if self.enable_answer_cache and extraction_result["entities"]:
+                stage_start = time.perf_counter()
+                question_embedding = self.get_embedding(question)
+                cached_answer = self._lookup_semantic_answer(question_embedding, variant,
+                                                             extraction_result["entities"])
+                self._record_timing("答案缓存", stage_start)
+                if cached_answer is not None:
+                    self._show_cached_answer(cached_answer, on_delta)
+                    self._print_timings(self._local.timings)
+                    return cached_answer
+
+            # 2. 查询Neo4j数据库
+            stage_start = time.perf_counter()
+            knowledge = self.query_neo4j(
+                extraction_result["entities"],
+                extraction_result["relations"],
+                enable_multi_hop=enable_multi_hop,
+                search_budget=search_budget,
+                retrieval_mode=retrieval_mode,
+                execution_mode=execution_mode
+            )
+            self._record_timing("知识图谱查询", stage_start)
 
-        return answer
+            # 3. 生成答案
+            stage_start = time.perf_counter()
+            answer = self.generate_answer(question, knowledge, on_delta=on_delta)
+            self._record_timing("答案生成", stage_start)
+            if self.enable_answer_cache and answer != FALLBACK_ANSWER:
+                self.answer_cache.put_answer(question, answer, question_embedding, variant, extraction_result["entities"])
 
+            # 4. 展示答案
+            self.console.print(Panel(Markdown(answer),
+                                     title="回答",
+                                     border_style="green",
+                                     expand=False))
+            self._print_timings(self._local.timings)
+
+            return answer
+        finally:
+            self._local.console = previous_console
+            self._local.timings = None
+
+    def _refresh_graph_version(self):
+        """按检查间隔读取图谱版本号，图谱重新导入后答案缓存随之失效、实体词典随之增量更新"""
+        if not self.answer_cache.needs_version_check():
+            return
+        try:
+            records = self.pool.run(GRAPH_VERSION_QUERY)
+            version = records[0]["version"] if records else ""
+            self.answer_cache.set_graph_version(version)
+            if self._entity_dictionary_stale(version):
+                self._report_dictionary_update(self.entity_dictionary.update(
+                    self.pool.run(self.ENTITY_NAMES_QUERY, labels=self.GRAPH_LABELS), version))
+        except Exception as e:
+            self.console.print(f"读取图谱版本号出错: {str(e)}", style="yellow")
+
+    def health(self) -> Dict:
+        """获取系统健康状态与运行指标"""
+        return {
+            "neo4j": self.pool.health_check(),
+            "pool": self.pool.metrics(),
+            "embedding_cache": self.embedding_cache.stats(),
+            "answer_cache": self.answer_cache.stats(),
+            "entity_dictionary": self.entity_dictionary.stats()
+        }
 
 def main():
     # 设置命令行参数解析器
@@ -817,7 +1536,20 @@ def main():
                         help="禁用多跳查询功能 (默认为启用)")
     parser.add_argument("--search_budget", type=str, default="Deeper", choices=["Deeper", "Deep"],
                         help="设置搜索预算模式 (Deeper, Deep)，默认为 Deeper")
-    parser.set_defaults(enable_multi_hop=True)
+    parser.add_argument("--pool_size", type=int, default=int(os.getenv("NEO4J_POOL_SIZE", "8")),
+                        help="Neo4j连接池大小")
+    parser.add_argument("--retrieval_mode", type=str, default="standard", choices=["standard", "batched"],
+                        help="图谱检索模式：standard 逐个查询，batched 使用 UNWIND 批量查询（1~2 次往返）")
+    parser.add_argument("--execution_mode", type=str, default="sequential", choices=["sequential", "concurrent"],
+                        help="执行模式：sequential 串行执行，concurrent 通过线程池并发执行各阶段内的独立查询")
+    parser.add_argument("--stage_timeout", type=float, default=15.0, help="并发模式下每个阶段的超时时间（秒）")
+    parser.add_argument("--disable_answer_cache", action="store_false", dest="enable_answer_cache",
+                        help="禁用答案缓存（精确匹配、语义相似和抽取结果缓存）")
+    parser.add_argument("--disable_dictionary_extraction", action="store_false", dest="enable_dictionary_extraction",
+                        help="禁用实体词典，所有问题均由LLM抽取实体和关系")
+    parser.add_argument("--warm_up_cache", action="store_true",
+                        help="预热向量缓存（加载图谱中所有节点名称的向量）后退出")
+    parser.set_defaults(enable_multi_hop=True, enable_answer_cache=True, enable_dictionary_extraction=True)
     args = parser.parse_args()
 
     # 打印欢迎信息
@@ -838,9 +1570,19 @@ def main():
         neo4j_user=args.neo4j_user,
         neo4j_password=args.neo4j_password,
         enable_multi_hop=args.enable_multi_hop,
-        search_budget_mode=args.search_budget
+        search_budget_mode=args.search_budget,
+        pool_size=args.pool_size,
+        retrieval_mode=args.retrieval_mode,
+        execution_mode=args.execution_mode,
+        stage_timeout=args.stage_timeout,
+        enable_answer_cache=args.enable_answer_cache,
+        enable_dictionary_extraction=args.enable_dictionary_extraction
     )
 
+    if args.warm_up_cache:
+        rag_system.warm_up_embedding_cache()
+        return
+
     console.print(
         f"基于医学知识图谱的问答系统已启动。多跳查询已{'[bold green]启用[/bold green]' if args.enable_multi_hop else '[bold red]禁用[/bold red]'}。搜索预算: [bold magenta]{args.search_budget}[/bold magenta]。输入'退出'结束对话。",
         style="bold green")
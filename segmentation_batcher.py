@@ -0,0 +1,181 @@
+"""
+分割批处理模块 - 在上传接口与 FastSAM 模型之间做动态微批
+
+并发上传的图像先进入队列，按 letterbox 后的输入尺寸与推理参数分组，
+凑满最大批大小或等待超过最长等待时间后，合并为一次 FastSAMPredictor 前向推理，再把各自的 Results 分发回等待的调用方。
+队列有长度上限（超过时直接拒绝，由调用方返回"服务繁忙"），并统计队列深度、批大小和等待时间。
+"""
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+
+class SegmentationQueueFull(Exception):
+    """分割队列已满（背压），调用方应稍后重试"""
+
+
+def letterbox_shape(height: int, width: int, imgsz: int, stride: int = 32) -> Tuple[int, int]:
+    """计算图像经 LetterBox(auto=True) 后的输入尺寸（与 BasePredictor.pre_transform 的计算方式一致）"""
+    r = min(imgsz / height, imgsz / width)
+    new_w, new_h = int(round(width * r)), int(round(height * r))
+    return new_h + (imgsz - new_h) % stride, new_w + (imgsz - new_w) % stride
+
+
+class _SegmentRequest:
+    """队列中的单个分割请求"""
+
+    __slots__ = ("image", "key", "future", "enqueued_at")
+
+    def __init__(self, image: np.ndarray, key: Tuple, future: Future):
+        self.image = image
+        self.key = key
+        self.future = future
+        self.enqueued_at = time.perf_counter()
+
+
+class SegmentationBatcher:
+    """动态微批调度器
+
+    单个后台线程负责取批与推理：以队首请求为基准，等待同组（相同输入尺寸与推理参数）的请求凑满
+    max_batch_size 或等待超过 max_wait_ms 后出队，保证同一批的 letterbox 结果尺寸一致、可以直接堆叠。
+    """
+
+    def __init__(self, model, device=None, max_batch_size: int = 4, max_wait_ms: float = 20.0,
+                 max_queue_size: int = 16, stride: int = 32):
+        """
+        初始化批处理调度器
+        Args:
+            model: 已加载的 FastSAM 模型（复用其常驻预测器）
+            device: 推理设备
+            max_batch_size: 单次前向推理的最大图像数
+            max_wait_ms: 队首请求为凑批最多等待的时间（毫秒）
+            max_queue_size: 队列中允许排队的最大请求数，超过时拒绝新请求
+            stride: 模型最大步长（用于计算 letterbox 尺寸）
+        """
+        self.model = model
+        self.device = device
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_queue_size = max_queue_size
+        self.stride = stride
+        self._pending = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self.counters = {"submitted": 0, "completed": 0, "failed": 0, "rejected": 0,
+                         "batches": 0, "batched_images": 0, "peak_queue_depth": 0}
+        self._total_wait = 0.0
+        self._total_inference = 0.0
+        self._thread = threading.Thread(target=self._loop, name="segmentation-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, image, imgsz: int = 1024, conf: float = 0.25, iou: float = 0.7,
+               retina_masks: bool = True) -> Future:
+        """
+        提交一张图像，返回 Future（结果为该图像的 Results，未检测到目标时为 None）
+        Raises:
+            SegmentationQueueFull: 队列已满
+        """
+        if isinstance(image, Image.Image):
+            # 与 LoadPilAndNumpy 相同：PIL(RGB) -> numpy(BGR)
+            image = np.ascontiguousarray(np.asarray(image.convert("RGB"))[:, :, ::-1])
+        shape = letterbox_shape(image.shape[0], image.shape[1], imgsz, self.stride)
+        request = _SegmentRequest(image, (shape, imgsz, conf, iou, retina_masks), Future())
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("分割批处理调度器已关闭")
+            if len(self._pending) >= self.max_queue_size:
+                self.counters["rejected"] += 1
+                raise SegmentationQueueFull(f"分割队列已满（{self.max_queue_size}），请稍后重试")
+            self._pending.append(request)
+            self.counters["submitted"] += 1
+            self.counters["peak_queue_depth"] = max(self.counters["peak_queue_depth"], len(self._pending))
+            self._cond.notify()
+        return request.future
+
+    def segment(self, image, timeout: Optional[float] = None, **params):
+        """同步提交并等待结果"""
+        return self.submit(image, **params).result(timeout)
+
+    def _next_batch(self) -> Optional[List[_SegmentRequest]]:
+        """取出下一批请求；调度器关闭且队列为空时返回 None"""
+        with self._cond:
+            while not self._pending and not self._closed:
+                self._cond.wait()
+            if not self._pending:
+                return None
+            first = self._pending[0]
+            deadline = first.enqueued_at + self.max_wait
+            while True:
+                group = [r for r in self._pending if r.key == first.key]
+                remaining = deadline - time.perf_counter()
+                if len(group) >= self.max_batch_size or remaining <= 0 or self._closed:
+                    break
+                self._cond.wait(remaining)
+            batch = group[:self.max_batch_size]
+            for request in batch:
+                self._pending.remove(request)
+            return batch
+
+    def _run_batch(self, batch: List[_SegmentRequest]):
+        """对一批请求执行一次前向推理并分发结果"""
+        _, imgsz, conf, iou, retina_masks = batch[0].key
+        started = time.perf_counter()
+        try:
+            results = self.model([r.image for r in batch], device=self.device, retina_masks=retina_masks,
+                                 imgsz=imgsz, conf=conf, iou=iou)
+            if results is None:
+                raise RuntimeError("FastSAM 推理失败")
+        except Exception as e:
+            for request in batch:
+                request.future.set_exception(e)
+            with self._cond:
+                self.counters["failed"] += len(batch)
+            return
+        elapsed = time.perf_counter() - started
+        for i, request in enumerate(batch):
+            # 整批都没有检测到目标时 postprocess 返回空列表；单张没有目标时其 Results 不带 masks
+            result = results[i] if results else None
+            request.future.set_result(result if result is not None and result.masks is not None else None)
+        with self._cond:
+            self.counters["batches"] += 1
+            self.counters["batched_images"] += len(batch)
+            self.counters["completed"] += len(batch)
+            self._total_wait += sum(started - r.enqueued_at for r in batch)
+            self._total_inference += elapsed
+
+    def _loop(self):
+        """后台线程主循环"""
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            self._run_batch(batch)
+
+    def close(self, timeout: Optional[float] = None):
+        """停止接收新请求，处理完队列中剩余的请求后退出后台线程"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+
+    def stats(self) -> Dict:
+        """获取调度器统计信息（队列深度、批大小、平均等待与推理时间、吞吐）"""
+        with self._cond:
+            batches = self.counters["batches"]
+            images = self.counters["batched_images"]
+            return dict(
+                self.counters,
+                queue_depth=len(self._pending),
+                max_batch_size=self.max_batch_size,
+                max_wait_ms=self.max_wait * 1000,
+                max_queue_size=self.max_queue_size,
+                avg_batch_size=images / batches if batches else 0.0,
+                avg_wait_ms=self._total_wait / images * 1000 if images else 0.0,
+                avg_batch_latency_ms=self._total_inference / batches * 1000 if batches else 0.0,
+                images_per_sec=images / self._total_inference if self._total_inference else 0.0
+            )
@@ -0,0 +1,173 @@
+"""
+分割会话缓存模块 - 缓存每张图像的 FastSAM 推理结果，供后续点/框/文本提示直接复用
+
+一次上传只运行一次模型：缩放后的图像与位压缩的掩码（PackedMask，含面积与外接框）按图像 ID 缓存，
+之后的提示只在缓存的掩码上计算，不再重新打开、缩放图像和前向推理。
+- 内存：按字节数计量的 LRU，超过上限时最久未用的会话溢出到磁盘
+- 磁盘：pickle 文件，按修改时间淘汰，超过磁盘上限时删除最旧的文件
+- 两级都有 TTL，过期会话视为不存在
+"""
+import os
+import re
+import time
+import pickle
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+# 图像 ID 为 uuid4 的 32 位十六进制串（同时用作磁盘文件名，拒绝其他格式以防路径穿越）
+_IMAGE_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+
+def session_nbytes(session: Dict) -> int:
+    """估算一个会话占用的内存字节数（图像 + 位压缩掩码 + 每个标注的固定开销）"""
+    total = session["image"].nbytes
+    for annotation in session["annotations"]:
+        total += annotation["segmentation"].nbytes + 256
+    return total
+
+
+class SegmentationSessionCache:
+    """分割会话缓存类"""
+
+    def __init__(self, cache_dir: str = "./cache/segment_sessions", max_bytes: int = 512 << 20,
+                 ttl: float = 1800.0, max_disk_bytes: int = 2048 << 20):
+        """
+        初始化分割会话缓存
+        Args:
+            cache_dir: 溢出到磁盘的会话文件目录
+            max_bytes: 内存中会话的总字节数上限
+            ttl: 会话有效期（秒，从创建时算起）
+            max_disk_bytes: 磁盘上会话文件的总字节数上限
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.max_disk_bytes = max_disk_bytes
+        self._lock = threading.Lock()
+        self._sessions = OrderedDict()
+        self._bytes = 0
+        self.counters = {"hits": 0, "disk_hits": 0, "misses": 0, "expired": 0, "spilled": 0, "dropped": 0}
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def valid_id(image_id: str) -> bool:
+        """图像 ID 格式是否合法"""
+        return isinstance(image_id, str) and bool(_IMAGE_ID_PATTERN.match(image_id))
+
+    def _path(self, image_id: str) -> str:
+        return os.path.join(self.cache_dir, f"{image_id}.pkl")
+
+    def put(self, image_id: str, session: Dict):
+        """缓存一个会话（session 需包含 image 与 annotations），超出内存上限时溢出最久未用的会话"""
+        if not self.valid_id(image_id):
+            raise ValueError(f"非法的图像ID: {image_id}")
+        session = dict(session, created_at=session.get("created_at", time.time()))
+        session["nbytes"] = session_nbytes(session)
+        with self._lock:
+            old = self._sessions.pop(image_id, None)
+            if old is not None:
+                self._bytes -= old["nbytes"]
+            self._sessions[image_id] = session
+            self._bytes += session["nbytes"]
+            spill = []
+            while self._bytes > self.max_bytes and len(self._sessions) > 1:
+                evicted_id, evicted = self._sessions.popitem(last=False)
+                self._bytes -= evicted["nbytes"]
+                spill.append((evicted_id, evicted))
+        # 写磁盘不占用锁，避免阻塞其他请求的内存命中
+        for evicted_id, evicted in spill:
+            self._spill(evicted_id, evicted)
+        if spill:
+            self._trim_disk()
+
+    def get(self, image_id: str) -> Optional[Dict]:
+        """按图像 ID 获取会话，内存未命中时从磁盘加载；不存在或已过期返回 None"""
+        if not self.valid_id(image_id):
+            return None
+        now = time.time()
+        with self._lock:
+            session = self._sessions.get(image_id)
+            if session is not None:
+                if session["created_at"] + self.ttl < now:
+                    del self._sessions[image_id]
+                    self._bytes -= session["nbytes"]
+                    self.counters["expired"] += 1
+                    return None
+                self._sessions.move_to_end(image_id)
+                self.counters["hits"] += 1
+                return session
+        session = self._load(image_id)
+        if session is None or session["created_at"] + self.ttl < now:
+            with self._lock:
+                self.counters["expired" if session is not None else "misses"] += 1
+            return None
+        with self._lock:
+            self.counters["disk_hits"] += 1
+        # 重新放回内存（可能把其他会话挤到磁盘）
+        self.put(image_id, session)
+        return session
+
+    def _spill(self, image_id: str, session: Dict):
+        """把会话写到磁盘（先写临时文件再替换）"""
+        if session["created_at"] + self.ttl < time.time():
+            return
+        path = self._path(image_id)
+        tmp_path = f"{path}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                pickle.dump(session, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+            with self._lock:
+                self.counters["spilled"] += 1
+        except OSError as e:
+            print(f"分割会话写入磁盘失败: {e}")
+
+    def _load(self, image_id: str) -> Optional[Dict]:
+        """从磁盘加载会话并删除文件（会话回到内存后由内存负责）"""
+        path = self._path(image_id)
+        try:
+            with open(path, "rb") as f:
+                session = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        return session
+
+    def _trim_disk(self):
+        """删除过期的会话文件；总大小超过磁盘上限时从最旧的文件开始删除"""
+        files = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".pkl"):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        deadline = time.time() - self.ttl
+        dropped = 0
+        for mtime, size, path in files:
+            if mtime >= deadline and total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                dropped += 1
+            except OSError:
+                pass
+        if dropped:
+            with self._lock:
+                self.counters["dropped"] += dropped
+
+    def stats(self) -> Dict:
+        """获取缓存统计信息"""
+        with self._lock:
+            return dict(self.counters, sessions=len(self._sessions), bytes=self._bytes,
+                        max_bytes=self.max_bytes, ttl=self.ttl)
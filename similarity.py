@@ -0,0 +1,78 @@
+"""
+相似度打分模块 - 基于NumPy的向量化余弦相似度计算与Top-K选择
+"""
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+def rank_scores(scores: Sequence[float], k: Optional[int] = None) -> np.ndarray:
+    """
+    按分数从高到低返回下标
+    Args:
+        scores: 分数序列
+        k: 只返回前k个下标；为 None 或不小于分数个数时返回全部排序结果
+    Returns:
+        np.ndarray: 下标数组（分数相同时保持原始顺序）
+    """
+    scores = np.asarray(scores, dtype=np.float32)
+    n = scores.shape[0]
+    if k is None or k >= n:
+        return np.argsort(-scores, kind="stable")
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    # argpartition 选出前k个（O(n)），再只对这k个排序
+    candidates = np.sort(np.argpartition(-scores, k - 1)[:k])
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+class SimilarityScorer:
+    """相似度打分类
+
+    问题向量在构造时归一化一次，候选向量以矩阵形式通过一次矩阵-向量乘法完成打分。
+    空向量（获取失败）的相似度记为 0.0，与原 calculate_similarity 的行为一致。
+    """
+
+    def __init__(self, query_vector: Sequence[float]):
+        """
+        初始化打分器
+        Args:
+            query_vector: 问题的向量表示
+        """
+        query = np.asarray(query_vector if query_vector is not None else [], dtype=np.float32)
+        norm = np.linalg.norm(query) if query.size else 0.0
+        self.query = query / norm if norm > 0 else None
+
+    def score(self, vectors: List[Sequence[float]]) -> np.ndarray:
+        """
+        计算一组候选向量与问题向量的余弦相似度
+        Args:
+            vectors: 候选向量列表，允许包含空向量
+        Returns:
+            np.ndarray: 形状为 (len(vectors),) 的相似度数组
+        """
+        scores = np.zeros(len(vectors), dtype=np.float32)
+        if self.query is None or not vectors:
+            return scores
+        dim = self.query.shape[0]
+        valid = [i for i, v in enumerate(vectors) if v is not None and len(v) == dim]
+        if not valid:
+            return scores
+        matrix = np.asarray([vectors[i] for i in valid], dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1)
+        norms[norms == 0] = 1.0
+        scores[valid] = (matrix @ self.query) / norms
+        return scores
+
+    def top_k(self, vectors: List[Sequence[float]], k: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        对候选向量打分并返回相似度最高的前k个
+        Args:
+            vectors: 候选向量列表
+            k: 返回个数，为 None 时返回全部
+        Returns:
+            tuple: (按相似度降序排列的下标, 对应的相似度)
+        """
+        scores = self.score(vectors)
+        indices = rank_scores(scores, k)
+        return indices, scores[indices]
@@ -138,9 +138,12 @@ document.addEventListener('DOMContentLoaded', () => {
                             <div class="segmented-image-container">
                                 <img src="${result.segmented_image}" alt="分割结果" class="segmented-image">
                             </div>
+                            ${result.segmentation_info && result.segmentation_info.image_id ? '<small class="segment-prompt-hint">左键点击添加目标点，右键点击添加排除点</small>' : ''}
                         </div>
                     `;
                     addChatMessage(systemResultHtml, 'assistant');
+                    const segmentedImages = chatHistory.querySelectorAll('.segmented-image');
+                    enablePromptSegmentation(segmentedImages[segmentedImages.length - 1], result.segmentation_info);
 
                     // Add medical image description as plain text (left side, assistant)
                     if (result.description) {
@@ -169,6 +172,55 @@ document.addEventListener('DOMContentLoaded', () => {
         });
     }
 
+    // Click-to-prompt on a segmented image: points are sent to /segment_prompt, which reuses the
+    // cached masks of the uploaded image instead of running the model again
+    function enablePromptSegmentation(img, segInfo) {
+        if (!img || !segInfo || !segInfo.image_id) return;
+        const points = [];
+        const pointLabels = [];
+        let pending = false;
+
+        const addPoint = async (event, label) => {
+            event.preventDefault();
+            if (pending) return;
+            // Map the click from displayed pixels to original image coordinates
+            const rect = img.getBoundingClientRect();
+            const [originalWidth, originalHeight] = segInfo.original_size;
+            points.push([
+                Math.round((event.clientX - rect.left) / rect.width * originalWidth),
+                Math.round((event.clientY - rect.top) / rect.height * originalHeight)
+            ]);
+            pointLabels.push(label);
+
+            pending = true;
+            try {
+                const response = await fetch('/segment_prompt', {
+                    method: 'POST',
+                    headers: { 'Content-Type': 'application/json' },
+                    body: JSON.stringify({ image_id: segInfo.image_id, points: points, point_labels: pointLabels })
+                });
+                const result = await response.json();
+                if (result.success) {
+                    img.src = result.segmented_image;
+                } else {
+                    points.pop();
+                    pointLabels.pop();
+                    addChatMessage(`提示分割失败: ${result.error || '未知错误'}`, 'error');
+                }
+            } catch (error) {
+                points.pop();
+                pointLabels.pop();
+                console.error('Prompt segmentation error:', error);
+                addChatMessage(`提示分割失败: ${error.message}`, 'error');
+            } finally {
+                pending = false;
+            }
+        };
+
+        img.addEventListener('click', (event) => addPoint(event, 1));
+        img.addEventListener('contextmenu', (event) => addPoint(event, 0));
+    }
+
     function addChatMessage(message, type = 'assistant', isThinkingPlaceholder = false) {
         if (isThinkingPlaceholder) {
             if (thinkingMessageElement) thinkingMessageElement.remove(); // Remove old one if exists
@@ -254,6 +306,7 @@ document.addEventListener('DOMContentLoaded', () => {
                 const reader = response.body.getReader();
                 const decoder = new TextDecoder();
                 let finishedProcessing = false; // Renamed for clarity
+                let pendingText = ''; // Partial SSE message carried over to the next read
 
                 function processStream() {
                     reader.read().then(({ done, value }) => {
@@ -268,8 +321,9 @@ document.addEventListener('DOMContentLoaded', () => {
                             return;
                         }
 
-                        const chunk = decoder.decode(value, { stream: true });
-                        const messages = chunk.split('\n\n');
+                        pendingText += decoder.decode(value, { stream: true });
+                        const messages = pendingText.split('\n\n');
+                        pendingText = messages.pop(); // Last piece may be an incomplete message
 
                         messages.forEach(message => {
                             if (message.startsWith('data: ')) {
@@ -283,6 +337,18 @@ document.addEventListener('DOMContentLoaded', () => {
                                         if (!logsPanel.classList.contains('collapsed')) {
                                             logsContent.scrollTop = logsContent.scrollHeight;
                                         }
+                                    } else if (jsonData.type === 'answer_delta') {
+                                        // Render tokens as they arrive inside the "thinking" bubble;
+                                        // the final 'answer' message replaces it with the full text
+                                        if (thinkingMessageElement) {
+                                            if (thinkingMessageElement.classList.contains('thinking')) {
+                                                thinkingMessageElement.classList.remove('thinking');
+                                                thinkingMessageElement.dataset.streamedText = '';
+                                            }
+                                            thinkingMessageElement.dataset.streamedText += jsonData.content;
+                                            thinkingMessageElement.innerHTML = thinkingMessageElement.dataset.streamedText.replace(/\n/g, '<br>');
+                                            chatHistory.scrollTop = chatHistory.scrollHeight;
+                                        }
                                     } else if (jsonData.type === 'answer') {
                                         // Replace "Thinking..." with the actual answer
                                         addChatMessage(jsonData.content, 'assistant');
@@ -0,0 +1,39 @@
+from answer_cache import AnswerCache
+
+VECTOR = [0.6, 0.8, 0.0]
+NEAR_VECTOR = [0.6, 0.79, 0.01]
+
+
+def make_cache(tmp_path):
+    return AnswerCache(db_path=str(tmp_path / "answers.sqlite3"), similarity_threshold=0.95)
+
+
+def test_semantic_hit_requires_same_entities(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.put_answer("糖尿病吃什么药", "二甲双胍", VECTOR, entities=[{"name": "糖尿病", "type": "Disease"}])
+
+    # 向量几乎相同，但疾病不同，不能返回糖尿病的答案
+    assert cache.get_semantic(NEAR_VECTOR, entities=[{"name": "高血压", "type": "Disease"}]) is None
+    assert cache.get_semantic(NEAR_VECTOR, entities=[{"name": "糖尿病"}, {"name": "高血压"}]) is None
+
+    hit = cache.get_semantic(NEAR_VECTOR, entities=[{"name": " 糖尿病 ", "type": "Disease"}])
+    assert hit["answer"] == "二甲双胍"
+    assert hit["question"] == "糖尿病吃什么药"
+
+
+def test_semantic_tier_skipped_without_entities(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.put_answer("怎么办", "请咨询医生", VECTOR)
+    assert cache.get_exact("怎么办") == "请咨询医生"
+    assert cache.stats()["semantic"]["entries"] == 0
+
+    cache.put_answer("糖尿病吃什么药", "二甲双胍", VECTOR, entities=[{"name": "糖尿病"}])
+    assert cache.get_semantic(NEAR_VECTOR) is None
+
+
+def test_semantic_hit_requires_same_variant(tmp_path):
+    cache = make_cache(tmp_path)
+    entities = [{"name": "糖尿病", "type": "Disease"}]
+    cache.put_answer("糖尿病吃什么药", "二甲双胍", VECTOR, variant="a", entities=entities)
+    assert cache.get_semantic(NEAR_VECTOR, variant="b", entities=entities) is None
+    assert cache.get_semantic(NEAR_VECTOR, variant="a", entities=entities)["answer"] == "二甲双胍"
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from fastsam import clip_engine  # noqa: E402
+from fastsam.clip_engine import ClipEngine, get_clip_engine  # noqa: E402
+
+
+class FakeEngine:
+    def __init__(self, model_name, device, half):
+        self.model_name, self.device, self.half = model_name, device, half
+
+
+class FakeModel:
+    def __init__(self):
+        self.batches = []
+
+    def encode_image(self, batch):
+        self.batches.append(len(batch))
+        return batch.reshape(len(batch), -1).float() + 1
+
+
+@pytest.fixture
+def engines(monkeypatch):
+    monkeypatch.setattr(clip_engine, "ClipEngine", FakeEngine)
+    monkeypatch.setattr(clip_engine, "_engines", {})
+    return clip_engine._engines
+
+
+def test_default_half_shares_engine(engines):
+    assert get_clip_engine(device="cuda", half=None) is get_clip_engine(device="cuda", half=True)
+    assert get_clip_engine(device="cpu", half=None) is get_clip_engine(device="cpu", half=True)
+    assert get_clip_engine(device="cuda", half=False) is not get_clip_engine(device="cuda")
+    assert len(engines) == 3
+
+
+def test_batch_size_per_call():
+    engine = ClipEngine.__new__(ClipEngine)
+    engine.device, engine.batch_size, engine.model = "cpu", 4, FakeModel()
+    engine.preprocess = lambda image: torch.from_numpy(np.asarray(image, dtype=np.float32))
+    crops = [np.full((2, 2, 3), i, dtype=np.uint8) for i in range(10)]
+
+    default = engine.encode_images(crops)
+    assert engine.model.batches == [4, 4, 2]
+    engine.model.batches = []
+    assert torch.allclose(engine.encode_images(crops, batch_size=3), default)
+    assert engine.model.batches == [3, 3, 3, 1]
@@ -0,0 +1,34 @@
+import os
+import subprocess
+import sys
+
+from embedding_cache import EmbeddingCache
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_get_returns_copy(tmp_path):
+    cache = EmbeddingCache(db_path=str(tmp_path / "embeddings.sqlite3"))
+    vector = [0.5, 0.25]
+    cache.put("model", "糖尿病", vector)
+    vector[0] = 1.0
+
+    # 内存命中：修改返回值不影响缓存
+    hit = cache.get("model", "糖尿病")
+    assert hit == [0.5, 0.25]
+    hit[0] = 9.0
+    assert cache.get("model", "糖尿病") == [0.5, 0.25]
+
+    # 磁盘命中：重新加载后同样返回副本
+    cache._memory.clear()
+    hit = cache.get("model", "糖尿病")
+    hit.append(1.0)
+    assert cache.get("model", "糖尿病") == [0.5, 0.25]
+    assert cache.stats()["disk_hits"] == 1
+
+
+def test_importing_q_a_creates_no_cache_files(tmp_path):
+    env = dict(os.environ, ALI_API_KEY="test", ALI_BASE_URL="http://localhost",
+               PYTHONPATH=os.pathsep.join(filter(None, [REPO_ROOT, os.environ.get("PYTHONPATH")])))
+    subprocess.run([sys.executable, "-c", "import q_a"], cwd=tmp_path, env=env, check=True)
+    assert not (tmp_path / "cache").exists()
@@ -0,0 +1,65 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from fastsam.prompt import FastSAMPrompt  # noqa: E402
+
+H, W = 40, 60
+
+
+def make_masks(n=6, seed=0):
+    rng = np.random.default_rng(seed)
+    masks = np.zeros((n, H, W), dtype=np.float32)
+    for i in range(n):
+        x1, y1 = rng.integers(0, W - 10), rng.integers(0, H - 10)
+        masks[i, y1:y1 + rng.integers(5, 30), x1:x1 + rng.integers(5, 40)] = 1.0
+    return torch.from_numpy(masks)
+
+
+def slicing_sums(masks, boxes):
+    """原实现：逐框切片求和"""
+    masks = masks.numpy()
+    return np.stack([masks[:, y1:y2, x1:x2].sum(axis=(1, 2)) for x1, y1, x2, y2 in boxes], axis=1)
+
+
+def make_prompt(masks):
+    boxes = torch.zeros((len(masks), 6))
+    boxes[:, 2:4] = torch.tensor([W, H], dtype=torch.float32)
+    result = SimpleNamespace(masks=SimpleNamespace(data=masks), boxes=SimpleNamespace(data=boxes, conf=boxes[:, 4]))
+    return FastSAMPrompt(np.zeros((H, W, 3), dtype=np.uint8), [result], device="cpu")
+
+
+# 框已按 _clip_box 裁剪：起点越过图像右/下边界的框与正常框混在一起
+BOXES = [
+    [[5, 5, 30, 20], [70, 10, W, 30]],
+    [[12, 45, 50, H], [3, 2, 58, 38]],
+    [[70, 45, W, H], [0, 0, W, H], [20, 10, 25, 15]],
+    [[65, 50, W, H]],
+]
+
+
+@pytest.mark.parametrize("boxes", BOXES)
+def test_box_sums_out_of_image_boxes(boxes):
+    masks = make_masks()
+    boxes = np.array(boxes, dtype=np.int64)
+    masks_area, orig_masks_area = FastSAMPrompt._box_sums(masks, boxes, chunk_size=4)
+    np.testing.assert_array_equal(masks_area, slicing_sums(masks, boxes))
+    np.testing.assert_array_equal(orig_masks_area, masks.numpy().sum(axis=(1, 2)))
+
+
+def test_box_prompt_with_out_of_image_box():
+    masks = make_masks()
+    prompt = make_prompt(masks)
+    bboxes = [[5, 5, 30, 20], [70, 10, 90, 30]]
+    result = prompt.box_prompt(bboxes=bboxes)
+
+    boxes = prompt._scaled_boxes(bboxes, H, W)
+    expected = FastSAMPrompt._best_iou_index(slicing_sums(masks, boxes), masks.numpy().sum(axis=(1, 2)), boxes)
+    np.testing.assert_array_equal(result, masks[expected].numpy())
+
+    # 缓存的打包掩码走另一条实现，结果应一致
+    packed = FastSAMPrompt(prompt.img, None, device="cpu", annotations=prompt.get_annotations())
+    np.testing.assert_array_equal(packed.box_prompt(bboxes=bboxes), result.astype(bool))
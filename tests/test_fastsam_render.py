@@ -0,0 +1,75 @@
+import cv2
+import numpy as np
+import pytest
+
+pytest.importorskip("torch")
+
+from fastsam.render import render_masks  # noqa: E402
+
+# 参考实现像 matplotlib 一样把每个图层量化到 8 位后再叠加下一层，render_masks 只在最后舍入一次，
+# 每个像素的每个通道允许相差 1
+TOLERANCE = 1
+
+
+def make_masks(h, w):
+    """互相重叠的矩形和圆，面积各不相同"""
+    masks = np.zeros((4, h, w), dtype=np.float32)
+    masks[0, h // 8:h * 7 // 8, w // 8:w * 7 // 8] = 1
+    masks[1, h // 4:h // 2, w // 5:w * 3 // 5] = 1
+    cv2.circle(masks[2], (w * 2 // 3, h * 2 // 3), min(h, w) // 5, 1, -1)
+    masks[3, :h // 6, w * 3 // 4:] = 1
+    return masks
+
+
+def make_image(h, w):
+    rng = np.random.default_rng(0)
+    return rng.integers(0, 256, (h, w, 3), dtype=np.uint8)
+
+
+def reference_render(image, masks, random_color, retina):
+    """原 fast_show_mask + plot 的叠加方式：按面积排序的 RGBA 掩码层，其上再叠加轮廓层"""
+    target_h, target_w = image.shape[:2]
+    n, h, w = masks.shape
+    masks = masks[np.argsort(np.sum(masks, axis=(1, 2)))]
+    index = (masks != 0).argmax(axis=0)
+    if random_color:
+        color = np.random.random((n, 1, 1, 3))
+    else:
+        color = np.ones((n, 1, 1, 3)) * np.array([30 / 255, 144 / 255, 255 / 255])
+    visual = np.concatenate([color, np.ones((n, 1, 1, 1)) * 0.6], axis=-1)
+    mask_image = np.expand_dims(masks, -1) * visual
+    h_indices, w_indices = np.meshgrid(np.arange(h), np.arange(w), indexing='ij')
+    show = mask_image[index, h_indices, w_indices]
+    if not retina:
+        show = cv2.resize(show, (target_w, target_h), interpolation=cv2.INTER_NEAREST)
+
+    temp = np.zeros((target_h, target_w, 1))
+    contour_all = []
+    for mask in masks.astype(np.uint8):
+        if not retina:
+            mask = cv2.resize(mask, (target_w, target_h), interpolation=cv2.INTER_NEAREST)
+        contour_all.extend(cv2.findContours(mask, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)[0])
+    cv2.drawContours(temp, contour_all, -1, (255, 255, 255), 2)
+    contour_layer = temp / 255 * np.array([0, 0, 1, 0.8]).reshape(1, 1, -1)
+
+    out = image.astype(np.float64) / 255
+    for layer in (show, contour_layer):
+        alpha = layer[..., 3:]
+        out = np.rint((layer[..., :3] * alpha + out * (1 - alpha)) * 255) / 255
+    return np.rint(out * 255).astype(np.uint8)
+
+
+@pytest.mark.parametrize("random_color", [False, True])
+@pytest.mark.parametrize("retina", [True, False])
+def test_render_masks_matches_reference_blend(random_color, retina):
+    image = make_image(96, 128)
+    masks = make_masks(96, 128) if retina else make_masks(48, 64)
+
+    np.random.seed(0)
+    result = render_masks(image, masks, random_color=random_color, retina=retina)
+    np.random.seed(0)
+    expected = reference_render(image, masks, random_color, retina)
+
+    assert result.shape == expected.shape and result.dtype == np.uint8
+    diff = np.abs(result.astype(np.int16) - expected.astype(np.int16))
+    assert diff.max() <= TOLERANCE
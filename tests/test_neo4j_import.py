@@ -0,0 +1,85 @@
+import json
+import threading
+from contextlib import contextmanager
+
+import pytest
+from py2neo.errors import ClientError, TransientError
+
+import neo4j_import
+from neo4j_import import ParallelImporter
+
+
+class FakeGraph:
+    def __init__(self, pool):
+        self.pool = pool
+
+    def begin(self):
+        return self
+
+    def evaluate(self, query, rows):
+        self.pool.calls += 1
+        if self.pool.errors:
+            raise self.pool.errors.pop(0)
+        return len(rows)
+
+    def commit(self, tx):
+        pass
+
+    def rollback(self, tx):
+        pass
+
+
+class FakePool:
+    def __init__(self, errors=()):
+        self.errors = list(errors)
+        self.calls = 0
+
+    @contextmanager
+    def acquire(self):
+        yield FakeGraph(self)
+
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    monkeypatch.setattr(neo4j_import.time, "sleep", lambda seconds: None)
+
+
+def write_records(path, n):
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(n):
+            f.write(json.dumps({"name": f"疾病{i}", "symptom": [f"症状{i}"]}, ensure_ascii=False) + "\n")
+
+
+def test_transient_error_is_retried():
+    pool = FakePool([TransientError("deadlock", "Neo.TransientError.Transaction.DeadlockDetected")])
+    assert ParallelImporter(pool, workers=1)._write("UNWIND $rows AS row", [{"name": "a"}]) == 1
+    assert pool.calls == 2
+
+
+def test_client_error_is_not_retried():
+    pool = FakePool([ClientError("Invalid input", "Neo.ClientError.Statement.SyntaxError")])
+    with pytest.raises(ClientError):
+        ParallelImporter(pool, workers=1)._write("UNWIND $rows AS row", [{"name": "a"}])
+    assert pool.calls == 1
+
+
+def test_write_failure_stops_pipeline_threads(tmp_path):
+    path = tmp_path / "records.jsonl"
+    write_records(path, 200)
+    pool = FakePool([ClientError("Invalid input", "Neo.ClientError.Statement.SyntaxError")])
+    importer = ParallelImporter(pool, workers=2, chunk_size=1)
+
+    # 块很小，读取、转换线程很快填满有界队列；写入失败后它们必须退出，而不是阻塞在队列上
+    before = set(threading.enumerate())
+    with pytest.raises(ClientError):
+        importer.run_file(str(path))
+    assert set(threading.enumerate()) <= before
+    assert importer.stats["records"] == 0
+
+
+def test_run_file_imports_every_record(tmp_path):
+    path = tmp_path / "records.jsonl"
+    write_records(path, 25)
+    importer = ParallelImporter(FakePool(), workers=2, chunk_size=4)
+    stats = importer.run_file(str(path))
+    assert stats["records"] == 25
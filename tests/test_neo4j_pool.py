@@ -0,0 +1,66 @@
+import pytest
+from py2neo.errors import ClientError, ConnectionBroken
+
+from neo4j_pool import Neo4jConnectionPool
+
+
+class FakeGraph:
+    def __init__(self, index):
+        self.index = index
+        self.closed = False
+
+
+class FakePool(Neo4jConnectionPool):
+    def __init__(self, max_size=2):
+        super().__init__("bolt://localhost:7687", "neo4j", "password", max_size=max_size, acquire_timeout=0.1)
+        self.graphs = []
+
+    def _create_graph(self):
+        self.graphs.append(FakeGraph(len(self.graphs)))
+        return self.graphs[-1]
+
+    def _close_graph(self, graph):
+        graph.closed = True
+
+
+def test_connection_error_discards_graph():
+    pool = FakePool(max_size=1)
+    with pytest.raises(ConnectionBroken):
+        with pool.acquire() as graph:
+            raise ConnectionBroken("connection reset")
+    assert graph.closed
+
+    # 名额空出，下一次借出时重新创建连接
+    with pool.acquire() as replacement:
+        assert replacement is not graph
+    metrics = pool.metrics()
+    assert metrics["created"] == 1
+    assert metrics["discarded"] == 1
+    assert len(pool.graphs) == 2
+
+
+def test_query_error_keeps_graph():
+    pool = FakePool(max_size=1)
+    with pytest.raises(ClientError):
+        with pool.acquire() as graph:
+            raise ClientError("Invalid input", "Neo.ClientError.Statement.SyntaxError")
+    with pool.acquire() as reused:
+        assert reused is graph
+    assert not graph.closed
+    assert pool.metrics()["discarded"] == 0
+
+
+def test_failed_replacement_returns_slot():
+    pool = FakePool(max_size=1)
+    with pytest.raises(OSError):
+        with pool.acquire():
+            raise OSError("broken pipe")
+
+    pool._create_graph = lambda: (_ for _ in ()).throw(ConnectionBroken("refused"))
+    with pytest.raises(ConnectionBroken):
+        with pool.acquire():
+            pass
+    del pool._create_graph
+    with pool.acquire() as graph:
+        assert not graph.closed
+    assert pool.metrics()["created"] == 1
@@ -146,6 +146,7 @@ def non_max_suppression(
         max_time_img=0.05,
         max_nms=30000,
         max_wh=7680,
+        return_idxs=False,
 ):
     """
     Perform non-maximum suppression (NMS) on a set of boxes, with support for masks and multiple labels per box.
@@ -170,11 +171,17 @@ def non_max_suppression(
         max_time_img (float): The maximum time (seconds) for processing one image.
         max_nms (int): The maximum number of boxes into torchvision.ops.nms().
         max_wh (int): The maximum box width and height in pixels
+        return_idxs (bool): If True, NMS runs on boxes and scores only: the prediction is sliced to its box and class
+            columns before the candidates are gathered, so mask coefficients are neither copied nor carried through
+            NMS, and the index of each kept detection in the prediction's box dimension is returned instead, so the
+            caller can gather the coefficients of the survivors only.
 
     Returns:
         (List[torch.Tensor]): A list of length batch_size, where each element is a tensor of
             shape (num_boxes, 6 + num_masks) containing the kept boxes, with columns
             (x1, y1, x2, y2, confidence, class, mask1, mask2, ...).
+            With return_idxs, a tuple of that list (shape (num_boxes, 6), no mask columns) and a list of
+            (num_boxes,) long tensors of box indices (-1 for apriori labels).
     """
 
     # Checks
@@ -192,6 +199,11 @@ def non_max_suppression(
     nm = prediction.shape[1] - nc - 4
     mi = 4 + nc  # mask start index
     xc = prediction[:, 4:mi].amax(1) > conf_thres  # candidates
+    if return_idxs:
+        # Boxes and class scores only: the candidate gather below never touches the mask coefficients, which the
+        # caller gathers for the kept indices afterwards
+        prediction = prediction[:, :mi]
+        nm = 0
 
     # Settings
     # min_wh = 2  # (pixels) minimum box width and height
@@ -202,9 +214,11 @@ def non_max_suppression(
 
     t = time.time()
     output = [torch.zeros((0, 6 + nm), device=prediction.device)] * bs
+    keepi = [torch.zeros(0, dtype=torch.long, device=prediction.device)] * bs
     for xi, x in enumerate(prediction):  # image index, image inference
         # Apply constraints
         # x[((x[:, 2:4] < min_wh) | (x[:, 2:4] > max_wh)).any(1), 4] = 0  # width-height
+        xk = xc[xi].nonzero(as_tuple=False).view(-1)  # box indices of the candidates
         x = x.transpose(0, -1)[xc[xi]]  # confidence
 
         # Cat apriori labels if autolabelling
@@ -214,6 +228,7 @@ def non_max_suppression(
             v[:, :4] = lb[:, 1:5]  # box
             v[range(len(lb)), lb[:, 0].long() + 4] = 1.0  # cls
             x = torch.cat((x, v), 0)
+            xk = torch.cat((xk, xk.new_full((len(lb), ), -1)))
 
         # If none remain process next image
         if not x.shape[0]:
@@ -225,13 +240,17 @@ def non_max_suppression(
         if multi_label:
             i, j = (cls > conf_thres).nonzero(as_tuple=False).T
             x = torch.cat((box[i], x[i, 4 + j, None], j[:, None].float(), mask[i]), 1)
+            xk = xk[i]
         else:  # best class only
             conf, j = cls.max(1, keepdim=True)
-            x = torch.cat((box, conf, j.float(), mask), 1)[conf.view(-1) > conf_thres]
+            filt = conf.view(-1) > conf_thres
+            x = torch.cat((box, conf, j.float(), mask), 1)[filt]
+            xk = xk[filt]
 
         # Filter by class
         if classes is not None:
-            x = x[(x[:, 5:6] == torch.tensor(classes, device=x.device)).any(1)]
+            filt = (x[:, 5:6] == torch.tensor(classes, device=x.device)).any(1)
+            x, xk = x[filt], xk[filt]
 
         # Apply finite constraint
         # if not torch.isfinite(x).all():
@@ -241,7 +260,8 @@ def non_max_suppression(
         n = x.shape[0]  # number of boxes
         if not n:  # no boxes
             continue
-        x = x[x[:, 4].argsort(descending=True)[:max_nms]]  # sort by confidence and remove excess boxes
+        order = x[:, 4].argsort(descending=True)[:max_nms]  # sort by confidence and remove excess boxes
+        x, xk = x[order], xk[order]
 
         # Batched NMS
         c = x[:, 5:6] * (0 if agnostic else max_wh)  # classes
@@ -256,14 +276,14 @@ def non_max_suppression(
             if redundant:
                 i = i[iou.sum(1) > 1]  # require redundancy
 
-        output[xi] = x[i]
+        output[xi], keepi[xi] = x[i], xk[i]
         if mps:
-            output[xi] = output[xi].to(device)
+            output[xi], keepi[xi] = output[xi].to(device), keepi[xi].to(device)
         if (time.time() - t) > time_limit:
             LOGGER.warning(f'WARNING ⚠️ NMS time limit {time_limit:.3f}s exceeded')
             break  # time limit exceeded
 
-    return output
+    return (output, keepi) if return_idxs else output
 
 
 def clip_boxes(boxes, shape):
@@ -636,6 +656,72 @@ def process_mask_native(protos, masks_in, bboxes, shape):
     return masks.gt_(0)
 
 
+def _linear_source_index(in_size, out_size, device):
+    """
+    Source indices and weights of bilinear resizing along one axis, computed the way F.interpolate does for
+    mode='bilinear', align_corners=False (float32 scale and half-pixel offset, clamped at the borders).
+
+    Returns:
+      (tuple): lower index, upper index, lower weight, upper weight; each of length out_size
+    """
+    scale = torch.tensor(in_size / out_size, dtype=torch.float32)
+    src = (scale * (torch.arange(out_size, dtype=torch.float32) + 0.5) - 0.5).clamp_(min=0)
+    i0 = src.long()
+    i1 = torch.where(i0 < in_size - 1, i0 + 1, i0)
+    w1 = src - i0
+    return i0.to(device), i1.to(device), (1 - w1).to(device), w1.to(device)
+
+
+def process_mask_native_cropped(protos, masks_in, bboxes, shape, chunk_size=32, out=None):
+    """
+    Memory-aware version of process_mask_native: the same binary masks, but each mask is upsampled only inside
+    its bounding box and thresholded straight into a bool output, instead of upsampling the whole [n, h, w]
+    float stack and cropping it afterwards. Masks are decoded at proto resolution chunk_size at a time, so the
+    float working memory is bounded by the chunk and the box sizes rather than by n x h x w.
+
+    Args:
+      protos (torch.Tensor): [mask_dim, mask_h, mask_w]
+      masks_in (torch.Tensor): [n, mask_dim], n is number of masks after nms
+      bboxes (torch.Tensor): [n, 4], n is number of masks after nms
+      shape (tuple): the size of the input image (h,w)
+      chunk_size (int): number of masks decoded at proto resolution at once
+      out (torch.Tensor, optional): preallocated [n, h, w] bool tensor to write into; zero outside the boxes
+
+    Returns:
+      masks (torch.Tensor): bool masks with dimensions [n, h, w]
+    """
+    c, mh, mw = protos.shape  # CHW
+    ih, iw = shape
+    gain = min(mh / ih, mw / iw)  # gain  = old / new
+    pad = (mw - iw * gain) / 2, (mh - ih * gain) / 2  # wh padding
+    top, left = int(pad[1]), int(pad[0])  # y, x
+    bottom, right = int(mh - pad[1]), int(mw - pad[0])
+    y0, y1, wy0, wy1 = _linear_source_index(bottom - top, ih, protos.device)
+    x0, x1, wx0, wx1 = _linear_source_index(right - left, iw, protos.device)
+
+    n = len(masks_in)
+    if out is None:
+        out = torch.zeros((n, ih, iw), dtype=torch.bool, device=protos.device)
+    # Pixel (r, c) is kept by crop_mask when x1 <= r < x2 and y1 <= c < y2, i.e. r in [ceil(x1), ceil(x2))
+    limits = torch.tensor([iw, ih, iw, ih], dtype=bboxes.dtype, device=bboxes.device)
+    boxes = torch.minimum(bboxes[:, :4].ceil().clamp(min=0), limits).long().tolist()
+    protos = protos.float().view(c, -1)
+    for start in range(0, n, chunk_size):
+        chunk = (masks_in[start:start + chunk_size] @ protos).view(-1, mh, mw)[:, top:bottom, left:right]
+        for mask, (bx1, by1, bx2, by2), target in zip(chunk, boxes[start:start + chunk_size], out[start:]):
+            if bx2 <= bx1 or by2 <= by1:
+                continue
+            rows0, rows1 = y0[by1:by2], y1[by1:by2]
+            cols0, cols1 = x0[bx1:bx2], x1[bx1:bx2]
+            # Interpolate along x on the source rows the box needs, then along y (same order as F.interpolate)
+            src_top = int(rows0[0])
+            window = mask[src_top:int(rows1[-1]) + 1]
+            window = window[:, cols0] * wx0[bx1:bx2] + window[:, cols1] * wx1[bx1:bx2]
+            window = (window[rows0 - src_top] * wy0[by1:by2, None] + window[rows1 - src_top] * wy1[by1:by2, None])
+            target[by1:by2, bx1:bx2] = window > 0
+    return out
+
+
 def scale_coords(img1_shape, coords, img0_shape, ratio_pad=None, normalize=False):
     """
     Rescale segment coordinates (xyxy) from img1_shape to img0_shape